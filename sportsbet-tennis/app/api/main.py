@@ -1,53 +1,306 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-import io, json, joblib
-from ..utils.db import get_conn
-from ..odds.odds_utils import implied_prob_from_decimal, remove_vig_two_outcomes, fair_odds_from_prob
-from ..ev.decision import stake_size, expected_value
+from typing import List, Optional
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+import asyncio, json, os, time
+import numpy as np
+import pandas as pd
+from ..utils.db import get_shared_conn, close_shared_conn, reader, writer, DB_SHARED_READONLY
+from ..utils.cache import TTLCache
+from ..utils.metrics import Histogram, Gauge, MetricsMiddleware, render
+from ..models.registry import ModelRegistry
+from ..features.asof import AsOfRegistry
+from ..odds.odds_utils import implied_prob_from_decimal, remove_vig_two_outcomes, fair_odds_from_prob, DEVIG_METHODS
+from ..odds.snapshots import best_odds
+from ..ev.decision import stake_size, expected_value, evaluate_two_way
+from ..signals.stream import EdgeStream, STREAM_SOURCES, STREAM_PERSIST
+from ..signals.refresh import SignalRefresher, SIGNAL_REFRESH_INTERVAL, DEVIG_METHOD, signal_frame, upsert_signals, staleness
+
+FEATURE_CACHE_SIZE = int(os.getenv("FEATURE_CACHE_SIZE", "50000"))
+FEATURE_CACHE_TTL = float(os.getenv("FEATURE_CACHE_TTL", "300"))
+# handlers are async; DB queries and inference run on this many threads, and at most
+# that many requests are handed to the pool at once (the rest wait on the event loop)
+API_THREADS = int(os.getenv("API_THREADS", "8"))
+# per-route latency histograms on /metrics; model inference time is recorded either way
+API_METRICS = os.getenv("API_METRICS", "1") != "0"
 
 app = FastAPI(title="SportsBet Tennis API")
+registry = ModelRegistry()
+asof_registry = AsOfRegistry()
+feature_cache = TTLCache(maxsize=FEATURE_CACHE_SIZE, ttl=FEATURE_CACHE_TTL)
+executor = ThreadPoolExecutor(max_workers=API_THREADS, thread_name_prefix="api")
+slots = asyncio.Semaphore(API_THREADS)
+refresher = None
+stream = None   # EdgeStream when STREAM_SOURCES is set
+
+REQUEST_SECONDS = Histogram("api_request_seconds", "HTTP request latency", ("method", "route", "status"))
+INFERENCE_SECONDS = Histogram("api_inference_seconds", "model scoring time per call", ("endpoint", "model"))
+METRICS = [
+    REQUEST_SECONDS, INFERENCE_SECONDS,
+    Gauge("api_model_loads", "model (re)loads by the registry", lambda: registry.loads),
+    Gauge("api_model_load_seconds", "duration of the last model load", lambda: registry.load_seconds),
+    Gauge("api_model_version", "artifact version being served", lambda: registry.version),
+    Gauge("api_feature_cache_hits", "feature cache hits", lambda: feature_cache.hits),
+    Gauge("api_feature_cache_misses", "feature cache misses", lambda: feature_cache.misses),
+]
+if API_METRICS:
+    app.add_middleware(MetricsMiddleware, histogram=REQUEST_SECONDS)
+
+async def offload(fn, *args):
+    async with slots:
+        return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
 
 class MatchOdds(BaseModel):
     match_id: int
-    p1_decimal: float
-    p2_decimal: float
-
-def load_model(conn):
-    row = conn.execute("SELECT blob, meta FROM artifacts WHERE name='model_latest'").fetchone()
-    if not row:
-        return None, None
-    blob, meta = row
-    model = joblib.load(io.BytesIO(blob))
-    meta = json.loads(meta)
-    return model, meta
+    # omitted: best prices across books from odds_index, de-vigged against the book consensus
+    p1_decimal: Optional[float] = None
+    p2_decimal: Optional[float] = None
+
+class SlateOdds(BaseModel):
+    items: List[MatchOdds]
+    persist: bool = False   # also upsert the results into the signals table
+    devig_method: str = "proportional"   # proportional | additive | power | shin
+
+def asof_features_many(cur, match_ids):
+    # {match_id: row} from the point-in-time store for matches without a features row (upcoming
+    # ones); not cached, since the store moves on as soon as a new result lands
+    if not match_ids:
+        return {}
+    rows = cur.execute('''
+        SELECT match_id, p1_id, p2_id, surface, date FROM matches
+        WHERE match_id IN (SELECT UNNEST(?)) AND p1_id IS NOT NULL AND p2_id IS NOT NULL AND date IS NOT NULL
+    ''', [list(match_ids)]).fetchall()
+    store = asof_registry.get(cur) if rows else None
+    if store is None:
+        return {}
+    return {mid: store.features(p1, p2, surface, d, match_id=mid) for mid, p1, p2, surface, d in rows}
+
+def get_features(cur, match_id):
+    # feature row as a dict, served from the LRU/TTL cache when possible
+    row = feature_cache.get(match_id)
+    if row is None:
+        feats = cur.execute("SELECT * FROM features WHERE match_id=?", [match_id]).fetchdf()
+        if feats.empty:
+            return asof_features_many(cur, [match_id]).get(match_id)
+        row = feats.iloc[0].to_dict()
+        feature_cache.put(match_id, row)
+    return row
+
+def get_features_many(cur, match_ids):
+    # {match_id: row}; cache misses are fetched with a single IN query
+    found, missing = {}, []
+    for mid in dict.fromkeys(match_ids):
+        row = feature_cache.get(mid)
+        if row is None:
+            missing.append(mid)
+        else:
+            found[mid] = row
+    if missing:
+        feats = cur.execute("SELECT * FROM features WHERE match_id IN (SELECT UNNEST(?))", [missing]).fetchdf()
+        for row in feats.to_dict("records"):
+            feature_cache.put(row["match_id"], row)
+            found[row["match_id"]] = row
+        found.update(asof_features_many(cur, [mid for mid in missing if mid not in found]))
+    return found
+
+def slate_odds(items, books):
+    # odds to bet and implied probabilities to de-vig per item; items without prices take the
+    # best price per side from odds_index and the book consensus (NaN when the match has none)
+    cols = np.full((4, len(items)), np.nan)
+    for j, it in enumerate(items):
+        if it.p1_decimal is not None and it.p2_decimal is not None:
+            i1, i2 = implied_prob_from_decimal(it.p1_decimal), implied_prob_from_decimal(it.p2_decimal)
+            cols[:, j] = it.p1_decimal, it.p2_decimal, np.nan if i1 is None else i1, np.nan if i2 is None else i2
+        elif it.match_id in books:
+            b = books[it.match_id]
+            cols[:, j] = b["best_p1_odd"], b["best_p2_odd"], b["consensus_p1"], b["consensus_p2"]
+    return cols
+
+def persist_signals(scored, model_created_at, devig_method):
+    # bulk upsert into signals; needs a writable serving handle
+    rows = signal_frame(scored["match_id"], scored, scored["p1_odd"], scored["p2_odd"], devig_method, model_created_at)
+    with writer() as cur:
+        return upsert_signals(cur, rows)
+
+def precomputed_signal(cur, payload, model_created_at):
+    # the refresh job's row for exactly these odds and this model, if there is one
+    row = cur.execute('''
+        SELECT match_id, p1_prob, p2_prob, p1_fair_odds, p2_fair_odds, p1_edge, p2_edge, suggestion, stake, expected_value
+        FROM signals
+        WHERE match_id=? AND p1_odd=CAST(? AS REAL) AND p2_odd=CAST(? AS REAL) AND devig_method=? AND model_created_at=?
+    ''', [payload.match_id, payload.p1_decimal, payload.p2_decimal, DEVIG_METHOD, model_created_at]).fetchone()
+    if row is None:
+        return None
+    return dict(zip(["match_id","p1_prob","p2_prob","p1_fair_odds","p2_fair_odds","p1_edge","p2_edge","suggestion","stake","expected_value"], row))
+
+@app.on_event("startup")
+def startup():
+    # in-process refresh needs the API to be the database's only writer (DB_SHARED_READONLY=0);
+    # with the default read-only handle the refresh job runs as its own process and writes
+    # whenever the handle is released (see DB_RELEASE_INTERVAL)
+    global refresher
+    if SIGNAL_REFRESH_INTERVAL > 0:
+        if DB_SHARED_READONLY:
+            print("warning: SIGNAL_REFRESH_INTERVAL is ignored with a read-only database handle; "
+                  "run `python -m app.signals.refresh --loop` next to the API, or set DB_SHARED_READONLY=0 "
+                  "to make the API the only writer and refresh in-process")
+        else:
+            refresher = SignalRefresher(get_shared_conn, registry, SIGNAL_REFRESH_INTERVAL, asof_registry)
+            refresher.start()
+
+@app.on_event("startup")
+async def start_stream():
+    # the stream lives on the server's event loop; scoring runs on the request executor.
+    # Ticks are only persisted when the API is the only writer (DB_SHARED_READONLY=0)
+    global stream
+    if STREAM_SOURCES:
+        if DB_SHARED_READONLY and STREAM_PERSIST:
+            print("warning: streaming without persistence: ticks are scored but not written to the odds store "
+                  "with a read-only database handle (set DB_SHARED_READONLY=0 to make the API the only writer)")
+        stream = EdgeStream(registry, reader, None if DB_SHARED_READONLY else writer, features=get_features_many,
+                            sources=STREAM_SOURCES.split(","), executor=executor).start()
+        METRICS.extend(stream.metrics())
+
+@app.on_event("shutdown")
+async def stop_stream():
+    if stream is not None:
+        await stream.stop()
+
+@app.on_event("shutdown")
+def shutdown():
+    if refresher is not None:
+        refresher.stop()
+    executor.shutdown(wait=True)
+    close_shared_conn()
 
 @app.get("/health")
-def health():
+async def health():
     return {"status":"ok"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    # Prometheus text exposition format
+    return PlainTextResponse(render(METRICS), media_type="text/plain; version=0.0.4")
+
+@app.get("/stats")
+async def stats():
+    return await offload(read_stats)
+
+@app.get("/features/asof")
+async def features_asof(p1_id: int, p2_id: int, as_of: date, surface: Optional[str] = None):
+    # feature row for any pairing as of the start of as_of (only matches before that day count)
+    return await offload(read_asof, p1_id, p2_id, as_of, surface)
+
 @app.post("/signal")
-def signal(payload: MatchOdds):
-    conn = get_conn(readonly=True)
-    feats = conn.execute("SELECT * FROM features WHERE match_id=?", [payload.match_id]).fetchdf()
-    if feats.empty:
-        return {"error":"unknown match_id"}
-    model, meta = load_model(conn)
+async def signal(payload: MatchOdds):
+    return await offload(score_signal, payload)
+
+@app.post("/signals")
+async def signals(payload: SlateOdds):
+    return await offload(score_slate, payload)
+
+@app.get("/signals/{match_id}")
+async def precomputed(match_id: int):
+    # precomputed row from the refresh job (primary-key lookup); stale when the model or odds moved on
+    return await offload(read_precomputed, match_id)
+
+def live_stream():
+    if stream is None:
+        raise HTTPException(404, "no odds stream running (set STREAM_SOURCES)")
+    return stream
+
+@app.get("/stream/stats")
+async def stream_stats():
+    return live_stream().stats()
+
+@app.get("/stream/alerts")
+async def stream_alerts():
+    # edge alerts as server-sent events
+    alerts = live_stream().subscribe()
+
+    async def events():
+        try:
+            while True:
+                yield f"data: {json.dumps(await alerts.get())}\n\n"
+        finally:
+            stream.unsubscribe(alerts)
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.websocket("/ws/alerts")
+async def ws_alerts(ws: WebSocket):
+    if stream is None:
+        await ws.close(code=1011, reason="no odds stream running")
+        return
+    await ws.accept()
+    alerts = stream.subscribe()
+    try:
+        while True:
+            await ws.send_json(await alerts.get())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        stream.unsubscribe(alerts)
+
+# blocking handler bodies, run on the executor
+
+def read_stats():
+    with reader() as cur:
+        signals_state = staleness(cur, model_created_at=registry.created_at)
+    return {"model": registry.stats(), "feature_cache": feature_cache.stats(), "asof": asof_registry.stats(), "signals": signals_state}
+
+def read_asof(p1_id, p2_id, as_of, surface):
+    with reader() as cur:
+        store = asof_registry.get(cur)
+    if store is None:
+        return {"error":"no completed matches"}
+    return store.features(p1_id, p2_id, surface, as_of)
+
+def score_signal(payload):
+    shopped = payload.p1_decimal is None or payload.p2_decimal is None
+    with reader() as cur:
+        model, meta = registry.get(cur)
+        if model and not shopped:
+            hit = precomputed_signal(cur, payload, registry.created_at)
+            if hit is not None:
+                return hit
+        feats = get_features(cur, payload.match_id)
+        if feats is None:
+            return {"error":"unknown match_id"}
+        book = best_odds(cur, [payload.match_id]).get(payload.match_id) if shopped else None
     if not model:
         return {"error":"no model"}
-    X = feats[['elo_diff','h2h_p1','form_p1','form_p2']]
-    p1 = float(model.predict_proba(X)[:,1][0])
+    t0 = time.perf_counter()
+    if getattr(model, "compiled", False):
+        # compiled LightGBM: score the raw row, no DataFrame (NaN -> 0 like fillna below)
+        p1 = model.predict_one([0.0 if v is None or v != v else v for v in (feats[c] for c in meta['features'])])
+        INFERENCE_SECONDS.observe(time.perf_counter() - t0, "signal", "compiled")
+    else:
+        X = pd.DataFrame([feats])[meta['features']].fillna(0.0)
+        p1 = float(model.predict_proba(X)[:,1][0])
+        INFERENCE_SECONDS.observe(time.perf_counter() - t0, "signal", "sklearn")
     p2 = 1.0 - p1
-    p1_imp = implied_prob_from_decimal(payload.p1_decimal)
-    p2_imp = implied_prob_from_decimal(payload.p2_decimal)
+    if shopped:
+        if book is None:
+            return {"error":"no odds for match_id"}
+        o1, o2 = book["best_p1_odd"], book["best_p2_odd"]
+        p1_imp, p2_imp = book["consensus_p1"], book["consensus_p2"]
+    else:
+        o1, o2 = payload.p1_decimal, payload.p2_decimal
+        p1_imp = implied_prob_from_decimal(o1)
+        p2_imp = implied_prob_from_decimal(o2)
+    if p1_imp is None or p2_imp is None:
+        return {"error":"invalid odds"}
     p1_fair, p2_fair = remove_vig_two_outcomes(p1_imp, p2_imp)
     p1_edge = p1 - p1_fair
     p2_edge = p2 - p2_fair
     suggestion = "P1" if p1_edge > p2_edge and p1_edge>0 else ("P2" if p2_edge>0 else "PASS")
-    odds = payload.p1_decimal if suggestion=="P1" else payload.p2_decimal
+    odds = o1 if suggestion=="P1" else o2
     prob = p1 if suggestion=="P1" else p2
     stake = stake_size(prob, odds) if suggestion!="PASS" else 0.0
     ev = expected_value(prob, odds, stake) if suggestion!="PASS" else 0.0
-    return {
+    out = {
         "match_id": payload.match_id,
         "p1_prob": p1, "p2_prob": p2,
         "p1_fair_odds": 1.0/max(p1_fair, 1e-9), "p2_fair_odds": 1.0/max(p2_fair,1e-9),
@@ -56,3 +309,65 @@ def signal(payload: MatchOdds):
         "stake": stake,
         "expected_value": ev
     }
+    if shopped:
+        out.update(p1_odd=o1, p1_book=book["best_p1_book"], p2_odd=o2, p2_book=book["best_p2_book"], books=book["books"])
+    return out
+
+def score_slate(payload):
+    if payload.devig_method not in DEVIG_METHODS:
+        return {"error": f"unknown devig_method, expected one of {list(DEVIG_METHODS)}"}
+    with reader() as cur:
+        feats = get_features_many(cur, [it.match_id for it in payload.items])
+        model, meta = registry.get(cur)
+        books = best_odds(cur, [it.match_id for it in payload.items if it.p1_decimal is None or it.p2_decimal is None])
+    if not model:
+        return {"error":"no model"}
+    results = [None] * len(payload.items)
+    known = []
+    for i, it in enumerate(payload.items):
+        if it.match_id in feats:
+            known.append(i)
+        else:
+            results[i] = {"match_id": it.match_id, "error": "unknown match_id"}
+    persisted = 0
+    if known:
+        items = [payload.items[i] for i in known]
+        t0 = time.perf_counter()
+        X = pd.DataFrame([feats[it.match_id] for it in items])[meta['features']].fillna(0.0)
+        p1 = model.predict_proba(X)[:,1].astype(float)
+        INFERENCE_SECONDS.observe(time.perf_counter() - t0, "signals", "compiled" if getattr(model, "compiled", False) else "sklearn")
+        o1, o2, i1, i2 = slate_odds(items, books)
+        scored = evaluate_two_way(p1, o1, o2, payload.devig_method, implied=(i1, i2))
+        scored["match_id"] = np.array([it.match_id for it in items])
+        scored["p1_odd"], scored["p2_odd"] = o1, o2
+        keys = ["p1_prob","p2_prob","p1_fair_odds","p2_fair_odds","p1_edge","p2_edge","suggestion","stake","expected_value"]
+        cols = {k: scored[k].tolist() for k in keys}
+        valid = scored["valid"].tolist()
+        for j, i in enumerate(known):
+            if not valid[j]:
+                results[i] = {"match_id": items[j].match_id, "error": "invalid odds"}
+                continue
+            results[i] = {"match_id": items[j].match_id, **{k: cols[k][j] for k in keys}}
+        if payload.persist:
+            ok = scored["valid"]
+            try:
+                persisted = persist_signals({k: v[ok] for k, v in scored.items()}, registry.created_at, payload.devig_method)
+            except Exception as e:
+                return {"results": results, "count": len(results), "errors": sum("error" in r for r in results),
+                        "persisted": 0, "persist_error": str(e)}
+    return {"results": results, "count": len(results), "errors": sum("error" in r for r in results), "persisted": persisted}
+
+def read_precomputed(match_id):
+    with reader() as cur:
+        registry.get(cur)
+        row = cur.execute('''
+            SELECT s.*, m.p1_odd AS current_p1_odd, m.p2_odd AS current_p2_odd
+            FROM signals s LEFT JOIN matches m USING(match_id) WHERE s.match_id=?
+        ''', [match_id]).fetchone()
+        cols = [d[0] for d in cur.description]
+    if row is None:
+        return {"error":"no precomputed signal"}
+    out = dict(zip(cols, row))
+    odds_now = (out.pop("current_p1_odd"), out.pop("current_p2_odd"))
+    out["stale"] = out["model_created_at"] != registry.created_at or (out["p1_odd"], out["p2_odd"]) != odds_now
+    return out
@@ -1,66 +1,97 @@
 
+import argparse
 import pandas as pd, numpy as np, io, json, math
 from ..utils.db import get_conn
-from ..odds.odds_utils import implied_prob_from_decimal, remove_vig_two_outcomes, fair_odds_from_prob
-from ..ev.decision import stake_size, expected_value
-from sklearn.linear_model import LogisticRegression
+from ..odds.odds_utils import implied_probs, devig
+from ..ev.decision import stake_sizes
+from .walk_forward import walk_forward_proba, parse_cadence, DEFAULT_CADENCE
+from .bootstrap import bootstrap_metrics, summarize, week_blocks
+from .bankroll import simulate_bankroll
+from ..utils.profiling import stage, set_rows, add_profile_args, profiled
 from datetime import datetime
 import joblib, random
 
 FEATURES = ["elo_diff_surface","elo_diff_global","h2h_p1","form_p1","form_p2","days_since_p1","days_since_p2","serve_p1","serve_p2"]
 
-def run_advanced_backtest(edge_min=0.02, kelly_fraction=0.25, bootstrap_iters=1000):
-    conn = get_conn()
-    # join features with matches to get odds; assume matches have columns p1_odd,p2_odd; extend to multiple books if provided
-    df = conn.execute('''
-        SELECT f.*, m.date, m.p1_odd, m.p2_odd
-        FROM features f
-        JOIN matches m USING(match_id)
-        ORDER BY m.date
-    ''').fetchdf()
+def load_backtest_frame(conn=None, odds="closing"):
+    conn = conn or get_conn()
+    # features joined with the matches' closing odds; odds="best" instead takes the best price
+    # per side across books and the consensus implied probabilities from odds_index where a
+    # match has snapshots (the matches' own odds elsewhere)
+    if odds == "best":
+        if not conn.execute("SELECT COUNT(*) FROM odds_index").fetchone()[0]:
+            raise ValueError("odds='best' needs odds_index; load snapshots first (python -m app.odds.snapshots)")
+        df = conn.execute('''
+            SELECT f.*, m.date,
+                coalesce(o.best_p1_odd, m.p1_odd) AS p1_odd, coalesce(o.best_p2_odd, m.p2_odd) AS p2_odd,
+                o.consensus_p1 AS p1_implied, o.consensus_p2 AS p2_implied
+            FROM features f
+            JOIN matches m USING(match_id)
+            LEFT JOIN odds_index o USING(match_id)
+            ORDER BY m.date, m.match_id
+        ''').fetchdf()
+        if not df.empty:
+            print(f"Line-shopped odds for {int(df.p1_implied.notna().sum())} of {len(df)} matches; closing odds for the rest.")
+    elif odds == "closing":
+        df = conn.execute('''
+            SELECT f.*, m.date, m.p1_odd, m.p2_odd
+            FROM features f
+            JOIN matches m USING(match_id)
+            ORDER BY m.date, m.match_id
+        ''').fetchdf()
+    else:
+        raise ValueError(f"odds must be best or closing, got {odds!r}")
     if df.empty:
         print("No data. Ingest + feature build first.")
+        return None
+    return df
+
+def market_implied(df):
+    # implied probabilities to de-vig: the multi-book consensus where there is one, else the odds' own
+    i1 = implied_probs(df.p1_odd.to_numpy(dtype=float)); i2 = implied_probs(df.p2_odd.to_numpy(dtype=float))
+    if "p1_implied" in df:
+        c1 = df.p1_implied.to_numpy(dtype=float); c2 = df.p2_implied.to_numpy(dtype=float)
+        i1 = np.where(np.isnan(c1), i1, c1); i2 = np.where(np.isnan(c2), i2, c2)
+    return i1, i2
+
+def simulate_trades(df, p1_proba, edge_min=0.02, kelly_fraction=0.25, max_fraction=0.05, bankroll=1000.0, devig_method="proportional"):
+    # vectorized over all matches: take the side with the larger edge when it clears edge_min
+    p1 = np.asarray(p1_proba, dtype=float)
+    o1 = df.p1_odd.to_numpy(dtype=float); o2 = df.p2_odd.to_numpy(dtype=float)
+    # line shopping: o1/o2 are the best prices across books, fair probabilities come from the consensus
+    p1_fair, p2_fair = devig(*market_implied(df), devig_method)
+    edge_p1 = p1 - p1_fair
+    edge_p2 = (1.0 - p1) - p2_fair
+    side1 = edge_p1 > edge_p2
+    model_prob = np.where(side1, p1, 1.0 - p1)
+    dec_odds = np.where(side1, o1, o2)
+    take = ~np.isnan(edge_p1) & ~np.isnan(edge_p2) & (np.maximum(edge_p1, edge_p2) >= edge_min) & (dec_odds > 1.0)
+    # fractional Kelly, capped per trade; fixed bankroll per trade for ROI calc
+    stake = stake_sizes(model_prob, dec_odds, bankroll=bankroll, kelly_mult=kelly_fraction, max_fraction=max_fraction)
+    # resolve outcome using label
+    label = df.label.to_numpy()
+    win = np.where(side1, label == 1, label == 0)
+    pnl = np.where(win, stake * (dec_odds - 1), -stake)
+    return pd.DataFrame({
+        "match_id": df.match_id.to_numpy()[take].astype(int),
+        "date": df.date.to_numpy()[take],
+        "side": np.where(side1, "P1", "P2")[take],
+        "odds": dec_odds[take],
+        "prob": model_prob[take],
+        "stake": stake[take],
+        "pnl": pnl[take],
+    })
+
+@stage("run_advanced_backtest")
+def run_advanced_backtest(edge_min=0.02, kelly_fraction=0.25, bootstrap_iters=1000, retrain=DEFAULT_CADENCE, seed=None, block_by_week=False, n_jobs=1, compound=None, paths=1000, odds="closing"):
+    df = load_backtest_frame(odds=odds)
+    if df is None:
         return
-    # simple expanding retrain
-    trades = []
-    for i in range(6, len(df)):
-        train = df.iloc[:i]
-        test = df.iloc[i:i+1]
-        X_tr, y_tr = train[FEATURES].fillna(0), train['label']
-        X_te = test[FEATURES].fillna(0)
-        # train a simple model (lightweight) for walk-forward to speed up
-        model = LogisticRegression(max_iter=200)
-        model.fit(X_tr, y_tr)
-        p1 = float(model.predict_proba(X_te)[:,1][0])
-        p2 = 1.0-p1
-        # simulate line-shopping: here we only have one bookmaker in sample; in real life, you'd query multiple books
-        p1_imp = implied_prob_from_decimal(float(test.p1_odd))
-        p2_imp = implied_prob_from_decimal(float(test.p2_odd))
-        p1_fair, p2_fair = remove_vig_two_outcomes(p1_imp, p2_imp)
-        # edges
-        edge_p1 = p1 - p1_fair
-        edge_p2 = p2 - p2_fair
-        # choose best edge side
-        if max(edge_p1, edge_p2) < edge_min:
-            continue
-        side = "P1" if edge_p1>edge_p2 else "P2"
-        model_prob = p1 if side=="P1" else p2
-        dec_odds = float(test.p1_odd if side=="P1" else test.p2_odd)
-        # compute stake using fractional Kelly
-        # convert to b and compute f*
-        b = dec_odds - 1.0
-        if b<=0: continue
-        fstar = max(0.0, (b*model_prob - (1-model_prob))/b)
-        f = min(fstar * kelly_fraction, 0.05)  # cap to 5% per trade
-        bankroll = 1000.0  # simulate fixed bankroll per trade for ROI calc
-        stake = f * bankroll
-        ev = expected_value(model_prob, dec_odds, stake)
-        # resolve outcome using label
-        label = int(test.label)
-        win = (label==1 and side=="P1") or (label==0 and side=="P2")
-        pnl = stake * (dec_odds - 1) if win else -stake
-        trades.append({"match_id":int(test.match_id), "date":test.date.values[0], "side":side, "odds":dec_odds, "prob":model_prob, "stake":stake, "pnl":pnl})
-    trades_df = pd.DataFrame(trades)
+    set_rows(len(df))
+    # expanding walk-forward, refit at the requested cadence
+    X = df[FEATURES].fillna(0).to_numpy()
+    p1_proba = walk_forward_proba(X, df['label'].to_numpy(), df['date'], cadence=retrain)
+    trades_df = simulate_trades(df, p1_proba, edge_min, kelly_fraction)
     if trades_df.empty:
         print("No trades taken in backtest (increase data or lower edge_min).")
         return trades_df
@@ -68,18 +99,33 @@ def run_advanced_backtest(edge_min=0.02, kelly_fraction=0.25, bootstrap_iters=10
     total_staked = trades_df.stake.sum()
     profit = trades_df.pnl.sum()
     roi = profit / total_staked if total_staked>0 else 0.0
-    # bootstrap ROI by resampling trades with replacement
-    rois = []
-    for _ in range(bootstrap_iters):
-        sample = trades_df.sample(n=len(trades_df), replace=True)
-        st = sample.stake.sum()
-        pr = sample.pnl.sum()
-        rois.append(pr/st if st>0 else 0.0)
-    lower = np.percentile(rois, 2.5)
-    upper = np.percentile(rois, 97.5)
-    summary = {"trades":len(trades_df), "total_staked":float(total_staked), "profit":float(profit), "roi":float(roi), "roi_ci":(float(lower), float(upper))}
+    # bootstrap ROI / drawdown / Sharpe / losing streaks by resampling trades (or tournament weeks) with replacement
+    blocks = week_blocks(trades_df.date) if block_by_week else None
+    dist = bootstrap_metrics(trades_df.stake.to_numpy(), trades_df.pnl.to_numpy(), bootstrap_iters, seed=seed, blocks=blocks, n_jobs=n_jobs)
+    summary = {"trades":len(trades_df), "total_staked":float(total_staked), "profit":float(profit), "roi":float(roi)}
+    if dist:
+        summary.update(summarize(dist))
+    if compound:
+        # compounding bankroll with bets of a session sized together, plus Monte Carlo ruin/drawdown
+        summary["portfolio"] = simulate_bankroll(trades_df, compound, kelly_fraction, paths=paths, seed=seed, n_jobs=n_jobs)
     print("Backtest summary:", summary)
     return trades_df, summary
 
 if __name__ == '__main__':
-    run_advanced_backtest()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--edge-min", type=float, default=0.02)
+    parser.add_argument("--kelly-fraction", type=float, default=0.25)
+    parser.add_argument("--bootstrap-iters", type=int, default=1000)
+    parser.add_argument("--retrain", default=DEFAULT_CADENCE, help="week | day | N matches | match (per-match refit, slow)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--block-by-week", action="store_true", help="block bootstrap by tournament week")
+    parser.add_argument("--n-jobs", type=int, default=1, help="bootstrap chunks in parallel (-1 = all cores)")
+    parser.add_argument("--compound", default=None, help="day | week: also simulate a compounding bankroll per session")
+    parser.add_argument("--paths", type=int, default=1000, help="Monte Carlo paths for --compound")
+    parser.add_argument("--odds", default="closing", help="closing: matches table odds | best: line-shop across books in odds_index")
+    add_profile_args(parser)
+    args = parser.parse_args()
+    with profiled(args.profile):
+        run_advanced_backtest(args.edge_min, args.kelly_fraction, args.bootstrap_iters, parse_cadence(args.retrain),
+                              seed=args.seed, block_by_week=args.block_by_week, n_jobs=args.n_jobs,
+                              compound=args.compound, paths=args.paths, odds=args.odds)
@@ -1,53 +1,50 @@
 import argparse, io, json
+import numpy as np
 import pandas as pd
 import joblib
 from ..utils.db import get_conn
-from ..odds.odds_utils import implied_prob_from_decimal, remove_vig_two_outcomes
-from ..ev.decision import stake_size, expected_value
-from sklearn.linear_model import LogisticRegression
+from ..odds.odds_utils import implied_probs, devig
+from ..ev.decision import stake_sizes, expected_values
+from .walk_forward import walk_forward_proba, parse_cadence, DEFAULT_CADENCE
+from ..utils.profiling import stage, set_rows, add_profile_args, profiled
 
 FEATURES = ["elo_diff", "h2h_p1", "form_p1", "form_p2"]
 
-def run_backtest():
+@stage("run_backtest")
+def run_backtest(retrain=DEFAULT_CADENCE):
     conn = get_conn()
     df = conn.execute('''
-        SELECT f.*, m.p1_odd, m.p2_odd
+        SELECT f.*, m.date, m.p1_odd, m.p2_odd
         FROM features f
         JOIN matches m USING(match_id)
-        ORDER BY m.date
+        ORDER BY m.date, m.match_id
     ''').fetchdf()
     if df.empty:
         print("No data. Ingest + feature build first.")
         return
-    # simple expanding-window walk-forward
-    results = []
-    for i in range(6, len(df)):  # require at least 6 samples to start
-        train = df.iloc[:i]
-        test = df.iloc[i:i+1]
-        X_tr, y_tr = train[FEATURES], train["label"]
-        X_te = test[FEATURES]
-        model = LogisticRegression(max_iter=200)
-        model.fit(X_tr, y_tr)
-        p1 = float(model.predict_proba(X_te)[:,1][0])
-        # bookmaker implied
-        p1_imp = implied_prob_from_decimal(float(test.p1_odd))
-        p2_imp = implied_prob_from_decimal(float(test.p2_odd))
-        p1_fair, p2_fair = remove_vig_two_outcomes(p1_imp, p2_imp)
-        # choose side with +EV
-        pick_side = "P1" if p1 > (1-p1_fair) else "P2"
-        model_prob = p1 if pick_side=="P1" else 1-p1
-        dec_odds = float(test.p1_odd if pick_side=="P1" else test.p2_odd)
-        stake = stake_size(model_prob, dec_odds)
-        ev = expected_value(model_prob, dec_odds, stake)
-        results.append({
-            "match_id": int(test.match_id),
-            "pick": pick_side,
-            "model_prob": model_prob,
-            "odds": dec_odds,
-            "stake": stake,
-            "EV": ev
-        })
-    bt = pd.DataFrame(results)
+    set_rows(len(df))
+    # expanding-window walk-forward, refit at the requested cadence
+    p1_proba = walk_forward_proba(df[FEATURES].to_numpy(), df["label"].to_numpy(), df["date"], cadence=retrain)
+    tested = ~np.isnan(p1_proba)
+    df, p1 = df[tested], p1_proba[tested]
+    o1 = df.p1_odd.to_numpy(dtype=float); o2 = df.p2_odd.to_numpy(dtype=float)
+    # bookmaker implied
+    p1_fair, _ = devig(implied_probs(o1), implied_probs(o2))
+    # choose side with +EV
+    pick1 = p1 > (1-p1_fair)
+    model_prob = np.where(pick1, p1, 1-p1)
+    dec_odds = np.where(pick1, o1, o2)
+    stake = stake_sizes(model_prob, dec_odds)
+    ev = expected_values(model_prob, dec_odds, stake)
+    ok = ~np.isnan(p1_fair)
+    bt = pd.DataFrame({
+        "match_id": df.match_id.to_numpy()[ok].astype(int),
+        "pick": np.where(pick1, "P1", "P2")[ok],
+        "model_prob": model_prob[ok],
+        "odds": dec_odds[ok],
+        "stake": stake[ok],
+        "EV": ev[ok]
+    })
     if not bt.empty:
         print(bt.head())
         print("\nBacktest summary:")
@@ -58,6 +55,9 @@ def run_backtest():
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--run", action="store_true")
+    parser.add_argument("--retrain", default=DEFAULT_CADENCE, help="week | day | N matches | match (per-match refit, slow)")
+    add_profile_args(parser)
     args = parser.parse_args()
-    if args.run:
-        run_backtest()
+    with profiled(args.profile):
+        if args.run:
+            run_backtest(parse_cadence(args.retrain))
@@ -0,0 +1,177 @@
+import argparse, os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from ..ev.decision import BANKROLL
+from ..utils.profiling import stage
+
+# Compounding bankroll simulation of a trade log.
+# Trades settled in the same session (calendar day or tournament week) are sized together:
+# the full-Kelly fractions maximise the expected log of the session's combined result for
+# independent bets, then fractional Kelly, a per-bet cap and a per-session exposure cap
+# are applied. Stakes are fractions of the bankroll at the start of the session, so the
+# bankroll compounds session by session. Monte Carlo paths draw every outcome from the
+# model probabilities as one (paths, trades) matrix; per-session growth factors come from
+# np.add.reduceat and the wealth paths from a cumprod, chunked like the bootstrap.
+
+MAX_CELLS = 4_000_000
+MAX_SESSION_EXPOSURE = float(os.getenv("MAX_SESSION_EXPOSURE", "0.25"))  # bankroll share staked per session
+EXACT_MAX_BETS = 10      # sessions up to this size get the exact solve, larger ones the second-order one
+NEWTON_ITERS = 25
+RUIN_FRACTION = 0.1      # a path is ruined once the bankroll falls to this share of the start
+
+def session_ids(dates, session="day"):
+    # dense session id per trade; trades must be in date order
+    d = pd.to_datetime(pd.Series(dates))
+    if session == "week":
+        key = d.dt.to_period("W")
+    elif session == "day":
+        key = d.dt.normalize()
+    else:
+        raise ValueError(f"session must be day or week, got {session!r}")
+    ids = pd.factorize(key)[0]
+    if len(ids) and np.any(np.diff(ids) < 0):
+        raise ValueError("trades must be in date order")
+    return ids
+
+def _newton(p, b, f):
+    # exact full-Kelly for a batch of equal-size sessions: (S, k) arrays, outcomes enumerated
+    S, k = p.shape
+    outcomes = ((np.arange(2 ** k)[:, None] >> np.arange(k)) & 1).astype(bool)           # (M, k)
+    r = np.where(outcomes[None], b[:, None, :], -1.0)                                       # (S, M, k)
+    logp = np.where(outcomes[None], np.log(p)[:, None, :], np.log1p(-p)[:, None, :]).sum(axis=2)
+    w = np.exp(logp)                                                                        # (S, M)
+    # start inside the feasible set: the all-lose outcome keeps at least half the bankroll
+    f = f * np.minimum(1.0, 0.5 / np.maximum(f.sum(axis=1), 1e-300))[:, None]
+    for _ in range(NEWTON_ITERS):
+        wealth = 1.0 + np.einsum("smk,sk->sm", r, f)
+        q = w / wealth
+        grad = np.einsum("sm,smk->sk", q, r)
+        hess = -np.einsum("sm,smk,sml->skl", q / wealth, r, r)
+        step = np.linalg.solve(hess, -grad[..., None])[..., 0]
+        # damped so every outcome keeps a positive bankroll and no stake turns negative
+        alpha = np.ones(S)
+        for _ in range(40):
+            new = f + alpha[:, None] * step
+            bad = ((1.0 + np.einsum("smk,sk->sm", r, new)).min(axis=1) <= 1e-9) | (new < 0).any(axis=1)
+            if not bad.any():
+                break
+            alpha[bad] *= 0.5
+        f = np.where(bad[:, None], f, new)
+        if np.abs(alpha[:, None] * step).max() < 1e-12:
+            break
+    return f
+
+def concurrent_kelly(p, odds, sessions, exact_max=EXACT_MAX_BETS, max_cells=MAX_CELLS):
+    # full-Kelly bankroll fractions for independent bets settled together in each session
+    p = np.asarray(p, dtype=float); b = np.asarray(odds, dtype=float) - 1.0
+    sessions = np.asarray(sessions)
+    mu = p * b - (1.0 - p)               # expected return per unit staked
+    var = p * b * b + (1.0 - p) - mu * mu
+    pos = (mu > 0) & (b > 0) & (p < 1.0)
+    # second order: maximise f.mu - f'E[rr']f/2 with E[rr'] = diag(var) + mu mu'
+    # (independent bets); Sherman-Morrison gives f = (mu/var) / (1 + sum mu^2/var)
+    ratio = np.divide(mu, var, out=np.zeros_like(mu), where=pos)
+    shrink = 1.0 + np.bincount(sessions, weights=mu * ratio, minlength=sessions.max() + 1 if len(sessions) else 0)
+    f = ratio / shrink[sessions]
+    if not exact_max or not len(f):
+        return f
+    # exact solve, batched over sessions with the same number of positive-edge bets
+    idx = np.flatnonzero(pos)
+    sizes = np.bincount(sessions[idx], minlength=shrink.size)
+    for k in range(1, exact_max + 1):
+        sel = idx[sizes[sessions[idx]] == k]
+        if not len(sel):
+            continue
+        rows = sel.reshape(-1, k)   # positive bets of one session are contiguous in date order
+        chunk = max(1, max_cells // (k * 2 ** k))
+        for s in range(0, len(rows), chunk):
+            r = rows[s:s + chunk]
+            f[r] = _newton(p[r], b[r], f[r])
+    return f
+
+def allocate(p, odds, sessions, kelly_mult=0.25, max_fraction=0.05, max_exposure=MAX_SESSION_EXPOSURE, exact_max=EXACT_MAX_BETS):
+    # staked bankroll fraction per trade: fractional concurrent Kelly, per-bet and per-session caps
+    f = np.minimum(concurrent_kelly(p, odds, sessions, exact_max) * kelly_mult, max_fraction)
+    exposure = np.bincount(sessions, weights=f)
+    scale = np.where(exposure > max_exposure, max_exposure / np.maximum(exposure, 1e-300), 1.0)
+    return f * scale[sessions]
+
+def wealth_paths(win, f, b, starts):
+    # (paths, trades) outcomes -> (paths, sessions) bankroll multiples after each session
+    ret = np.where(win, f * b, -f)
+    growth = 1.0 + np.add.reduceat(ret, starts, axis=1)
+    return np.cumprod(growth, axis=1, out=growth)
+
+def path_stats(wealth, ruin=RUIN_FRACTION):
+    peak = np.maximum(np.maximum.accumulate(wealth, axis=1), 1.0)
+    return {"final": wealth[:, -1], "min": np.minimum(wealth.min(axis=1), 1.0),
+            "max_drawdown": (1.0 - wealth / peak).max(axis=1), "ruined": wealth.min(axis=1) <= ruin}
+
+def _mc_chunk(p, f, b, starts, paths, seed_seq, ruin):
+    rng = np.random.default_rng(seed_seq)
+    win = rng.random((paths, len(p))) < p
+    return path_stats(wealth_paths(win, f, b, starts), ruin)
+
+@stage("bankroll")
+def simulate_bankroll(trades, session="day", kelly_mult=0.25, max_fraction=0.05, max_exposure=MAX_SESSION_EXPOSURE,
+                      paths=1000, bankroll=BANKROLL, ruin=RUIN_FRACTION, seed=None, n_jobs=1, exact_max=EXACT_MAX_BETS, max_cells=MAX_CELLS):
+    # trades: simulate_trades output (date order, prob/odds of the side taken, pnl for the realised outcome)
+    if trades is None or len(trades) == 0:
+        return {}
+    sessions = session_ids(trades["date"], session)
+    p = trades["prob"].to_numpy(dtype=float)
+    o = trades["odds"].to_numpy(dtype=float)
+    f = allocate(p, o, sessions, kelly_mult, max_fraction, max_exposure, exact_max)
+    b = o - 1.0
+    starts = np.flatnonzero(np.r_[True, np.diff(sessions) != 0])
+    hist = path_stats(wealth_paths((trades["pnl"].to_numpy() > 0)[None, :], f, b, starts), ruin)
+    exposure = np.add.reduceat(f, starts)
+    out = {
+        "session": session, "sessions": int(len(starts)), "trades": int(len(p)),
+        "max_session_bets": int(np.diff(np.r_[starts, len(p)]).max()),
+        "mean_exposure": float(exposure.mean()), "max_exposure": float(exposure.max()),
+        "final_bankroll": float(bankroll * hist["final"][0]), "max_drawdown": float(hist["max_drawdown"][0]),
+    }
+    if paths > 0:
+        chunk = max(1, min(paths, max_cells // len(p)))
+        sizes = [min(chunk, paths - i) for i in range(0, paths, chunk)]
+        seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+        args = (p, f, b, starts)
+        if n_jobs == 1 or len(sizes) == 1:
+            parts = [_mc_chunk(*args, k, ss, ruin) for k, ss in zip(sizes, seeds)]
+        else:
+            with ProcessPoolExecutor(max_workers=n_jobs if n_jobs > 0 else None) as ex:
+                parts = list(ex.map(_mc_chunk, *([a] * len(sizes) for a in args), sizes, seeds, [ruin] * len(sizes)))
+        mc = {k: np.concatenate([part[k] for part in parts]) for k in parts[0]}
+        out.update({
+            "paths": paths,
+            "ruin_prob": float(mc["ruined"].mean()),
+            "final_bankroll_quantiles": {q: float(bankroll * np.percentile(mc["final"], q)) for q in (5, 50, 95)},
+            "max_drawdown_quantiles": {q: float(np.percentile(mc["max_drawdown"], q)) for q in (50, 90, 99)},
+            "prob_below_start": float((mc["final"] < 1.0).mean()),
+        })
+    return out
+
+if __name__ == "__main__":
+    # sizes the trades of a walk-forward backtest and simulates the bankroll
+    from .advanced_backtest import load_backtest_frame, simulate_trades, FEATURES
+    from .walk_forward import walk_forward_proba, parse_cadence, DEFAULT_CADENCE
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--retrain", default=DEFAULT_CADENCE, help="week | day | N matches | match (per-match refit, slow)")
+    parser.add_argument("--edge-min", type=float, default=0.02)
+    parser.add_argument("--kelly-fraction", type=float, default=0.25)
+    parser.add_argument("--max-fraction", type=float, default=0.05, help="cap per bet, share of bankroll")
+    parser.add_argument("--max-exposure", type=float, default=MAX_SESSION_EXPOSURE, help="cap per session, share of bankroll")
+    parser.add_argument("--session", default="day", help="day | week: bets sized together and settled before compounding")
+    parser.add_argument("--paths", type=int, default=10000, help="Monte Carlo outcome paths")
+    parser.add_argument("--ruin", type=float, default=RUIN_FRACTION, help="bankroll share that counts as ruin")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--n-jobs", type=int, default=1, help="path chunks in parallel (-1 = all cores)")
+    args = parser.parse_args()
+    df = load_backtest_frame()
+    if df is not None:
+        proba = walk_forward_proba(df[FEATURES].fillna(0).to_numpy(), df["label"].to_numpy(), df["date"], cadence=parse_cadence(args.retrain))
+        trades = simulate_trades(df, proba, args.edge_min, args.kelly_fraction, args.max_fraction)
+        print(simulate_bankroll(trades, args.session, args.kelly_fraction, args.max_fraction, args.max_exposure, args.paths,
+                                ruin=args.ruin, seed=args.seed, n_jobs=args.n_jobs))
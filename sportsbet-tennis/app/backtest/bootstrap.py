@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+from ..utils.profiling import stage
+from concurrent.futures import ProcessPoolExecutor
+
+# Vectorized bootstrap of the trade log.
+# Each chunk draws its resamples as one (iters, n_trades) index matrix and computes every
+# metric along axis 1, so no per-iteration DataFrame is ever built. Chunks are sized to
+# keep the index matrix under MAX_CELLS entries; each chunk gets its own child seed from
+# SeedSequence(seed), so results are identical whatever n_jobs is.
+
+MAX_CELLS = 4_000_000  # ~32MB per float64 matrix
+
+def week_blocks(dates):
+    # tournament-week block id per trade (trades must already be in date order)
+    weeks = pd.to_datetime(pd.Series(dates)).dt.to_period("W")
+    return pd.factorize(weeks)[0]
+
+def _block_layout(blocks):
+    blocks = np.asarray(blocks)
+    change = np.flatnonzero(np.diff(blocks) != 0) + 1
+    starts = np.concatenate([[0], change])
+    lengths = np.diff(np.append(starts, len(blocks)))
+    return starts, lengths
+
+def draw_indices(n, iters, rng, layout=None):
+    if layout is None:
+        return rng.integers(0, n, size=(iters, n), dtype=np.int32 if n < 2**31 else np.int64)
+    # block bootstrap: concatenate randomly drawn blocks and truncate each path to n trades
+    starts, lengths = layout
+    n_draw = int(np.ceil(2 * n / lengths.mean())) + 1
+    picks = rng.integers(0, len(starts), size=(iters, n_draw))
+    ends = np.cumsum(lengths[picks], axis=1)
+    short = ends[:, -1] < n
+    while short.any():
+        # astronomically rare with 2x oversampling; redraw the short paths
+        picks[short] = rng.integers(0, len(starts), size=(int(short.sum()), n_draw))
+        ends = np.cumsum(lengths[picks], axis=1)
+        short = ends[:, -1] < n
+    # locate position j of every path inside its block sequence with one global searchsorted
+    offset = (np.arange(iters) * (ends[:, -1].max() + 1))[:, None]
+    pos = np.arange(n)[None, :] + offset
+    k = np.searchsorted((ends + offset).ravel(), pos.ravel(), side="right").reshape(iters, n)
+    k -= (np.arange(iters) * n_draw)[:, None]
+    rows = np.arange(iters)[:, None]
+    block = picks[rows, k]
+    block_begin = ends[rows, k] - lengths[block]
+    return starts[block] + (np.arange(n)[None, :] - block_begin)
+
+def longest_run(mask):
+    # longest run of True along axis 1
+    c = np.cumsum(mask, axis=1, dtype=np.int32)
+    reset = np.maximum.accumulate(np.where(mask, 0, c), axis=1)
+    return (c - reset).max(axis=1)
+
+def path_metrics(stake, pnl, idx):
+    # per-trade Sharpe on return-on-stake; per-trade quantities are gathered, never recomputed per path
+    ret = np.divide(pnl, stake, out=np.zeros_like(pnl), where=stake > 0)
+    staked = stake[idx].sum(axis=1)
+    p = pnl[idx]
+    profit = p.sum(axis=1)
+    roi = np.divide(profit, staked, out=np.zeros_like(profit), where=staked > 0)
+    equity = np.cumsum(p, axis=1, out=p)
+    max_dd = (np.maximum(np.maximum.accumulate(equity, axis=1), 0.0) - equity).max(axis=1)
+    r = ret[idx]
+    mean = r.mean(axis=1)
+    sd = np.sqrt(np.maximum((r * r).mean(axis=1) - mean * mean, 0.0))
+    sharpe = np.divide(mean, sd, out=np.zeros_like(sd), where=sd > 0)
+    return {"roi": roi, "profit": profit, "max_drawdown": max_dd, "sharpe": sharpe,
+            "longest_losing_streak": longest_run((pnl < 0)[idx])}
+
+def _run_chunk(stake, pnl, iters, seed_seq, layout):
+    rng = np.random.default_rng(seed_seq)
+    idx = draw_indices(len(stake), iters, rng, layout)
+    return path_metrics(stake, pnl, idx)
+
+@stage("bootstrap")
+def bootstrap_metrics(stake, pnl, iters=1000, seed=None, blocks=None, n_jobs=1, max_cells=MAX_CELLS):
+    stake = np.asarray(stake, dtype=float)
+    pnl = np.asarray(pnl, dtype=float)
+    n = len(stake)
+    if n == 0 or iters <= 0:
+        return {}
+    layout = _block_layout(blocks) if blocks is not None else None
+    chunk = max(1, min(iters, max_cells // n))
+    sizes = [min(chunk, iters - i) for i in range(0, iters, chunk)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    if n_jobs == 1 or len(sizes) == 1:
+        parts = [_run_chunk(stake, pnl, k, ss, layout) for k, ss in zip(sizes, seeds)]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs if n_jobs > 0 else None) as ex:
+            parts = list(ex.map(_run_chunk, [stake]*len(sizes), [pnl]*len(sizes), sizes, seeds, [layout]*len(sizes)))
+    return {k: np.concatenate([p[k] for p in parts]) for k in parts[0]}
+
+def summarize(dist, alpha=0.05):
+    lo, hi = 100 * alpha / 2, 100 * (1 - alpha / 2)
+    out = {}
+    for k in ("roi", "max_drawdown", "sharpe"):
+        out[f"{k}_ci"] = (float(np.percentile(dist[k], lo)), float(np.percentile(dist[k], hi)))
+    streaks = dist["longest_losing_streak"]
+    out["losing_streak_quantiles"] = {q: int(np.percentile(streaks, q)) for q in (50, 90, 99)}
+    return out
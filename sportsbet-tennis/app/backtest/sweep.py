@@ -0,0 +1,182 @@
+import argparse, itertools, time
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from ..utils.db import get_conn
+from ..utils.shm import publish, attach, release
+from ..utils.profiling import stage, set_rows, add_profile_args, profiled
+from ..odds.odds_utils import devig, DEVIG_METHODS
+from ..ev.decision import stake_sizes
+from .walk_forward import walk_forward_proba, parse_cadence, DEFAULT_CADENCE
+from .advanced_backtest import FEATURES, load_backtest_frame, simulate_trades, market_implied
+from .bootstrap import bootstrap_metrics, summarize
+
+# Grid search over model and staking configs for the advanced backtest.
+# The joined features/matches frame is loaded once and published to workers as shared
+# memory blocks. Walk-forward probabilities are fitted once per retrain cadence and
+# written straight into a shared (n_models, n) block. Every (devig, edge_min, kelly,
+# cap) point is then scored with the same rules as simulate_trades, broadcast over a
+# chunk of points at a time, and all rows land in sweep_results with their timings.
+
+MAX_CELLS = 4_000_000   # points x matches per evaluation chunk (~32MB per float64 matrix)
+BANKROLL = 1000.0
+
+_shared = {}   # name -> ndarray; views onto the shared blocks inside workers
+
+def _attach(specs):
+    attach(specs, _shared)
+
+def _fit(k, cadence):
+    t0 = time.perf_counter()
+    dates = pd.to_datetime(_shared["dates"])
+    _shared["proba"][k] = walk_forward_proba(_shared["X"], _shared["y"], dates, cadence=cadence)
+    return k, time.perf_counter() - t0
+
+def _evaluate(k, devig_method, points, bootstrap_iters=0, seed=None):
+    # points: (G, 3) rows of (edge_min, kelly_fraction, max_fraction)
+    t0 = time.perf_counter()
+    p1 = _shared["proba"][k]
+    o1, o2, label = _shared["o1"], _shared["o2"], _shared["y"]
+    p1_fair, p2_fair = devig(_shared["i1"], _shared["i2"], devig_method)
+    edge_p1 = p1 - p1_fair
+    edge_p2 = (1.0 - p1) - p2_fair
+    side1 = edge_p1 > edge_p2
+    prob = np.where(side1, p1, 1.0 - p1)
+    odds = np.where(side1, o1, o2)
+    best = np.maximum(edge_p1, edge_p2)
+    ok = ~np.isnan(edge_p1) & ~np.isnan(edge_p2) & (odds > 1.0)
+    win = np.where(side1, label == 1, label == 0)
+    edge_min, kelly, cap = (points[:, j:j+1] for j in range(3))
+    rows = []
+    step = max(1, MAX_CELLS // max(len(p1), 1))
+    for s in range(0, len(points), step):
+        sl = slice(s, s + step)
+        take = ok & (best >= edge_min[sl])
+        stake = np.where(take, stake_sizes(prob, odds, BANKROLL, kelly[sl], cap[sl]), 0.0)
+        pnl = np.where(win, stake * (odds - 1), -stake)
+        trades = take.sum(axis=1)
+        staked = stake.sum(axis=1)
+        profit = pnl.sum(axis=1)
+        equity = np.cumsum(pnl, axis=1)
+        max_dd = (np.maximum(np.maximum.accumulate(equity, axis=1), 0.0) - equity).max(axis=1)
+        ret = np.divide(pnl, stake, out=np.zeros_like(pnl), where=stake > 0)
+        cnt = np.maximum(trades, 1)
+        mean = ret.sum(axis=1) / cnt
+        sd = np.sqrt(np.maximum((ret * ret).sum(axis=1) / cnt - mean * mean, 0.0))
+        for g in range(len(trades)):
+            row = {"trades": int(trades[g]), "total_staked": float(staked[g]), "profit": float(profit[g]),
+                   "roi": float(profit[g] / staked[g]) if staked[g] > 0 else 0.0,
+                   "max_drawdown": float(max_dd[g]), "sharpe": float(mean[g] / sd[g]) if sd[g] > 0 else 0.0,
+                   "roi_ci_lo": None, "roi_ci_hi": None}
+            if bootstrap_iters and trades[g]:
+                dist = bootstrap_metrics(stake[g][take[g]], pnl[g][take[g]], bootstrap_iters, seed=seed)
+                row["roi_ci_lo"], row["roi_ci_hi"] = summarize(dist)["roi_ci"]
+            rows.append(row)
+    per_point = (time.perf_counter() - t0) / max(len(points), 1)
+    for row, (e, kf, mf) in zip(rows, points):
+        row.update(devig_method=devig_method, edge_min=float(e), kelly_fraction=float(kf), max_fraction=float(mf),
+                   eval_seconds=per_point)
+    return k, rows
+
+def _tasks(grid, n, chunk_points):
+    # split each (model, devig) grid into chunks of points
+    for k, devig_method in itertools.product(range(n), grid["devig_method"]):
+        pts = np.array(list(itertools.product(grid["edge_min"], grid["kelly_fraction"], grid["max_fraction"])), dtype=float)
+        for s in range(0, len(pts), chunk_points):
+            yield k, devig_method, pts[s:s + chunk_points]
+
+@stage("run_sweep")
+def run_sweep(retrain=(DEFAULT_CADENCE,), devig_methods=("proportional",), edge_mins=(0.02,), kelly_fractions=(0.25,),
+              max_fractions=(0.05,), bootstrap_iters=0, seed=None, n_jobs=1, chunk_points=50, sweep_id=None):
+    t_start = time.perf_counter()
+    conn = get_conn()
+    df = load_backtest_frame(conn)
+    if df is None:
+        conn.close()
+        return None
+    set_rows(len(df))
+    cadences = [parse_cadence(c) for c in retrain]
+    for m in devig_methods:
+        if m not in DEVIG_METHODS:
+            raise ValueError(f"unknown de-vig method: {m!r}")
+    grid = {"devig_method": list(devig_methods), "edge_min": list(edge_mins),
+            "kelly_fraction": list(kelly_fractions), "max_fraction": list(max_fractions)}
+    arrays = {
+        "X": df[FEATURES].fillna(0).to_numpy(dtype=float),
+        "y": df["label"].to_numpy(dtype=np.int8),
+        "dates": pd.to_datetime(df["date"]).to_numpy(dtype="datetime64[ns]"),
+        "o1": df.p1_odd.to_numpy(dtype=float), "o2": df.p2_odd.to_numpy(dtype=float),
+        **dict(zip(("i1", "i2"), market_implied(df))),
+        "proba": np.full((len(cadences), len(df)), np.nan),
+    }
+    fit_seconds, rows, blocks = {}, [], []
+    try:
+        if n_jobs == 1:
+            _shared.update(arrays)
+            fit_seconds = dict(_fit(k, c) for k, c in enumerate(cadences))
+            results = [_evaluate(k, m, pts, bootstrap_iters, seed) for k, m, pts in _tasks(grid, len(cadences), chunk_points)]
+        else:
+            blocks, specs = publish(arrays)
+            with ProcessPoolExecutor(max_workers=n_jobs if n_jobs > 0 else None, initializer=_attach, initargs=(specs,)) as ex:
+                fit_seconds = dict(ex.map(_fit, range(len(cadences)), cadences))
+                tasks = list(_tasks(grid, len(cadences), chunk_points))
+                results = list(ex.map(_evaluate, *zip(*tasks), [bootstrap_iters]*len(tasks), [seed]*len(tasks)))
+        for k, part in results:
+            for row in part:
+                row.update(retrain=str(cadences[k]), fit_seconds=fit_seconds[k])
+                rows.append(row)
+    finally:
+        _shared.clear()
+        release(blocks)
+    out = pd.DataFrame(rows)
+    out["sweep_id"] = sweep_id or datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+    out["created_at"] = datetime.utcnow()
+    conn.register("sweep_df", out)
+    conn.execute("INSERT OR REPLACE INTO sweep_results BY NAME SELECT * FROM sweep_df")
+    conn.unregister("sweep_df")
+    conn.close()
+    elapsed = time.perf_counter() - t_start
+    print(f"Sweep {out.sweep_id.iloc[0]}: {len(out)} configs over {len(df)} matches in {elapsed:.1f}s "
+          f"(fits {sum(fit_seconds.values()):.1f}s)")
+    print(out.sort_values("roi", ascending=False).head(10)[
+        ["retrain","devig_method","edge_min","kelly_fraction","max_fraction","trades","roi","max_drawdown","sharpe"]].to_string(index=False))
+    return out
+
+def check_sweep(out, retrain=DEFAULT_CADENCE, samples=5, seed=0):
+    # re-score a few grid points with simulate_trades and compare totals
+    df = load_backtest_frame()
+    proba = walk_forward_proba(df[FEATURES].fillna(0).to_numpy(), df["label"].to_numpy(), df["date"], cadence=parse_cadence(retrain))
+    sub = out[out.retrain == str(parse_cadence(retrain))]
+    worst = 0.0
+    for _, r in sub.sample(min(samples, len(sub)), random_state=seed).iterrows():
+        t = simulate_trades(df, proba, r.edge_min, r.kelly_fraction, r.max_fraction, BANKROLL, r.devig_method)
+        worst = max(worst, abs(len(t) - r.trades), abs(float(t.pnl.sum()) - r.profit), abs(float(t.stake.sum()) - r.total_staked))
+    print(f"max |difference| vs simulate_trades: {worst:.2e} ({'OK' if worst <= 1e-6 else 'MISMATCH'})")
+    return worst <= 1e-6
+
+def _floats(text):
+    return [float(v) for v in text.split(",") if v.strip()]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--retrain", default=DEFAULT_CADENCE, help="comma list of cadences: week | day | N matches | match")
+    parser.add_argument("--devig", default="proportional", help=f"comma list of {', '.join(DEVIG_METHODS)}")
+    parser.add_argument("--edge-min", default="0,0.01,0.02,0.03,0.05")
+    parser.add_argument("--kelly-fraction", default="0.1,0.25,0.5")
+    parser.add_argument("--max-fraction", default="0.02,0.05")
+    parser.add_argument("--bootstrap-iters", type=int, default=0, help="per-point bootstrap ROI CI (0 = off)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--n-jobs", type=int, default=1, help="worker processes (-1 = all cores)")
+    parser.add_argument("--chunk-points", type=int, default=50, help="grid points per worker task")
+    parser.add_argument("--sweep-id", default=None)
+    parser.add_argument("--check", action="store_true", help="re-score a few points with simulate_trades")
+    add_profile_args(parser)
+    args = parser.parse_args()
+    with profiled(args.profile):
+        cadences = [c.strip() for c in args.retrain.split(",") if c.strip()]
+        out = run_sweep(cadences, [m.strip() for m in args.devig.split(",") if m.strip()],
+                        _floats(args.edge_min), _floats(args.kelly_fraction), _floats(args.max_fraction),
+                        args.bootstrap_iters, args.seed, args.n_jobs, args.chunk_points, args.sweep_id)
+        if args.check and out is not None:
+            check_sweep(out, cadences[0])
@@ -0,0 +1,79 @@
+import argparse, time
+import multiprocessing as mp
+import numpy as np
+from ..utils.db import get_conn
+from ..models.compiled import COMPILED_SUFFIX
+from ..models.artifacts import load_artifact, pointer, ARTIFACT_CACHE_DIR
+
+# Model load time and resident memory per API worker: every worker decompressing and
+# unpickling its own copy from DuckDB (the pre-versioning path) versus opening the shared
+# mmap cache. Workers stay alive until all of them have loaded, so PSS (proportional set
+# size, Linux only) shows how much of each worker's RSS is actually shared.
+
+def memory_kb():
+    # (rss, pss) of this process in kB; pss is None where /proc has no smaps_rollup
+    rss = pss = None
+    try:
+        with open("/proc/self/status") as f:
+            rss = next(int(l.split()[1]) for l in f if l.startswith("VmRSS:"))
+        with open("/proc/self/smaps_rollup") as f:
+            pss = next(int(l.split()[1]) for l in f if l.startswith("Pss:"))
+    except (OSError, StopIteration):
+        if rss is None:
+            import resource
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss, pss
+
+def _worker(name, mmap, barrier, out):
+    conn = get_conn(readonly=True)
+    rss0, pss0 = memory_kb()
+    t0 = time.perf_counter()
+    model, _, _ = load_artifact(conn, name, mmap=mmap)
+    if getattr(model, "compiled", False):
+        model.warmup()
+    seconds = time.perf_counter() - t0
+    conn.close()
+    barrier.wait()   # everyone holds a loaded model now
+    rss1, pss1 = memory_kb()
+    out.put((seconds, rss1 - rss0, (pss1 - pss0) if pss0 is not None else None))
+    barrier.wait()
+
+def run(name, mmap, workers):
+    ctx = mp.get_context("spawn")
+    barrier, out = ctx.Barrier(workers), ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(name, mmap, barrier, out)) for _ in range(workers)]
+    for p in procs:
+        p.start()
+    rows = [out.get() for _ in procs]
+    for p in procs:
+        p.join()
+    return np.array([[r[0], r[1], r[2] if r[2] is not None else np.nan] for r in rows])
+
+def main(name=None, workers=4):
+    conn = get_conn(readonly=True)
+    if name is None:
+        name = "model_latest" + COMPILED_SUFFIX if pointer(conn, "model_latest" + COMPILED_SUFFIX) else "model_latest"
+    ptr = pointer(conn, name)
+    if ptr is None:
+        conn.close()
+        print("No model found. Train a model first.")
+        return None
+    load_artifact(conn, name)   # populate the cache so the mmap run measures warm loads
+    conn.close()
+    print(f"{name} v{ptr['version']} ({ptr['codec']}), {workers} workers, cache {ARTIFACT_CACHE_DIR}")
+    results = {}
+    for label, mmap in (("db_unpickle", False), ("mmap_cache", True)):
+        r = run(name, mmap, workers)
+        results[label] = {"load_ms": float(np.mean(r[:, 0]) * 1000), "rss_kb": float(np.mean(r[:, 1])),
+                          "pss_kb": float(np.nanmean(r[:, 2])) if not np.isnan(r[:, 2]).all() else None}
+        res = results[label]
+        pss = f"{res['pss_kb']:10.0f} kB PSS" if res["pss_kb"] is not None else ""
+        print(f"{label:12s} {res['load_ms']:8.1f} ms load  {res['rss_kb']:10.0f} kB RSS  {pss}  (per worker)")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--name", default=None, help="artifact to load (default: the compiled model if there is one)")
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+    main(args.name, args.workers)
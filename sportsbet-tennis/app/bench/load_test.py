@@ -0,0 +1,73 @@
+import argparse, random, threading, time
+import numpy as np
+import requests
+from ..utils.db import get_conn
+
+# Closed-loop HTTP load test against a running API: N clients each send POST /signal
+# back to back for a fixed duration. Reports requests/s and latency percentiles per
+# concurrency level, so thread-pool starvation shows up as flat rps and a growing tail.
+
+LEVELS = (1, 8, 64)
+
+def sample_payloads(n=500, seed=0):
+    # real match ids (with features or upcoming) and plausible odds
+    conn = get_conn(readonly=True)
+    ids = [r[0] for r in conn.execute("SELECT match_id FROM matches ORDER BY random() LIMIT ?", [n]).fetchall()]
+    conn.close()
+    rng = random.Random(seed)
+    return [{"match_id": m, "p1_decimal": round(rng.uniform(1.2, 4.0), 2), "p2_decimal": round(rng.uniform(1.2, 4.0), 2)}
+            for m in ids]
+
+def _client(url, payloads, stop, out, errors, seed):
+    rng = random.Random(seed)
+    session = requests.Session()
+    lat = []
+    while not stop.is_set():
+        t = time.perf_counter()
+        try:
+            r = session.post(url, json=rng.choice(payloads), timeout=30)
+            ok = r.status_code == 200
+        except requests.RequestException:
+            ok = False
+        lat.append(time.perf_counter() - t)
+        if not ok:
+            errors.append(1)
+    out.append(lat)
+
+def run_level(url, payloads, clients, duration):
+    stop, out, errors = threading.Event(), [], []
+    threads = [threading.Thread(target=_client, args=(url, payloads, stop, out, errors, i)) for i in range(clients)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    lat = np.concatenate([np.array(l) for l in out]) * 1000 if out else np.array([])
+    return {"clients": clients, "requests": int(len(lat)), "errors": len(errors), "rps": len(lat) / elapsed,
+            **{f"p{q}_ms": float(np.percentile(lat, q)) if len(lat) else None for q in (50, 90, 99)}}
+
+def main(base_url="http://127.0.0.1:8000", levels=LEVELS, duration=10.0, warmup=2.0):
+    payloads = sample_payloads()
+    if not payloads:
+        print("No matches found. Ingest data first.")
+        return None
+    url = base_url.rstrip("/") + "/signal"
+    run_level(url, payloads, 1, warmup)   # model load, numba compile, caches
+    results = []
+    for c in levels:
+        r = run_level(url, payloads, c, duration)
+        results.append(r)
+        print(f"{c:4d} clients: {r['rps']:8.1f} req/s  p50 {r['p50_ms']:7.1f} ms  p90 {r['p90_ms']:7.1f} ms  "
+              f"p99 {r['p99_ms']:7.1f} ms  errors {r['errors']}")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--clients", default=",".join(map(str, LEVELS)), help="comma list of concurrency levels")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per level")
+    args = parser.parse_args()
+    main(args.url, [int(c) for c in args.clients.split(",") if c.strip()], args.duration)
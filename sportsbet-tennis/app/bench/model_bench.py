@@ -0,0 +1,57 @@
+import argparse, time
+import numpy as np
+import pandas as pd
+from ..utils.db import get_conn
+from ..models.dataset import load_xy
+from ..models.compiled import CompiledModel, COMPILED_SUFFIX
+from ..models.artifacts import load_artifact, fetch_blob, pointer
+
+# Single-row and batch latency of the pickled calibrated model (as POST /signal used to
+# call it: a one-row DataFrame through sklearn) versus the compiled scorer.
+
+def per_call_us(fn, rows, repeat=3):
+    # best-of-repeat mean latency over all rows, in microseconds
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        for r in rows:
+            fn(r)
+        best = min(best, (time.perf_counter() - t) / len(rows))
+    return best * 1e6
+
+def main(rows=2000, batch=100_000):
+    conn = get_conn(readonly=True)
+    if pointer(conn, "model_latest") is None or pointer(conn, "model_latest" + COMPILED_SUFFIX) is None:
+        print("Need model_latest and its compiled export (python -m app.models.compiled --export).")
+        return None
+    model, meta, _ = load_artifact(conn, "model_latest", mmap=False)
+    compiled_blob = fetch_blob(conn, "model_latest" + COMPILED_SUFFIX)
+    features = meta["features"]
+    _, X, _ = load_xy(conn, features, label=False)
+    conn.close()
+    X = X[-max(rows, batch):].astype(np.float64)
+    single = X[:rows]
+    records = [dict(zip(features, r)) for r in single.tolist()]
+    results = {}
+    results["sklearn_dataframe_row_us"] = per_call_us(lambda d: model.predict_proba(pd.DataFrame([d])[features])[:, 1][0], records[:200], repeat=1)
+    for label, use_numba in (("numba", True), ("python", False)):
+        cm = CompiledModel.from_bytes(compiled_blob, use_numba=use_numba).warmup()
+        if cm.use_numba != use_numba:
+            continue
+        results[f"compiled_{label}_row_us"] = per_call_us(cm.predict_one, single.tolist())
+        t = time.perf_counter(); cm.predict_p1(X); results[f"compiled_{label}_batch_s"] = time.perf_counter() - t
+    t = time.perf_counter(); model.predict_proba(pd.DataFrame(X, columns=features)); results["sklearn_batch_s"] = time.perf_counter() - t
+    base = results["sklearn_dataframe_row_us"]
+    for k, v in results.items():
+        if k.endswith("_us"):
+            print(f"{k:28s} {v:10.1f} us/row  ({base/v:7.1f}x vs sklearn)")
+        else:
+            print(f"{k:28s} {v*1000:10.1f} ms for {len(X)} rows")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2000, help="single-row calls timed")
+    parser.add_argument("--batch", type=int, default=100_000)
+    args = parser.parse_args()
+    main(args.rows, args.batch)
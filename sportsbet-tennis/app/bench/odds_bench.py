@@ -0,0 +1,61 @@
+import argparse, time
+import numpy as np
+from ..odds.odds_utils import implied_probs, devig, DEVIG_METHODS
+from ..ev.decision import kelly_fractions, stake_sizes, expected_values, evaluate_two_way
+
+# Micro-benchmark: row-by-row odds/EV math (as the backtests and API used to do it)
+# versus the array versions on N-row odds arrays.
+
+def rowwise(p1, o1, o2):
+    # pre-vectorization scalar code path, kept verbatim for comparison
+    out = []
+    for p, a, b in zip(p1.tolist(), o1.tolist(), o2.tolist()):
+        i1 = 1.0 / a if a and a > 0 else None
+        i2 = 1.0 / b if b and b > 0 else None
+        if i1 is None or i2 is None:
+            out.append(None)
+            continue
+        t = i1 + i2
+        f1 = i1 / t
+        bb = a - 1.0
+        k = max(0.0, min((p*(bb+1)-1)/bb if bb > 0 else 0.0, 1.0))
+        stake = min(k * 0.5, 0.02) * 1000.0
+        out.append((p - f1, stake, p * bb * stake - (1 - p) * stake))
+    return out
+
+def vectorized(p1, o1, o2, method="proportional"):
+    f1, _ = devig(implied_probs(o1), implied_probs(o2), method)
+    stake = stake_sizes(p1, o1, bankroll=1000.0, kelly_mult=0.5, max_fraction=0.02)
+    return p1 - f1, stake, expected_values(p1, o1, stake)
+
+def timed(fn, *args, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - t)
+    return best
+
+def main(n=1_000_000, seed=0):
+    rng = np.random.default_rng(seed)
+    p1 = rng.uniform(0.05, 0.95, n)
+    o1 = np.round(rng.uniform(1.01, 8.0, n), 2)
+    o2 = np.round(rng.uniform(1.01, 8.0, n), 2)
+    # sprinkle invalid odds to exercise the masks
+    o1[rng.integers(0, n, n // 100)] = 0.0
+    o2[rng.integers(0, n, n // 100)] = np.nan
+    results = {"rows": n, "rowwise_s": timed(rowwise, p1, o1, o2, repeat=1)}
+    for m in DEVIG_METHODS:
+        results[f"vectorized_{m}_s"] = timed(vectorized, p1, o1, o2, m)
+    results["evaluate_two_way_s"] = timed(evaluate_two_way, p1, o1, o2)
+    base = results["rowwise_s"]
+    for k, v in results.items():
+        if k.endswith("_s"):
+            print(f"{k:28s} {v*1000:9.1f} ms  ({base/v:6.1f}x vs rowwise)")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+    main(args.rows)
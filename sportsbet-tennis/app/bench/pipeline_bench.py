@@ -0,0 +1,162 @@
+import argparse, contextlib, importlib.util, io, json, os, subprocess, sys, tempfile, time
+from datetime import datetime
+from pathlib import Path
+import numpy as np
+from ..utils.profiling import Span
+
+# End-to-end pipeline benchmark on synthetic tours (see synth.py).
+# Each size runs in a fresh subprocess against its own temporary DuckDB file, so stages
+# see a cold process and peak RSS is not inherited from a previous size. Every stage is
+# timed (wall + CPU) with a background RSS sampler, and one JSON line per (size, stage)
+# is appended to --out together with the commit, so runs from different commits can be
+# diffed with --compare. PROFILE_SPANS=1 additionally prints the sub-stage spans.
+
+SIZES = (10_000, 100_000, 1_000_000)
+
+class Stage(Span):
+    # a failing stage is recorded, later stages still run
+    def __init__(self, name):
+        super().__init__(name)
+        self.extra = {}
+
+    def __exit__(self, exc_type, exc, tb):
+        super().__exit__(exc_type, exc, tb)
+        return True
+
+    def record(self):
+        return {**super().record(), **self.extra}
+
+def _count(table):
+    from ..utils.db import get_conn
+    conn = get_conn(readonly=True)
+    n = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    conn.close()
+    return n
+
+def _signal_calls(n, seed=0):
+    # POST /signal handler body (no HTTP) on random matches; latency percentiles go into the record
+    from ..api.main import score_signal, MatchOdds, close_shared_conn
+    from ..utils.db import get_conn
+    conn = get_conn(readonly=True)
+    ids = [r[0] for r in conn.execute("SELECT match_id FROM matches ORDER BY random() LIMIT ?", [n]).fetchall()]
+    conn.close()
+    rng = np.random.default_rng(seed)
+    lat = []
+    for mid in ids:
+        t = time.perf_counter()
+        score_signal(MatchOdds(match_id=mid, p1_decimal=float(rng.uniform(1.2, 4)), p2_decimal=float(rng.uniform(1.2, 4))))
+        lat.append(time.perf_counter() - t)
+    close_shared_conn()
+    lat = np.array(lat) * 1e6
+    return len(ids), {"p50_us": float(np.percentile(lat, 50)), "p99_us": float(np.percentile(lat, 99))} if len(lat) else {}
+
+def run_stages(size, players, retrain, bootstrap_iters, signal_calls, data_dir, verbose=False):
+    from .synth import generate, write_csv
+    from ..utils.db import init_db
+    from ..ingest.parse_atp_results import load_sample
+    from ..features.feature_builder import build_features
+    from ..features.feature_builder_extended import build_features_extended
+    from ..models.train import train
+    from ..backtest.backtest import run_backtest
+    from ..backtest.advanced_backtest import run_advanced_backtest
+
+    def train_lgbm():
+        from ..models.train_lgbm import train_lgbm_model
+        train_lgbm_model()
+
+    def gen():
+        p, m = generate(size, players, upcoming=min(1000, size // 100))
+        write_csv(data_dir, p, m)
+        return len(m)
+
+    # basic features feed train + backtest; the extended rebuild then feeds LightGBM + the advanced backtest
+    stages = [
+        ("generate", gen),
+        ("init_db", init_db),
+        ("load_sample", lambda: load_sample(data_dir)),
+        ("build_features", lambda: (build_features(), _count("features"))[1]),
+        ("train", train),
+        ("run_backtest", lambda: run_backtest(retrain)),
+        ("build_features_extended", lambda: (build_features_extended(), _count("features"))[1]),
+        ("train_lgbm", train_lgbm if importlib.util.find_spec("lightgbm") else None),
+        ("run_advanced_backtest", lambda: run_advanced_backtest(bootstrap_iters=bootstrap_iters, retrain=retrain)),
+        ("signal", lambda: _signal_calls(signal_calls)),
+    ]
+    out = []
+    for name, fn in stages:
+        if fn is None:
+            continue
+        with Stage(name) as st:
+            with contextlib.redirect_stdout(sys.stdout if verbose else io.StringIO()):
+                res = fn()
+            if isinstance(res, tuple):
+                res, st.extra = res
+            st.rows = res if isinstance(res, int) else size
+        out.append(st.record())
+        print(f"  {name:24s} {st.seconds:8.2f}s  cpu {st.cpu_seconds:8.2f}s  peak {st.peak / 1024:8.0f} MB"
+              + (f"  ERROR {st.error}" if st.error else ""), file=sys.stderr)
+    return out
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main(sizes=SIZES, players=2000, retrain="week", bootstrap_iters=200, signal_calls=2000, out="bench_results.jsonl", verbose=False):
+    # one subprocess per size; DB_PATH / ARTIFACT_CACHE_DIR point into a throwaway directory
+    commit, started = git_commit(), datetime.utcnow().isoformat()
+    rows = []
+    for size in sizes:
+        with tempfile.TemporaryDirectory(prefix="tennis-bench-") as tmp:
+            env = dict(os.environ, DB_PATH=str(Path(tmp) / "bench.duckdb"), ARTIFACT_CACHE_DIR=str(Path(tmp) / "cache"))
+            print(f"size={size} players={players}", file=sys.stderr)
+            cmd = [sys.executable, "-m", "app.bench.pipeline_bench", "--worker", "--size", str(size), "--players", str(players),
+                   "--retrain", retrain, "--bootstrap-iters", str(bootstrap_iters), "--signal-calls", str(signal_calls),
+                   "--data-dir", str(Path(tmp) / "csv")] + (["--verbose"] if verbose else [])
+            res = subprocess.run(cmd, env=env, stdout=subprocess.PIPE, text=True)
+            if res.returncode != 0:
+                print(f"  worker exited with {res.returncode}", file=sys.stderr)
+            for line in res.stdout.splitlines():
+                if line.startswith("{"):
+                    rows.append({"commit": commit, "started_at": started, "size": size, "players": players, **json.loads(line)})
+    with open(out, "a") as f:
+        for r in rows:
+            f.write(json.dumps(r) + "\n")
+    print(f"Wrote {len(rows)} stage records to {out}", file=sys.stderr)
+    return rows
+
+def compare(new_path, old_path):
+    # seconds / peak RSS ratios of the latest run in each file, per (size, stage)
+    def latest(path):
+        recs = [json.loads(l) for l in open(path) if l.strip()]
+        last = max(r["started_at"] for r in recs)
+        return {(r["size"], r["stage"]): r for r in recs if r["started_at"] == last}
+    new, old = latest(new_path), latest(old_path)
+    for key in sorted(set(new) & set(old)):
+        n, o = new[key], old[key]
+        print(f"{key[0]:>9d} {key[1]:24s} time {n['seconds'] / max(o['seconds'], 1e-9):6.2f}x  "
+              f"peak rss {n['peak_rss_mb'] / max(o['peak_rss_mb'], 1e-9):6.2f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)), help="comma list of match counts")
+    parser.add_argument("--players", type=int, default=2000)
+    parser.add_argument("--retrain", default="week", help="walk-forward cadence for both backtests")
+    parser.add_argument("--bootstrap-iters", type=int, default=200)
+    parser.add_argument("--signal-calls", type=int, default=2000)
+    parser.add_argument("--out", default="bench_results.jsonl", help="JSON lines file the records are appended to")
+    parser.add_argument("--compare", metavar="OLD_JSONL", help="compare the latest run in --out with the latest in OLD_JSONL")
+    parser.add_argument("--verbose", action="store_true", help="show the stages' own output")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--data-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        for rec in run_stages(args.size, args.players, args.retrain, args.bootstrap_iters, args.signal_calls, args.data_dir, args.verbose):
+            print(json.dumps(rec))
+    elif args.compare:
+        compare(args.out, args.compare)
+    else:
+        main([int(s) for s in args.sizes.split(",") if s.strip()], args.players, args.retrain, args.bootstrap_iters,
+             args.signal_calls, args.out, args.verbose)
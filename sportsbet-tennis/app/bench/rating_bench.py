@@ -0,0 +1,57 @@
+import argparse, time
+import numpy as np
+from .synth import generate
+from ..features.elo import Elo
+from ..features.engine import sort_matches, day_numbers
+from ..features.ratings import rate_matches, parse_ratings
+
+# Rating throughput on a synthetic history: the Elo class one update() call per match
+# (global plus per-surface, as the row-wise builders do) against the period-batched
+# systems in features.ratings, with the log loss of each pre-match global rating gap.
+
+def elo_updates(p1, p2, winner, surface):
+    glob, surf = Elo(), {}
+    diff = np.empty(len(p1))
+    for i, (a, b, w, s) in enumerate(zip(p1, p2, winner, surface)):
+        e = surf.get(s)
+        if e is None:
+            e = surf[s] = Elo()
+        diff[i] = glob.get(a) - glob.get(b)
+        e.update(a, b, w, surface=s)
+        glob.update(a, b, w, surface=s)
+    return diff
+
+def log_loss(diff, win1):
+    p = np.clip(1.0 / (1.0 + 10.0 ** (-diff / 400.0)), 1e-12, 1 - 1e-12)
+    return float(-np.mean(win1 * np.log(p) + (1.0 - win1) * np.log1p(-p)))
+
+def main(n=1_000_000, players=2000, years=20, specs=("glicko2", "decay-elo"), seed=0):
+    _, matches = generate(n, players, years, seed=seed)
+    m = sort_matches(matches)
+    p1, p2 = m["p1_id"].to_numpy(dtype=np.int64), m["p2_id"].to_numpy(dtype=np.int64)
+    winner = m["winner_id"].to_numpy(dtype=np.int64)
+    win1 = (winner == p1).astype(float)
+    surface, day = m["surface"].to_numpy(dtype=object), day_numbers(m["date"])
+    t = time.perf_counter()
+    diff = elo_updates(p1.tolist(), p2.tolist(), winner.tolist(), surface.tolist())
+    base = time.perf_counter() - t
+    results = {"matches": n, "Elo.update": {"seconds": base, "log_loss": log_loss(diff, win1)}}
+    print(f"{'Elo.update':24s} {base:8.2f} s  {n / base:12,.0f} matches/s  log loss {results['Elo.update']['log_loss']:.4f}")
+    for spec in specs:
+        spec = parse_ratings(spec)
+        t = time.perf_counter()
+        pre, _, _ = rate_matches(p1, p2, win1, surface, day, spec)
+        dt = time.perf_counter() - t
+        loss = log_loss(pre["elo_p1_global"] - pre["elo_p2_global"], win1)
+        results[spec] = {"seconds": dt, "log_loss": loss}
+        print(f"{spec:24s} {dt:8.2f} s  {n / dt:12,.0f} matches/s  log loss {loss:.4f}  ({base / dt:.1f}x vs Elo.update)")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--matches", type=int, default=1_000_000)
+    parser.add_argument("--players", type=int, default=2000)
+    parser.add_argument("--years", type=int, default=20)
+    parser.add_argument("--ratings", nargs="+", default=["glicko2", "decay-elo"])
+    args = parser.parse_args()
+    main(args.matches, args.players, args.years, args.ratings)
@@ -0,0 +1,118 @@
+import argparse
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+# Synthetic tour history for benchmarks, in the same layout as players.csv / sample_matches.csv.
+# Every player has a latent skill plus per-surface offsets; opponents are drawn near each
+# other in skill (draws resemble real brackets), the result follows a logistic model on the
+# skill gap (steeper for best-of-5), and bookmaker odds are the true probability seen through
+# noise with a proportional margin. Matches are spread over weekly tournaments.
+
+SURFACES = np.array(["Hard", "Clay", "Grass", "Indoor"], dtype=object)
+SURFACE_WEIGHTS = [0.55, 0.30, 0.10, 0.05]
+SKILL_SCALE = 1.1       # logit per unit of skill gap, best-of-3
+BO5_SCALE = 1.25        # best-of-5 favours the stronger player
+ODDS_NOISE = 0.25       # bookmaker error, logit sd
+MARGIN = 0.05           # overround
+PAIR_SPREAD = 0.05      # opponent distance in skill-rank, as a share of the tour
+
+def generate(n_matches, n_players=2000, years=20, upcoming=0, seed=0):
+    # -> (players, matches); the last `upcoming` matches have no winner yet
+    rng = np.random.default_rng(seed)
+    player_id = np.arange(1, n_players + 1, dtype=np.int64)
+    tour_of = np.where(player_id <= n_players // 2, "ATP", "WTA").astype(object)
+    skill = rng.normal(0.0, 1.0, n_players)
+    surf_skill = rng.normal(0.0, 0.3, (len(SURFACES), n_players))
+    players = pd.DataFrame({"player_id": player_id, "name": [f"Player {i}" for i in player_id]})
+
+    # a match's tour decides its player pool; within the pool opponents are skill neighbours
+    tour = np.where(rng.random(n_matches) < 0.5, "ATP", "WTA").astype(object)
+    pools = {t: np.flatnonzero(tour_of == t)[np.argsort(skill[tour_of == t])] for t in ("ATP", "WTA")}
+    a = np.empty(n_matches, dtype=np.int64); b = np.empty(n_matches, dtype=np.int64)
+    for t, pool in pools.items():
+        m = tour == t
+        k = int(m.sum()); n = len(pool)
+        i = rng.integers(0, n, k)
+        off = np.rint(rng.normal(0.0, max(PAIR_SPREAD * n, 1.0), k)).astype(np.int64)
+        off[off == 0] = 1
+        j = np.clip(i + off, 0, n - 1)
+        same = j == i   # clipped onto the player at either end of the pool
+        j[same] = np.where(i[same] > 0, i[same] - 1, 1)
+        a[m], b[m] = pool[i], pool[j]
+    surface_idx = rng.choice(len(SURFACES), n_matches, p=SURFACE_WEIGHTS)
+    best_of = np.where((tour == "ATP") & (rng.random(n_matches) < 0.2), 5, 3)
+    gap = skill[a] - skill[b] + surf_skill[surface_idx, a] - surf_skill[surface_idx, b]
+    logit = gap * np.where(best_of == 5, SKILL_SCALE * BO5_SCALE, SKILL_SCALE)
+    p1 = 1.0 / (1.0 + np.exp(-logit))
+    p1_wins = rng.random(n_matches) < p1
+    book = 1.0 / (1.0 + np.exp(-(logit + rng.normal(0.0, ODDS_NOISE, n_matches))))
+    o1 = np.maximum(np.round(1.0 / (book * (1 + MARGIN)), 2), 1.01)
+    o2 = np.maximum(np.round(1.0 / ((1.0 - book) * (1 + MARGIN)), 2), 1.01)
+
+    # weekly tournaments, matches spread over the week
+    weeks = max(1, years * 52)
+    day = np.sort(rng.integers(0, weeks, n_matches) * 7 + rng.integers(0, 7, n_matches))
+    date = np.datetime64("2000-01-03") + day.astype("timedelta64[D]")
+    winner = np.where(p1_wins, player_id[a], player_id[b]).astype(float)
+    if upcoming:
+        winner[-upcoming:] = np.nan
+    matches = pd.DataFrame({
+        "match_id": np.arange(1, n_matches + 1, dtype=np.int64),
+        "date": date, "tour": tour, "surface": SURFACES[surface_idx], "best_of": best_of,
+        "p1_id": player_id[a], "p2_id": player_id[b], "winner_id": pd.array(winner, dtype="Int64"),
+        "p1_odd": o1, "p2_odd": o2,
+    })
+    return players, matches
+
+def odds_ticks(matches, books=8, ticks=10, seed=0):
+    # long-format price ticks (app.odds.snapshots layout): each book quotes every match `ticks`
+    # times in the days before it, drifting around the match odds with its own margin
+    rng = np.random.default_rng(seed)
+    n = len(matches) * books * ticks
+    m = np.repeat(np.arange(len(matches)), books * ticks)
+    book = np.tile(np.repeat(np.arange(books), ticks), len(matches))
+    o1 = matches["p1_odd"].to_numpy(dtype=float)[m]; o2 = matches["p2_odd"].to_numpy(dtype=float)[m]
+    fair = (1.0 / o1) / (1.0 / o1 + 1.0 / o2)
+    logit = np.log(fair / (1.0 - fair)) + rng.normal(0.0, ODDS_NOISE / 2, n)
+    q = 1.0 / (1.0 + np.exp(-logit))
+    margin = MARGIN * rng.uniform(0.5, 1.5, books)[book]
+    date = pd.to_datetime(matches["date"]).to_numpy(dtype="datetime64[s]")[m]
+    ts = date - rng.integers(60, 7 * 86400, n).astype("timedelta64[s]")
+    return pd.DataFrame({
+        "match_id": matches["match_id"].to_numpy()[m], "bookmaker": np.array([f"book{i}" for i in range(books)], dtype=object)[book],
+        "ts": ts,
+        "p1_odd": np.maximum(np.round(1.0 / (q * (1 + margin)), 2), 1.01),
+        "p2_odd": np.maximum(np.round(1.0 / ((1.0 - q) * (1 + margin)), 2), 1.01),
+    })
+
+def write_feed(path, ticks):
+    # ticks as a JSONL stream in time order (app.signals.stream replay: source)
+    ticks.sort_values("ts", kind="stable").to_json(path, orient="records", lines=True, date_format="iso", date_unit="s")
+    return path
+
+def write_csv(out_dir, players, matches):
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    players.to_csv(out / "players.csv", index=False)
+    matches.to_csv(out / "sample_matches.csv", index=False, date_format="%Y-%m-%d")
+    return out
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--matches", type=int, default=100_000)
+    parser.add_argument("--players", type=int, default=2000)
+    parser.add_argument("--years", type=int, default=20)
+    parser.add_argument("--upcoming", type=int, default=0, help="trailing matches without a result")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--books", type=int, default=0, help="also write odds_ticks.csv with this many bookmakers")
+    parser.add_argument("--ticks", type=int, default=10, help="price ticks per book and match")
+    parser.add_argument("--out", required=True, help="directory for players.csv + sample_matches.csv")
+    args = parser.parse_args()
+    players, matches = generate(args.matches, args.players, args.years, args.upcoming, args.seed)
+    print(f"Wrote {len(players)} players and {len(matches)} matches to {write_csv(args.out, players, matches)}")
+    if args.books:
+        ticks = odds_ticks(matches, args.books, args.ticks, args.seed)
+        ticks.to_csv(Path(args.out) / "odds_ticks.csv", index=False)
+        write_feed(Path(args.out) / "odds_feed.jsonl", ticks)
+        print(f"Wrote {len(ticks)} odds ticks (odds_ticks.csv, odds_feed.jsonl)")
@@ -29,14 +29,46 @@ CREATE TABLE IF NOT EXISTS features (
     form_p1 REAL,
     form_p2 REAL,
     label INTEGER,         -- 1 if p1 wins, else 0
+    elo_diff_surface REAL, -- extended builder columns (NULL for basic builds)
+    elo_diff_global REAL,
+    days_since_p1 INTEGER,
+    days_since_p2 INTEGER,
+    serve_p1 REAL,
+    serve_p2 REAL,
     FOREIGN KEY(match_id) REFERENCES matches(match_id)
 );
 
+-- databases created before the extended columns existed
+ALTER TABLE features ADD COLUMN IF NOT EXISTS elo_diff_surface REAL;
+ALTER TABLE features ADD COLUMN IF NOT EXISTS elo_diff_global REAL;
+ALTER TABLE features ADD COLUMN IF NOT EXISTS days_since_p1 INTEGER;
+ALTER TABLE features ADD COLUMN IF NOT EXISTS days_since_p2 INTEGER;
+ALTER TABLE features ADD COLUMN IF NOT EXISTS serve_p1 REAL;
+ALTER TABLE features ADD COLUMN IF NOT EXISTS serve_p2 REAL;
+
 CREATE TABLE IF NOT EXISTS artifacts (
     name TEXT PRIMARY KEY,
     created_at TIMESTAMP,
     meta JSON,
-    blob BLOB              -- pickled model or other artifact
+    blob BLOB              -- pickled model or other artifact (legacy rows; versioned ones keep it in artifact_versions)
+);
+
+-- artifact_versions row the name currently points at (NULL: legacy row with an inline blob)
+ALTER TABLE artifacts ADD COLUMN IF NOT EXISTS version INTEGER;
+
+-- every saved artifact, immutable; rollback re-points artifacts.version
+CREATE TABLE IF NOT EXISTS artifact_versions (
+    name TEXT,
+    version INTEGER,
+    created_at TIMESTAMP,
+    content_hash TEXT,         -- sha256 of the serialized (uncompressed) bytes
+    feature_fingerprint TEXT,  -- hash of meta.features, in order
+    codec TEXT,                -- joblib+zlib / npz
+    raw_bytes BIGINT,
+    stored_bytes BIGINT,
+    meta JSON,
+    blob BLOB,
+    PRIMARY KEY(name, version)
 );
 
 CREATE TABLE IF NOT EXISTS signals (
@@ -48,5 +80,146 @@ CREATE TABLE IF NOT EXISTS signals (
     p1_edge REAL,
     p2_edge REAL,
     p1_kelly REAL,
-    p2_kelly REAL
+    p2_kelly REAL,
+    p1_odd REAL,           -- odds the row was computed from
+    p2_odd REAL,
+    suggestion TEXT,       -- P1 / P2 / PASS
+    stake REAL,
+    expected_value REAL,
+    devig_method TEXT,
+    model_created_at TIMESTAMP,  -- artifacts.created_at of the model that scored the row
+    computed_at TIMESTAMP
+);
+
+-- databases created before precomputed signals carried their inputs
+ALTER TABLE signals ADD COLUMN IF NOT EXISTS p1_odd REAL;
+ALTER TABLE signals ADD COLUMN IF NOT EXISTS p2_odd REAL;
+ALTER TABLE signals ADD COLUMN IF NOT EXISTS suggestion TEXT;
+ALTER TABLE signals ADD COLUMN IF NOT EXISTS stake REAL;
+ALTER TABLE signals ADD COLUMN IF NOT EXISTS expected_value REAL;
+ALTER TABLE signals ADD COLUMN IF NOT EXISTS devig_method TEXT;
+ALTER TABLE signals ADD COLUMN IF NOT EXISTS model_created_at TIMESTAMP;
+ALTER TABLE signals ADD COLUMN IF NOT EXISTS computed_at TIMESTAMP;
+
+-- one row per signals refresh run
+CREATE TABLE IF NOT EXISTS signal_runs (
+    started_at TIMESTAMP PRIMARY KEY,
+    seconds DOUBLE,
+    trigger TEXT,          -- cli / scheduler
+    rows INTEGER,          -- signals (re)computed
+    stale_rows INTEGER,    -- rows in the window that were stale before the run
+    model_created_at TIMESTAMP,
+    fingerprint TEXT,      -- model/features/odds state the run saw; unchanged => nothing to do
+    status TEXT,           -- ok / error
+    error TEXT
+);
+
+-- end-of-history state of the feature engine, so feature builds can resume incrementally
+CREATE TABLE IF NOT EXISTS feature_state_meta (
+    name TEXT PRIMARY KEY,
+    builder TEXT,          -- basic/extended: which column set the features table holds
+    last_date DATE,        -- watermark: last processed (date, match_id)
+    last_match_id INTEGER,
+    rows BIGINT,           -- feature rows written so far
+    updated_at TIMESTAMP
+);
+
+-- form definition of the features table: all | last:N | decay:D (NULL: all)
+ALTER TABLE feature_state_meta ADD COLUMN IF NOT EXISTS form_spec TEXT;
+-- rating system behind the Elo columns: elo | glicko2:PERIOD | decay-elo:PERIOD:HALF_LIFE (NULL: elo)
+ALTER TABLE feature_state_meta ADD COLUMN IF NOT EXISTS ratings TEXT;
+
+CREATE TABLE IF NOT EXISTS feature_state_players (
+    player_id INTEGER PRIMARY KEY,
+    elo_global DOUBLE,
+    form_wins DOUBLE,
+    form_total DOUBLE,
+    last_play DATE
+);
+
+CREATE TABLE IF NOT EXISTS feature_state_surface_elo (
+    surface TEXT,
+    player_id INTEGER,
+    rating DOUBLE,
+    PRIMARY KEY(surface, player_id)
+);
+
+CREATE TABLE IF NOT EXISTS feature_state_h2h (
+    lo_id INTEGER,         -- lower player id of the pair
+    hi_id INTEGER,
+    lo_wins DOUBLE,
+    total DOUBLE,
+    PRIMARY KEY(lo_id, hi_id)
+);
+
+-- external ids from bulk archive ingests (e.g. Sackmann atp_/wta_matches_YYYY.csv)
+CREATE TABLE IF NOT EXISTS player_map (
+    source TEXT,           -- id namespace, e.g. atp / wta
+    ext_id TEXT,
+    player_id INTEGER,
+    PRIMARY KEY(source, ext_id)
+);
+
+CREATE TABLE IF NOT EXISTS match_map (
+    source TEXT,
+    ext_key TEXT,          -- tour + tourney_id + match_num
+    match_id INTEGER,
+    PRIMARY KEY(source, ext_key)
+);
+
+-- one row per (model config, staking config) of a backtest sweep
+CREATE TABLE IF NOT EXISTS sweep_results (
+    sweep_id TEXT,
+    created_at TIMESTAMP,
+    retrain TEXT,          -- walk-forward retrain cadence
+    devig_method TEXT,
+    edge_min DOUBLE,
+    kelly_fraction DOUBLE,
+    max_fraction DOUBLE,
+    trades INTEGER,
+    total_staked DOUBLE,
+    profit DOUBLE,
+    roi DOUBLE,
+    max_drawdown DOUBLE,
+    sharpe DOUBLE,
+    roi_ci_lo DOUBLE,      -- bootstrap CI, NULL when the sweep ran without bootstrap
+    roi_ci_hi DOUBLE,
+    fit_seconds DOUBLE,    -- walk-forward fit time of the model config
+    eval_seconds DOUBLE,   -- staking evaluation time, per grid point
+    PRIMARY KEY(sweep_id, retrain, devig_method, edge_min, kelly_fraction, max_fraction)
+);
+
+-- bookmaker price ticks, long format; unique on (match_id, bookmaker, ts), enforced by the
+-- loader with an anti-join (a primary-key index makes bulk tick loads several times slower)
+CREATE TABLE IF NOT EXISTS odds_snapshots (
+    match_id INTEGER,
+    bookmaker TEXT,
+    ts TIMESTAMP,
+    p1_odd DOUBLE,         -- NULL: the book took the market down
+    p2_odd DOUBLE
+);
+
+-- latest tick per (match_id, bookmaker), maintained by app.odds.snapshots
+CREATE TABLE IF NOT EXISTS odds_latest (
+    match_id INTEGER,
+    bookmaker TEXT,
+    ts TIMESTAMP,
+    p1_odd DOUBLE,
+    p2_odd DOUBLE
+);
+
+-- line-shopping index over the books currently quoting each match
+CREATE TABLE IF NOT EXISTS odds_index (
+    match_id INTEGER PRIMARY KEY,
+    books INTEGER,         -- books with a live two-way price
+    best_p1_odd DOUBLE,
+    best_p1_book TEXT,
+    best_p2_odd DOUBLE,
+    best_p2_book TEXT,
+    consensus_p1 DOUBLE,   -- mean implied probability across books (de-vig with any method)
+    consensus_p2 DOUBLE,
+    fair_p1 DOUBLE,        -- proportional de-vig of the consensus
+    best_overround DOUBLE, -- 1/best_p1_odd + 1/best_p2_odd; below 1 is a cross-book arbitrage
+    last_ts TIMESTAMP,
+    updated_at TIMESTAMP
 );
@@ -1,20 +1,71 @@
 import math, os
+import numpy as np
 from dotenv import load_dotenv
+from ..odds.odds_utils import implied_probs, devig, fair_odds
 load_dotenv()
 
 BANKROLL = float(os.getenv("BANKROLL", "1000"))
 MAX_STAKE_FRACTION = float(os.getenv("MAX_STAKE_FRACTION", "0.02"))
 KELLY_FRACTION = float(os.getenv("KELLY_FRACTION", "0.5"))
 
+# Array versions (NumPy arrays / pandas Series / scalars). Missing inputs give NaN;
+# odds with no payout (b <= 0) give a zero Kelly fraction, as the scalar API always did.
+
+def kelly_fractions(p, dec_odds):
+    p = np.asarray(p, dtype=float); o = np.asarray(dec_odds, dtype=float)
+    b = o - 1.0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        f = np.where(b > 0, np.clip((p*(b+1)-1)/b, 0.0, 1.0), 0.0)
+    return np.where(np.isnan(p) | np.isnan(o), np.nan, f)
+
+def stake_sizes(p, dec_odds, bankroll=None, kelly_mult=None, max_fraction=None):
+    # defaults come from the environment settings above
+    kelly_mult = KELLY_FRACTION if kelly_mult is None else kelly_mult
+    max_fraction = MAX_STAKE_FRACTION if max_fraction is None else max_fraction
+    f = np.minimum(kelly_fractions(p, dec_odds) * kelly_mult, max_fraction)
+    return f * (BANKROLL if bankroll is None else bankroll)
+
+def expected_values(p, dec_odds, stake):
+    p = np.asarray(p, dtype=float)
+    b = np.asarray(dec_odds, dtype=float) - 1.0
+    return p * b * stake - (1 - p) * stake
+
+def evaluate_two_way(p1, p1_odds, p2_odds, devig_method="proportional", bankroll=None, kelly_mult=None, max_fraction=None, implied=None):
+    # fair odds, edges, Kelly and the suggested side/stake/EV for whole slates at once;
+    # implied=(p1, p2) de-vigs those market probabilities (e.g. a multi-book consensus)
+    # instead of the ones implied by the odds being bet
+    p1 = np.asarray(p1, dtype=float)
+    o1 = np.asarray(p1_odds, dtype=float); o2 = np.asarray(p2_odds, dtype=float)
+    i1, i2 = (implied_probs(o1), implied_probs(o2)) if implied is None else (np.asarray(implied[0], dtype=float), np.asarray(implied[1], dtype=float))
+    fair1, fair2 = devig(i1, i2, devig_method)
+    valid = ~(np.isnan(fair1) | np.isnan(fair2) | np.isnan(p1))
+    p2 = 1.0 - p1
+    edge1, edge2 = p1 - fair1, p2 - fair2
+    pick1 = valid & (edge1 > edge2) & (edge1 > 0)
+    pick2 = valid & ~pick1 & (edge2 > 0)
+    kelly1, kelly2 = kelly_fractions(p1, o1), kelly_fractions(p2, o2)
+    prob = np.where(pick1, p1, p2)
+    odds = np.where(pick1, o1, o2)
+    stake = np.where(pick1 | pick2, stake_sizes(prob, odds, bankroll, kelly_mult, max_fraction), 0.0)
+    ev = np.where(pick1 | pick2, expected_values(prob, odds, stake), 0.0)
+    return {
+        "valid": valid,
+        "p1_prob": p1, "p2_prob": p2,
+        "p1_fair_odds": fair_odds(np.maximum(fair1, 1e-9)), "p2_fair_odds": fair_odds(np.maximum(fair2, 1e-9)),
+        "p1_edge": edge1, "p2_edge": edge2,
+        "p1_kelly": kelly1, "p2_kelly": kelly2,
+        "suggestion": np.where(pick1, "P1", np.where(pick2, "P2", "PASS")),
+        "stake": stake,
+        "expected_value": ev,
+    }
+
+# Scalar API: thin wrappers over the array versions.
+
 def kelly_fraction(p, dec_odds):
-    b = dec_odds - 1.0
-    return max(0.0, min((p*(b+1)-1)/b if b>0 else 0.0, 1.0))
+    return float(kelly_fractions(p, dec_odds))
 
 def stake_size(p, dec_odds):
-    f = kelly_fraction(p, dec_odds) * KELLY_FRACTION
-    f = min(f, MAX_STAKE_FRACTION)
-    return f * BANKROLL
+    return float(stake_sizes(p, dec_odds))
 
 def expected_value(p, dec_odds, stake):
-    b = dec_odds - 1.0
-    return p * b * stake - (1 - p) * stake
+    return float(expected_values(p, dec_odds, stake))
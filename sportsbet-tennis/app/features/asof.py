@@ -0,0 +1,277 @@
+import argparse, os, threading, time
+import numpy as np
+import pandas as pd
+from .elo import K_SURFACE
+from .incremental import STATE_NAME
+from .engine import FeatureEngine, sort_matches, day_numbers, BASE_RATING, DEFAULT_K, DEFAULT_SURFACE, DEFAULT_REST_DAYS
+from .window_sql import FORM_ALL, parse_form, running_form
+from .ratings import RATINGS_ELO, parse_ratings, rating_system, rate_matches, period_numbers
+
+# Point-in-time player state for as-of feature lookups.
+# One replay of the completed history records the state *after* every match: per player
+# (global Elo, form rate under the features table's form definition, last-played day),
+# per (surface, player) Elo and per pair H2H.
+# Each kind lives in flat arrays sorted by (key, match order), so a key's history is one
+# contiguous slice and "state before day d" is a single searchsorted on that slice.
+# Lookups only see matches strictly before the query date: features for an upcoming match
+# (or any date in a backtest) never include results from that day or later. With period
+# ratings (see ratings) a rating event is keyed by its period, so a lookup sees the ratings
+# as they stood when the query day's period began, as the replayed matches of that period did.
+
+ASOF_CHECK_INTERVAL = float(os.getenv("ASOF_CHECK_INTERVAL", "30"))
+
+HISTORY_SQL = '''
+    SELECT match_id, date, surface, p1_id, p2_id, winner_id FROM matches
+    WHERE winner_id IS NOT NULL ORDER BY date, match_id
+'''
+
+def to_day(value):
+    # date / datetime / ISO string -> days since epoch, as used by the engine
+    return pd.Timestamp(value).value // 86_400_000_000_000
+
+def _slices(keys):
+    # keys sorted ascending -> {key: (lo, hi)}
+    uniq, starts = np.unique(keys, return_index=True)
+    ends = np.append(starts[1:], len(keys))
+    return dict(zip(uniq.tolist(), zip(starts.tolist(), ends.tolist())))
+
+def _elo_after(r1, r2, k, s1):
+    # same arithmetic as the engine replay, so snapshots match its state bit for bit
+    e = 1.0 / (1.0 + 10.0 ** ((r2 - r1) / 400.0))
+    return r1 + k * (s1 - e), r2 + k * ((1.0 - s1) - (1.0 - e))
+
+class PointInTimeStore:
+    def __init__(self, wide, day, builder="extended", base=BASE_RATING, form=FORM_ALL, ratings=RATINGS_ELO):
+        # wide: FeatureEngine.process output of a from-scratch replay; day: its match days
+        self.builder = builder
+        self.form = parse_form(form)
+        self.ratings = parse_ratings(ratings)
+        self.system = rating_system(self.ratings)
+        self.base = base
+        n = len(wide)
+        day = np.asarray(day, dtype=np.int64)
+        seq = np.arange(n)
+        p1 = wide["p1_id"].to_numpy(dtype=np.int64)
+        p2 = wide["p2_id"].to_numpy(dtype=np.int64)
+        s1 = wide["label"].to_numpy(dtype=float)
+        surface = wide["surface"].to_numpy(dtype=object)
+        if self.system is None:
+            k = wide["surface"].map(lambda x: K_SURFACE.get(x, DEFAULT_K)).to_numpy(dtype=float)
+            g1, g2 = _elo_after(wide["elo_p1_global"].to_numpy(dtype=float), wide["elo_p2_global"].to_numpy(dtype=float), k, s1)
+            r1, r2 = _elo_after(wide["elo_p1_surface"].to_numpy(dtype=float), wide["elo_p2_surface"].to_numpy(dtype=float), k, s1)
+            period = day
+        else:
+            _, post, period = rate_matches(p1, p2, s1, surface, day, self.ratings)
+            g1, g2, r1, r2 = (post[c] for c in ("elo_p1_global", "elo_p2_global", "elo_p1_surface", "elo_p2_surface"))
+
+        # player events: two per match
+        player = np.concatenate([p1, p2])
+        order = np.lexsort((np.concatenate([seq, seq]), player))
+        player = player[order]
+        won = np.concatenate([s1, 1.0 - s1])[order]
+        self.player_day = np.concatenate([day, day])[order]
+        self.player_period = np.concatenate([period, period])[order]
+        self.player_elo = np.concatenate([g1, g2])[order]
+        self.player_form = running_form(won, player, self.form)
+        self.player_slices = _slices(player)
+
+        # (surface, player) events; surface codes keep the key a single int64
+        self.surface_codes = {s: i for i, s in enumerate(pd.unique(surface).tolist())}
+        code = np.array([self.surface_codes[s] for s in surface], dtype=np.int64)
+        skey = np.concatenate([(code << 32) | p1, (code << 32) | p2])
+        order = np.lexsort((np.concatenate([seq, seq]), skey))
+        self.surface_period = np.concatenate([period, period])[order]
+        self.surface_elo = np.concatenate([r1, r2])[order]
+        self.surface_slices = _slices(skey[order])
+
+        # pair events: one per match, wins counted for the lower player id
+        lo = np.minimum(p1, p2)
+        pkey = (lo << 32) | np.maximum(p1, p2)
+        lo_won = np.where(s1 == 1.0, p1, p2) == lo
+        order = np.lexsort((seq, pkey))
+        pkey = pkey[order]
+        self.pair_day = day[order]
+        self.pair_lo_wins = pd.Series(lo_won[order].astype(float)).groupby(pkey).cumsum().to_numpy()
+        self.pair_total = pd.Series(pkey).groupby(pkey).cumcount().to_numpy(dtype=float) + 1.0
+        self.pair_slices = _slices(pkey)
+        self.matches = n
+        self.last_day = int(day[-1]) if n else None
+
+    @classmethod
+    def from_matches(cls, matches, builder="extended", form=FORM_ALL, ratings=RATINGS_ELO):
+        m = sort_matches(matches)
+        return cls(FeatureEngine().process(m), day_numbers(m["date"]), builder, form=form, ratings=ratings)
+
+    @classmethod
+    def from_db(cls, conn, builder=None):
+        # builder, form and ratings default to whatever built the features table
+        row = conn.execute("SELECT builder, form_spec, ratings FROM feature_state_meta WHERE name=?", [STATE_NAME]).fetchone()
+        if builder is None:
+            builder = row[0] if row else "extended"
+        matches = conn.execute(HISTORY_SQL).fetchdf()
+        if matches.empty:
+            return None
+        return cls.from_matches(matches, builder, (row[1] if row else None) or FORM_ALL, (row[2] if row else None) or RATINGS_ELO)
+
+    def _before(self, slices, days, key, day):
+        # index of the key's last event strictly before day, or -1
+        sl = slices.get(key)
+        if sl is None:
+            return -1
+        lo, hi = sl
+        i = lo + int(np.searchsorted(days[lo:hi], day, side="left")) - 1
+        return i if i >= lo else -1
+
+    def _rating(self, slices, periods, values, key, day):
+        # rating going into a match on day: the last update from an earlier period
+        if self.system is None:
+            i = self._before(slices, periods, key, day)
+            return float(values[i]) if i >= 0 else self.base
+        period = int(period_numbers(day, self.system.period))
+        i = self._before(slices, periods, key, period)
+        return float(self.system.seen(values[i], period - periods[i])) if i >= 0 else self.base
+
+    def player_state(self, player_id, day):
+        # (global rating, form rate, rest days) going into a match on day
+        i = self._before(self.player_slices, self.player_day, int(player_id), day)
+        if i < 0:
+            return self.base, 0.5, DEFAULT_REST_DAYS
+        elo = self._rating(self.player_slices, self.player_period, self.player_elo, int(player_id), day)
+        return elo, float(self.player_form[i]), int(day - self.player_day[i])
+
+    def surface_elo_before(self, player_id, surface, day):
+        code = self.surface_codes.get(surface)
+        if code is None:
+            return self.base
+        return self._rating(self.surface_slices, self.surface_period, self.surface_elo, (code << 32) | int(player_id), day)
+
+    def h2h_rate(self, p1_id, p2_id, day):
+        lo, hi = min(p1_id, p2_id), max(p1_id, p2_id)
+        i = self._before(self.pair_slices, self.pair_day, (int(lo) << 32) | int(hi), day)
+        if i < 0:
+            return 0.5
+        rate = float(self.pair_lo_wins[i] / self.pair_total[i])
+        return rate if p1_id == lo else 1.0 - rate
+
+    def features(self, p1_id, p2_id, surface, date, match_id=None):
+        # a features-table row (without label) for p1 vs p2 on surface, as of the start of date
+        day = to_day(date)
+        p1_id, p2_id = int(p1_id), int(p2_id)
+        surf = surface if surface is not None and surface == surface else DEFAULT_SURFACE
+        g1, f1, d1 = self.player_state(p1_id, day)
+        g2, f2, d2 = self.player_state(p2_id, day)
+        row = {"match_id": match_id, "p1_id": p1_id, "p2_id": p2_id, "form_p1": f1, "form_p2": f2}
+        # columns the active builder does not write stay NULL, like in the features table
+        if self.builder == "basic":
+            row.update({"surface": surface, "elo_diff": g1 - g2, "h2h_p1": 0.5, "elo_diff_surface": None, "elo_diff_global": None,
+                        "days_since_p1": None, "days_since_p2": None, "serve_p1": None, "serve_p2": None})
+            return row
+        row.update({
+            "surface": surf,
+            "elo_diff": None,
+            "h2h_p1": self.h2h_rate(p1_id, p2_id, day),
+            "elo_diff_surface": self.surface_elo_before(p1_id, surf, day) - self.surface_elo_before(p2_id, surf, day),
+            "elo_diff_global": g1 - g2,
+            "days_since_p1": d1, "days_since_p2": d2,
+            "serve_p1": 0.5, "serve_p2": 0.5,
+        })
+        return row
+
+    def stats(self):
+        return {"builder": self.builder, "form": self.form, "ratings": self.ratings, "matches": self.matches, "players": len(self.player_slices),
+                "pairs": len(self.pair_slices), "last_date": str(np.datetime64(self.last_day, "D")) if self.last_day is not None else None}
+
+def history_fingerprint(conn):
+    # changes whenever a completed match is added, edited or the feature builder / form / ratings switch
+    hist = conn.execute("SELECT COUNT(*), SUM(hash(match_id, date, surface, p1_id, p2_id, winner_id)) FROM matches WHERE winner_id IS NOT NULL").fetchone()
+    state = conn.execute("SELECT builder, form_spec, ratings FROM feature_state_meta WHERE name=?", [STATE_NAME]).fetchone()
+    return (hist[0], hist[1]) + (tuple(state) if state else (None, None, None))
+
+class AsOfRegistry:
+    # process-level store for the serving path; rebuilt when the completed history changes,
+    # checked at most once every check_interval seconds (same scheme as ModelRegistry)
+    def __init__(self, check_interval=ASOF_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self.store = None
+        self.fingerprint = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+        self.checks = 0
+        self.load_seconds = None
+
+    def get(self, conn):
+        # returns the store, or None when there are no completed matches
+        now = time.monotonic()
+        if self.store is not None and now - self._checked < self.check_interval:
+            self.hits += 1
+            return self.store
+        with self._lock:
+            self.checks += 1
+            self._checked = now
+            fp = history_fingerprint(conn)
+            if self.store is not None and fp == self.fingerprint:
+                self.hits += 1
+                return self.store
+            t0 = time.perf_counter()
+            self.store = PointInTimeStore.from_db(conn, fp[2])
+            self.fingerprint = fp
+            self.load_seconds = time.perf_counter() - t0
+            self.loads += 1
+            return self.store
+
+    def stats(self):
+        return {"hits": self.hits, "loads": self.loads, "checks": self.checks, "check_interval": self.check_interval,
+                "load_seconds": self.load_seconds, "store": self.store.stats() if self.store is not None else None}
+
+def check_parity(matches, ratings=RATINGS_ELO):
+    # as-of rows must equal the replayed pre-match values wherever nothing happened earlier that day
+    from .engine import compute_features
+    m = sort_matches(matches)
+    ok = True
+    for builder, ext in (("basic", False), ("extended", True)):
+        ref = compute_features(m, extended=ext, ratings=ratings).reset_index(drop=True)
+        store = PointInTimeStore.from_matches(m, builder, ratings=ratings)
+        n, d = len(m), day_numbers(m["date"])
+        ev = pd.DataFrame({"p": np.concatenate([m.p1_id, m.p2_id]), "d": np.concatenate([d, d]), "seq": np.tile(np.arange(n), 2)})
+        first = (ev["seq"] == ev.groupby(["p", "d"])["seq"].transform("min")).to_numpy()
+        first = first[:n] & first[n:]
+        idx = np.flatnonzero(first)
+        got = pd.DataFrame([store.features(m.p1_id[i], m.p2_id[i], m.surface[i], m.date[i], int(m.match_id[i])) for i in idx])
+        same = True
+        for c in ref.columns.drop("label"):
+            x, y = ref[c].to_numpy()[idx], got[c].to_numpy()
+            if x.dtype.kind in "fiu":
+                same &= bool(np.allclose(x.astype(float), y.astype(float), rtol=0, atol=1e-9))
+            else:
+                same &= bool((pd.Series(x).fillna("") == pd.Series(y).fillna("")).all())
+        print(f"{builder} ({parse_ratings(ratings)}): {len(idx)}/{len(m)} first-of-day matches -> {'OK' if same else 'MISMATCH'}")
+        ok &= same
+    return ok
+
+if __name__ == "__main__":
+    from ..utils.db import get_conn
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--check", action="store_true", help="compare as-of rows with the replayed features on the DB matches")
+    parser.add_argument("--query", nargs=3, metavar=("P1_ID", "P2_ID", "DATE"), help="print the as-of feature row")
+    parser.add_argument("--surface", default=None)
+    parser.add_argument("--ratings", default=RATINGS_ELO, help="rating system for --check: elo | glicko2[:PERIOD] | decay-elo[:PERIOD][:HALF_LIFE]")
+    args = parser.parse_args()
+    conn = get_conn(readonly=True)
+    if args.check:
+        matches = conn.execute(HISTORY_SQL).fetchdf()
+        conn.close()
+        raise SystemExit(0 if check_parity(matches, args.ratings) else 1)
+    if args.query:
+        t0 = time.perf_counter()
+        store = PointInTimeStore.from_db(conn)
+        t1 = time.perf_counter()
+        if store is None:
+            print("No completed matches. Ingest data first.")
+        else:
+            row = store.features(args.query[0], args.query[1], args.surface, args.query[2])
+            t2 = time.perf_counter()
+            print(row)
+            print(f"store built in {t1 - t0:.2f}s ({store.matches} matches), lookup {1e6 * (t2 - t1):.0f}us")
+    conn.close()
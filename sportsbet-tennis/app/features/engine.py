@@ -0,0 +1,339 @@
+import argparse
+import numpy as np
+import pandas as pd
+from .elo import K_SURFACE
+
+try:
+    from numba import njit
+except ImportError:  # optional: the same loop runs as plain Python over lists
+    njit = None
+
+# Columnar feature engine behind both feature builders.
+# Player ids are mapped to dense indexes and every piece of running state (global and
+# per-surface Elo, form counts, last-played day, H2H counts per player pair) lives in
+# NumPy arrays. One tight loop walks the date-sorted columns and writes the pre-match
+# values straight into output arrays; there are no per-row dicts or Elo objects.
+
+BASE_RATING = 1500.0
+DEFAULT_K = 24.0
+DEFAULT_SURFACE = "Hard"
+DEFAULT_REST_DAYS = 30
+NO_DATE = -(2**62)
+
+BASIC_COLUMNS = ["match_id","p1_id","p2_id","surface","elo_diff","h2h_p1","form_p1","form_p2","label"]
+EXTENDED_COLUMNS = ["match_id","p1_id","p2_id","surface","elo_diff_surface","elo_diff_global","h2h_p1","form_p1","form_p2",
+                    "days_since_p1","days_since_p2","serve_p1","serve_p2","label"]
+
+def _replay(p1, p2, win1, surf, k, day, pair, p1_lo, n_players,
+            elo_g, elo_s, form_w, form_t, last, h2h_w, h2h_t,
+            out_g1, out_g2, out_s1, out_s2, out_f1, out_f2, out_d1, out_d2, out_h2h):
+    # elo_s is the (surface, player) matrix flattened row-major; h2h_w counts wins of the lower player id
+    for i in range(len(p1)):
+        a = p1[i]; b = p2[i]
+        sa_idx = surf[i] * n_players + a
+        sb_idx = surf[i] * n_players + b
+        ga = elo_g[a]; gb = elo_g[b]
+        ra = elo_s[sa_idx]; rb = elo_s[sb_idx]
+        out_g1[i] = ga; out_g2[i] = gb
+        out_s1[i] = ra; out_s2[i] = rb
+        out_f1[i] = form_w[a] / form_t[a] if form_t[a] > 0 else 0.5
+        out_f2[i] = form_w[b] / form_t[b] if form_t[b] > 0 else 0.5
+        out_d1[i] = day[i] - last[a] if last[a] != NO_DATE else DEFAULT_REST_DAYS
+        out_d2[i] = day[i] - last[b] if last[b] != NO_DATE else DEFAULT_REST_DAYS
+        q = pair[i]
+        if h2h_t[q] > 0:
+            lo_rate = h2h_w[q] / h2h_t[q]
+            out_h2h[i] = lo_rate if p1_lo[i] else 1.0 - lo_rate
+        else:
+            out_h2h[i] = 0.5
+        # updates after the match
+        s1 = 1.0 if win1[i] else 0.0
+        e = 1.0 / (1.0 + 10.0 ** ((rb - ra) / 400.0))
+        elo_s[sa_idx] = ra + k[i] * (s1 - e)
+        elo_s[sb_idx] = rb + k[i] * ((1.0 - s1) - (1.0 - e))
+        e = 1.0 / (1.0 + 10.0 ** ((gb - ga) / 400.0))
+        elo_g[a] = ga + k[i] * (s1 - e)
+        elo_g[b] = gb + k[i] * ((1.0 - s1) - (1.0 - e))
+        form_w[a] += s1; form_t[a] += 1.0
+        form_w[b] += 1.0 - s1; form_t[b] += 1.0
+        if win1[i] == p1_lo[i]:
+            h2h_w[q] += 1.0
+        h2h_t[q] += 1.0
+        last[a] = day[i]; last[b] = day[i]
+
+def _replay_elo(p1, p2, win1, surf, k, n_players, elo_s, out_s1, out_s2):
+    # one Elo series of _replay on its own: the surface one, or the global one with surf all 0
+    for i in range(len(p1)):
+        sa_idx = surf[i] * n_players + p1[i]
+        sb_idx = surf[i] * n_players + p2[i]
+        ra = elo_s[sa_idx]; rb = elo_s[sb_idx]
+        out_s1[i] = ra; out_s2[i] = rb
+        s1 = 1.0 if win1[i] else 0.0
+        e = 1.0 / (1.0 + 10.0 ** ((rb - ra) / 400.0))
+        elo_s[sa_idx] = ra + k[i] * (s1 - e)
+        elo_s[sb_idx] = rb + k[i] * ((1.0 - s1) - (1.0 - e))
+
+_replay_jit = njit(cache=True)(_replay) if njit is not None else None
+_replay_elo_jit = njit(cache=True)(_replay_elo) if njit is not None else None
+
+def day_numbers(dates):
+    return pd.to_datetime(pd.Series(dates)).to_numpy().astype("datetime64[D]").astype(np.int64)
+
+def sort_matches(matches):
+    # completed matches in replay order; match_id breaks same-day ties deterministically
+    m = matches[matches["winner_id"].notna()]
+    return m.sort_values(["date", "match_id"], kind="mergesort").reset_index(drop=True)
+
+class FeatureEngine:
+    def __init__(self, base=BASE_RATING, use_numba=None):
+        self.base = base
+        self.use_numba = (_replay_jit is not None) if use_numba is None else (use_numba and _replay_jit is not None)
+        self.player_ids = np.empty(0, dtype=np.int64)  # dense index -> player_id
+        self.player_index = {}
+        self.surfaces = []
+        self.elo_global = np.empty(0)
+        self.elo_surface = np.empty((0, 0))
+        self.form_wins = np.empty(0)
+        self.form_total = np.empty(0)
+        self.last_play = np.empty(0, dtype=np.int64)
+        self.pair_keys = np.empty(0, dtype=np.int64)  # dense index -> (lo << 32) | hi
+        self.pair_index = {}
+        self.h2h_wins = np.empty(0)  # wins of the lower player id
+        self.h2h_total = np.empty(0)
+        # dense player / pair indexes updated by the last process() call
+        self.touched_players = np.empty(0, dtype=np.int64)
+        self.touched_pairs = np.empty(0, dtype=np.int64)
+
+    def player_idx(self, ids):
+        uniq, inv = np.unique(np.asarray(ids, dtype=np.int64), return_inverse=True)
+        new = [p for p in uniq.tolist() if p not in self.player_index]
+        if new:
+            n_old, n_new = len(self.player_ids), len(new)
+            self.player_index.update({p: n_old + j for j, p in enumerate(new)})
+            self.player_ids = np.concatenate([self.player_ids, np.array(new, dtype=np.int64)])
+            self.elo_global = np.concatenate([self.elo_global, np.full(n_new, self.base)])
+            self.elo_surface = np.hstack([self.elo_surface, np.full((len(self.surfaces), n_new), self.base)])
+            self.form_wins = np.concatenate([self.form_wins, np.zeros(n_new)])
+            self.form_total = np.concatenate([self.form_total, np.zeros(n_new)])
+            self.last_play = np.concatenate([self.last_play, np.full(n_new, NO_DATE, dtype=np.int64)])
+        lookup = np.array([self.player_index[p] for p in uniq.tolist()], dtype=np.int64)
+        return lookup[inv]
+
+    def surface_idx(self, surfaces):
+        uniq, inv = np.unique(np.asarray(surfaces, dtype=object), return_inverse=True)
+        for s in uniq.tolist():
+            if s not in self.surfaces:
+                self.surfaces.append(s)
+                self.elo_surface = np.vstack([self.elo_surface, np.full((1, len(self.player_ids)), self.base)])
+        lookup = np.array([self.surfaces.index(s) for s in uniq.tolist()], dtype=np.int64)
+        return lookup[inv]
+
+    def pair_idx(self, p1_ids, p2_ids):
+        lo = np.minimum(p1_ids, p2_ids); hi = np.maximum(p1_ids, p2_ids)
+        keys = (lo.astype(np.int64) << 32) | hi.astype(np.int64)
+        uniq, inv = np.unique(keys, return_inverse=True)
+        new = [q for q in uniq.tolist() if q not in self.pair_index]
+        if new:
+            n_old = len(self.pair_keys)
+            self.pair_index.update({q: n_old + j for j, q in enumerate(new)})
+            self.pair_keys = np.concatenate([self.pair_keys, np.array(new, dtype=np.int64)])
+            self.h2h_wins = np.concatenate([self.h2h_wins, np.zeros(len(new))])
+            self.h2h_total = np.concatenate([self.h2h_total, np.zeros(len(new))])
+        lookup = np.array([self.pair_index[q] for q in uniq.tolist()], dtype=np.int64)
+        return lookup[inv], p1_ids == lo
+
+    def export_state(self, players=None, pairs=None):
+        # running state as frames, optionally restricted to dense player / pair indexes
+        pi = np.arange(len(self.player_ids)) if players is None else np.unique(players)
+        qi = np.arange(len(self.pair_keys)) if pairs is None else np.unique(pairs)
+        last = self.last_play[pi].astype("datetime64[D]")
+        last[self.last_play[pi] == NO_DATE] = np.datetime64("NaT")
+        players_df = pd.DataFrame({
+            "player_id": self.player_ids[pi],
+            "elo_global": self.elo_global[pi],
+            "form_wins": self.form_wins[pi],
+            "form_total": self.form_total[pi],
+            "last_play": last,
+        })
+        surface_df = pd.DataFrame({
+            "surface": np.repeat(np.array(self.surfaces, dtype=object), len(pi)),
+            "player_id": np.tile(self.player_ids[pi], len(self.surfaces)),
+            "rating": self.elo_surface[:, pi].ravel(),
+        })
+        keys = self.pair_keys[qi]
+        h2h_df = pd.DataFrame({
+            "lo_id": keys >> 32,
+            "hi_id": keys & 0xFFFFFFFF,
+            "lo_wins": self.h2h_wins[qi],
+            "total": self.h2h_total[qi],
+        })
+        return players_df, surface_df, h2h_df
+
+    def restore(self, players_df, surface_df, h2h_df):
+        # inverse of export_state; unknown players/pairs keep their defaults
+        if len(players_df):
+            pi = self.player_idx(players_df["player_id"].to_numpy())
+            self.elo_global[pi] = players_df["elo_global"].to_numpy(dtype=float)
+            self.form_wins[pi] = players_df["form_wins"].to_numpy(dtype=float)
+            self.form_total[pi] = players_df["form_total"].to_numpy(dtype=float)
+            last = pd.to_datetime(players_df["last_play"])
+            self.last_play[pi] = np.where(last.isna(), NO_DATE, day_numbers(last.fillna(pd.Timestamp(0))))
+        if len(surface_df):
+            si = self.surface_idx(surface_df["surface"].to_numpy())
+            pi = self.player_idx(surface_df["player_id"].to_numpy())
+            self.elo_surface[si, pi] = surface_df["rating"].to_numpy(dtype=float)
+        if len(h2h_df):
+            qi, _ = self.pair_idx(h2h_df["lo_id"].to_numpy(dtype=np.int64), h2h_df["hi_id"].to_numpy(dtype=np.int64))
+            self.h2h_wins[qi] = h2h_df["lo_wins"].to_numpy(dtype=float)
+            self.h2h_total[qi] = h2h_df["total"].to_numpy(dtype=float)
+        return self
+
+    def _run(self, fn, jit_fn, inputs, state, n_out, n):
+        # one replay loop over (inputs, state, outputs); -> (state, outputs) as arrays
+        out = [np.full(n, np.nan) for _ in range(n_out)]
+        if self.use_numba:
+            jit_fn(*inputs, *state, *out)
+            return state, out
+        # plain Python indexing on lists is several times faster than on NumPy scalars
+        state_l = [x.tolist() for x in state]
+        out_l = [[0.0] * n for _ in range(n_out)]
+        fn(*[x.tolist() if isinstance(x, np.ndarray) else x for x in inputs], *state_l, *out_l)
+        return [np.array(x, dtype=y.dtype) for x, y in zip(state_l, state)], [np.array(x) for x in out_l]
+
+    def process(self, matches, part=None):
+        # matches must be completed and in replay order (see sort_matches); returns the wide frame.
+        # part="global" / "surface" replays only that Elo series (see partitions); the other
+        # columns are NaN (0 for the rest days) and the state they come from is left as it was
+        n = len(matches)
+        p1_ids = matches["p1_id"].to_numpy(dtype=np.int64)
+        p2_ids = matches["p2_id"].to_numpy(dtype=np.int64)
+        surface_raw = matches["surface"]
+        surface = surface_raw.where(surface_raw.notna(), DEFAULT_SURFACE)
+        a = self.player_idx(p1_ids)
+        b = self.player_idx(p2_ids)
+        s = self.surface_idx(surface.to_numpy())
+        k = surface.map(lambda x: K_SURFACE.get(x, DEFAULT_K)).to_numpy(dtype=float)
+        # an Elo-only part never reads the pair state
+        pair, p1_lo = self.pair_idx(p1_ids, p2_ids) if part is None else (np.empty(0, dtype=np.int64), None)
+        win1 = matches["winner_id"].to_numpy(dtype=np.int64) == p1_ids
+        day = day_numbers(matches["date"])
+        elo_s = np.ascontiguousarray(self.elo_surface).ravel()
+        n_players = len(self.player_ids)
+        core = [self.elo_global, self.form_wins, self.form_total, self.last_play, self.h2h_wins, self.h2h_total]
+        if part is None:
+            state, out = self._run(_replay, _replay_jit, [a, b, win1, s, k, day, pair, p1_lo, n_players], core[:1] + [elo_s] + core[1:], 9, n)
+            core = state[:1] + state[2:]; elo_s = state[1]
+            g1, g2, s1, s2, f1, f2, d1, d2, h2h = out
+        elif part in ("global", "surface"):
+            surf, keys, state = (np.zeros(n, dtype=np.int64), 1, core[0]) if part == "global" else (s, n_players, elo_s)
+            (state,), (r1, r2) = self._run(_replay_elo, _replay_elo_jit, [a, b, win1, surf, k, keys], [state], 2, n)
+            g1, g2, s1, s2, f1, f2, h2h = (np.full(n, np.nan) for _ in range(7))
+            d1 = d2 = np.zeros(n)   # integer columns: 0 rather than NaN
+            if part == "global":
+                core[0], g1, g2 = state, r1, r2
+            else:
+                elo_s, s1, s2 = state, r1, r2
+        else:
+            raise ValueError(f"part must be None, global or surface, got {part!r}")
+        (self.elo_global, self.form_wins, self.form_total, self.last_play, self.h2h_wins, self.h2h_total) = core
+        self.touched_players = np.union1d(a, b)
+        self.touched_pairs = np.unique(pair)
+        self.elo_surface = elo_s.reshape(len(self.surfaces), n_players)
+        return pd.DataFrame({
+            "match_id": matches["match_id"].to_numpy(dtype=np.int64),
+            "p1_id": p1_ids,
+            "p2_id": p2_ids,
+            "surface_raw": surface_raw.to_numpy(),
+            "surface": surface.to_numpy(),
+            "elo_p1_global": g1, "elo_p2_global": g2,
+            "elo_p1_surface": s1, "elo_p2_surface": s2,
+            "form_p1": f1, "form_p2": f2,
+            "days_since_p1": d1.astype(np.int64), "days_since_p2": d2.astype(np.int64),
+            "h2h_rate": h2h,
+            "label": win1.astype(np.int64),
+        })
+
+def basic_features(wide):
+    return pd.DataFrame({
+        "match_id": wide["match_id"],
+        "p1_id": wide["p1_id"],
+        "p2_id": wide["p2_id"],
+        "surface": wide["surface_raw"],
+        "elo_diff": wide["elo_p1_global"] - wide["elo_p2_global"],
+        "h2h_p1": 0.5,   # placeholder (can be replaced with true H2H computation)
+        "form_p1": wide["form_p1"],
+        "form_p2": wide["form_p2"],
+        "label": wide["label"],
+    })[BASIC_COLUMNS]
+
+def extended_features(wide):
+    return pd.DataFrame({
+        "match_id": wide["match_id"],
+        "p1_id": wide["p1_id"],
+        "p2_id": wide["p2_id"],
+        "surface": wide["surface"],
+        "elo_diff_surface": wide["elo_p1_surface"] - wide["elo_p2_surface"],
+        "elo_diff_global": wide["elo_p1_global"] - wide["elo_p2_global"],
+        "h2h_p1": wide["h2h_rate"],
+        "form_p1": wide["form_p1"],
+        "form_p2": wide["form_p2"],
+        "days_since_p1": wide["days_since_p1"],
+        "days_since_p2": wide["days_since_p2"],
+        # placeholder serve/return: we don't have stats in sample; set neutral 0.5
+        "serve_p1": 0.5,
+        "serve_p2": 0.5,
+        "label": wide["label"],
+    })[EXTENDED_COLUMNS]
+
+def compute_features(matches, extended=False, engine=None, ratings="elo"):
+    from .ratings import apply_ratings
+    m = sort_matches(matches)
+    wide = apply_ratings((engine or FeatureEngine()).process(m), day_numbers(m["date"]), ratings)
+    return extended_features(wide) if extended else basic_features(wide)
+
+def reference_input(matches):
+    # the matches with the two inputs on which the engine deliberately differs from the
+    # original row-wise loops made neutral: every pair listed with the lower id as p1 (the
+    # extended loop's h2h_p1 counted wins of whoever was p1 in each earlier meeting; the
+    # engine gives this match's p1's share) and missing surfaces filled with Hard (the loop
+    # fell back to the global table when no Hard match existed, updating it twice)
+    m = matches.copy()
+    swap = (m["p1_id"] > m["p2_id"]).to_numpy()
+    for a, b in (("p1_id", "p2_id"), ("p1_odd", "p2_odd")):
+        if a in m and b in m:
+            m.loc[swap, [a, b]] = m.loc[swap, [b, a]].to_numpy()
+    m["surface"] = m["surface"].fillna(DEFAULT_SURFACE)
+    return m
+
+def check_parity(matches, atol=1e-9):
+    # compare the engine with the original row-wise builders on the same matches
+    from .feature_builder import features_rowwise
+    from .feature_builder_extended import features_extended_rowwise
+    matches = reference_input(matches)
+    ok = True
+    for name, ref_fn, ext in (("basic", features_rowwise, False), ("extended", features_extended_rowwise, True)):
+        ref = ref_fn(sort_matches(matches))
+        for use_numba in ((False, True) if _replay_jit is not None else (False,)):
+            got = compute_features(matches, extended=ext, engine=FeatureEngine(use_numba=use_numba))
+            same = list(ref.columns) == list(got.columns) and len(ref) == len(got)
+            if same:
+                for c in ref.columns:
+                    x, y = ref[c].to_numpy(), got[c].to_numpy()
+                    if x.dtype.kind in "fiu" and y.dtype.kind in "fiu":
+                        same &= bool(np.allclose(x.astype(float), y.astype(float), rtol=0, atol=atol))
+                    else:
+                        same &= bool((pd.Series(x).fillna("") == pd.Series(y).fillna("")).all())
+            print(f"{name} ({'numba' if use_numba else 'python'}): {len(got)} rows -> {'OK' if same else 'MISMATCH'}")
+            ok &= same
+    return ok
+
+if __name__ == "__main__":
+    from ..utils.db import get_conn
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--check", action="store_true", help="parity check against the row-wise builders on the DB matches")
+    args = parser.parse_args()
+    if args.check:
+        conn = get_conn(readonly=True)
+        matches = conn.execute("SELECT * FROM matches").fetchdf()
+        conn.close()
+        raise SystemExit(0 if check_parity(matches) else 1)
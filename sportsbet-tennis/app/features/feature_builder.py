@@ -2,13 +2,13 @@ import argparse
 import pandas as pd
 from ..utils.db import get_conn
 from .elo import Elo
+from .incremental import build
+from .window_sql import FORM_ALL
+from .ratings import RATINGS_ELO
+from ..utils.profiling import stage, set_rows, add_profile_args, profiled
 
-def build_features():
-    conn = get_conn()
-    matches = conn.execute('SELECT * FROM matches ORDER BY date').fetchdf()
-    if matches.empty:
-        print("No matches found. Ingest data first.")
-        return
+def features_rowwise(matches):
+    # the original row-by-row builder, unchanged; reference for the engine parity check
     elo = Elo()
     rows = []
     # Basic rolling form: last 5 matches win rate
@@ -39,16 +39,29 @@ def build_features():
         elo.update(p1, p2, m.winner_id, surface=m.surface)
         update_form(p1, m.winner_id == p1)
         update_form(p2, m.winner_id == p2)
+    return pd.DataFrame(rows)
 
-    feats = pd.DataFrame(rows)
-    conn.execute("DELETE FROM features")
-    conn.execute("INSERT INTO features SELECT * FROM feats", {"feats": feats})
+@stage("build_features")
+def build_features(incremental=False, form=FORM_ALL, in_db=True, ratings=RATINGS_ELO, n_jobs=1):
+    conn = get_conn()
+    n, mode = build(conn, extended=False, incremental=incremental, form=form, in_db=in_db, ratings=ratings, n_jobs=n_jobs)
+    set_rows(n)
     conn.close()
-    print(f"Built {len(feats)} feature rows.")
+    if n == 0 and mode == "full":
+        print("No matches found. Ingest data first.")
+        return
+    print(f"Built {n} feature rows ({mode}).")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--rebuild", action="store_true")
+    parser.add_argument("--incremental", action="store_true", help="only process matches after the saved watermark")
+    parser.add_argument("--form", default=FORM_ALL, help="form window: all | last:N | decay:D (per match back)")
+    parser.add_argument("--engine-only", action="store_true", help="form from the engine replay instead of DuckDB windows")
+    parser.add_argument("--ratings", default=RATINGS_ELO, help="Elo columns from: elo (match by match) | glicko2[:day|week] | decay-elo[:day|week][:HALF_LIFE_DAYS]")
+    parser.add_argument("--n-jobs", type=int, default=1, help="full builds: replay tour/surface partitions on this many processes (-1 = all cores)")
+    add_profile_args(parser)
     args = parser.parse_args()
-    if args.rebuild:
-        build_features()
+    with profiled(args.profile):
+        if args.rebuild or args.incremental:
+            build_features(incremental=args.incremental, form=args.form, in_db=not args.engine_only, ratings=args.ratings, n_jobs=args.n_jobs)
@@ -5,13 +5,13 @@ import numpy as np
 from datetime import timedelta
 from ..utils.db import get_conn
 from .elo import Elo
+from .incremental import build
+from .window_sql import FORM_ALL
+from .ratings import RATINGS_ELO
+from ..utils.profiling import stage, set_rows, add_profile_args, profiled
 
-def build_features_extended():
-    conn = get_conn()
-    matches = conn.execute('SELECT * FROM matches ORDER BY date').fetchdf()
-    if matches.empty:
-        print("No matches found. Ingest data first.")
-        return
+def features_extended_rowwise(matches):
+    # the original row-by-row builder, unchanged; reference for the engine parity check
     # Create multi-surface Elo object keyed by surface
     elos = {}
     surfaces = matches['surface'].dropna().unique().tolist()
@@ -87,14 +87,28 @@ def build_features_extended():
         update_form(p2, winner==p2)
         last_play[p1] = date
         last_play[p2] = date
+    return pd.DataFrame(rows)
 
-    feats = pd.DataFrame(rows)
-    # persist to features table - drop old and insert
-    conn.execute("DELETE FROM features")
-    # ensure schema includes the new columns; for simplicity we will store JSON blob in artifacts too
-    conn.execute("INSERT INTO features SELECT * FROM feats", {"feats": feats})
+@stage("build_features_extended")
+def build_features_extended(incremental=False, form=FORM_ALL, in_db=True, ratings=RATINGS_ELO, n_jobs=1):
+    conn = get_conn()
+    # persist to features table - full rebuild replaces it, incremental appends past the watermark
+    n, mode = build(conn, extended=True, incremental=incremental, form=form, in_db=in_db, ratings=ratings, n_jobs=n_jobs)
+    set_rows(n)
     conn.close()
-    print(f"Built {len(feats)} extended feature rows.")
+    if n == 0 and mode == "full":
+        print("No matches found. Ingest data first.")
+        return
+    print(f"Built {n} extended feature rows ({mode}).")
 
 if __name__ == '__main__':
-    build_features_extended()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--incremental", action="store_true", help="only process matches after the saved watermark")
+    parser.add_argument("--form", default=FORM_ALL, help="form window: all | last:N | decay:D (per match back)")
+    parser.add_argument("--engine-only", action="store_true", help="form/H2H/rest days from the engine replay instead of DuckDB windows")
+    parser.add_argument("--ratings", default=RATINGS_ELO, help="Elo columns from: elo (match by match) | glicko2[:day|week] | decay-elo[:day|week][:HALF_LIFE_DAYS]")
+    parser.add_argument("--n-jobs", type=int, default=1, help="full builds: replay tour/surface partitions on this many processes (-1 = all cores)")
+    add_profile_args(parser)
+    args = parser.parse_args()
+    with profiled(args.profile):
+        build_features_extended(incremental=args.incremental, form=args.form, in_db=not args.engine_only, ratings=args.ratings, n_jobs=args.n_jobs)
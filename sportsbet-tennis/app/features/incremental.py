@@ -0,0 +1,137 @@
+from datetime import datetime
+import pandas as pd
+from ..utils.profiling import stage
+from .engine import FeatureEngine, basic_features, extended_features, sort_matches, day_numbers
+from .window_sql import FORM_ALL, parse_form, insert_features
+from .ratings import RATINGS_ELO, parse_ratings, apply_ratings
+from .partitions import process_partitioned
+
+# Persisted engine state + watermark so the nightly build only replays new matches.
+# A full build stores the whole end-of-history state; an incremental build loads only
+# the rows for players/pairs in the new matches, processes matches after the
+# (date, match_id) watermark, appends their feature rows and upserts the touched state.
+# It falls back to a full rebuild when there is no state, the column set changed,
+# the features table no longer matches the state, or completed matches were backfilled
+# at or before the watermark, or the form definition or rating system changed. Period
+# ratings (glicko2, decay-elo; see ratings) keep no saved state and always rebuild in full.
+# With in_db (the default) form, H2H and rest days come from the DuckDB window queries in
+# window_sql; the engine replay supplies the sequential Elo series and the saved state.
+# Full builds with n_jobs != 1 run that replay partitioned on a process pool (see partitions).
+
+STATE_NAME = "feature_engine"
+
+def load_meta(conn):
+    row = conn.execute("SELECT builder, last_date, last_match_id, rows, form_spec, ratings FROM feature_state_meta WHERE name=?", [STATE_NAME]).fetchone()
+    if not row:
+        return None
+    return {"builder": row[0], "last_date": row[1], "last_match_id": row[2], "rows": row[3], "form": row[4] or FORM_ALL,
+            "ratings": row[5] or RATINGS_ELO}
+
+def fallback_reason(conn, meta, builder, form=FORM_ALL, ratings=RATINGS_ELO):
+    if ratings != RATINGS_ELO:
+        return f"{ratings} ratings are rebuilt in full"
+    if meta is None:
+        return "no saved state"
+    if meta["builder"] != builder:
+        return f"features were built by the {meta['builder']} builder"
+    if meta["form"] != form:
+        return f"features were built with form {meta['form']}"
+    if meta["ratings"] != ratings:
+        return f"features were built with {meta['ratings']} ratings"
+    n_feats = conn.execute("SELECT count(*) FROM features").fetchone()[0]
+    if n_feats != meta["rows"]:
+        return f"features table has {n_feats} rows, state expects {meta['rows']}"
+    backfilled = conn.execute('''
+        SELECT count(*) FROM matches m
+        WHERE m.winner_id IS NOT NULL
+          AND (m.date < ? OR (m.date = ? AND m.match_id <= ?))
+          AND NOT EXISTS (SELECT 1 FROM features f WHERE f.match_id = m.match_id)
+    ''', [meta["last_date"], meta["last_date"], meta["last_match_id"]]).fetchone()[0]
+    if backfilled:
+        return f"{backfilled} completed matches landed at or before the watermark"
+    return None
+
+def load_state(conn, matches):
+    # only the state rows the new matches can read
+    ids = pd.DataFrame({"player_id": pd.unique(pd.concat([matches.p1_id, matches.p2_id]))})
+    pairs = pd.DataFrame({"lo_id": matches[["p1_id", "p2_id"]].min(axis=1), "hi_id": matches[["p1_id", "p2_id"]].max(axis=1)}).drop_duplicates()
+    conn.register("_state_ids", ids)
+    conn.register("_state_pairs", pairs)
+    players_df = conn.execute("SELECT s.* FROM feature_state_players s JOIN _state_ids USING(player_id)").fetchdf()
+    surface_df = conn.execute("SELECT s.* FROM feature_state_surface_elo s JOIN _state_ids USING(player_id)").fetchdf()
+    h2h_df = conn.execute("SELECT s.* FROM feature_state_h2h s JOIN _state_pairs USING(lo_id, hi_id)").fetchdf()
+    conn.unregister("_state_ids")
+    conn.unregister("_state_pairs")
+    return FeatureEngine().restore(players_df, surface_df, h2h_df)
+
+def save_state(conn, engine, builder, last, rows, full, form=FORM_ALL, ratings=RATINGS_ELO):
+    # full: replace everything; otherwise upsert the rows touched by the last batch
+    if full:
+        players_df, surface_df, h2h_df = engine.export_state()
+        for t in ("feature_state_players", "feature_state_surface_elo", "feature_state_h2h"):
+            conn.execute(f"DELETE FROM {t}")
+    else:
+        players_df, surface_df, h2h_df = engine.export_state(engine.touched_players, engine.touched_pairs)
+    for t, df in (("feature_state_players", players_df), ("feature_state_surface_elo", surface_df), ("feature_state_h2h", h2h_df)):
+        conn.register("_state_df", df)
+        conn.execute(f"INSERT OR REPLACE INTO {t} BY NAME SELECT * FROM _state_df")
+        conn.unregister("_state_df")
+    conn.execute("INSERT OR REPLACE INTO feature_state_meta (name, builder, last_date, last_match_id, rows, updated_at, form_spec, ratings) "
+                 "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", [STATE_NAME, builder, last[0], last[1], rows, datetime.utcnow(), form, ratings])
+
+@stage("features.replay", rows=lambda r: r[0])
+def build(conn, extended=False, incremental=False, form=FORM_ALL, in_db=True, ratings=RATINGS_ELO, n_jobs=1):
+    # returns (feature rows written, "full" | "incremental")
+    builder = "extended" if extended else "basic"
+    to_frame = extended_features if extended else basic_features
+    form = parse_form(form)
+    ratings = parse_ratings(ratings)
+    if form != FORM_ALL and not in_db:
+        raise ValueError("form windows other than 'all' are only computed in-database")
+    meta = load_meta(conn) if incremental else None
+    if incremental:
+        reason = fallback_reason(conn, meta, builder, form, ratings)
+        if reason:
+            print(f"Incremental build not possible ({reason}); rebuilding from scratch.")
+            incremental = False
+    if incremental:
+        matches = conn.execute('''
+            SELECT * FROM matches
+            WHERE winner_id IS NOT NULL AND (date > ? OR (date = ? AND match_id > ?))
+            ORDER BY date, match_id
+        ''', [meta["last_date"], meta["last_date"], meta["last_match_id"]]).fetchdf()
+        if matches.empty:
+            return 0, "incremental"
+        matches = sort_matches(matches)
+        engine = load_state(conn, matches)
+    else:
+        matches = conn.execute('SELECT * FROM matches WHERE winner_id IS NOT NULL ORDER BY date, match_id').fetchdf()
+        if matches.empty:
+            return 0, "full"
+        matches = sort_matches(matches)
+        engine = FeatureEngine()
+    if incremental or n_jobs == 1:
+        wide = engine.process(matches)
+    else:
+        wide, engine = process_partitioned(matches, n_jobs)
+    # the engine state saved below stays the match-by-match Elo one whatever the ratings
+    feats = to_frame(apply_ratings(wide, day_numbers(matches["date"]), ratings))
+    last = (matches["date"].iloc[-1], int(matches["match_id"].iloc[-1]))
+    since = (meta["last_date"], meta["last_match_id"]) if incremental else None
+    conn.execute("BEGIN TRANSACTION")
+    try:
+        if not incremental:
+            conn.execute("DELETE FROM features")
+        conn.register("feats", feats)
+        if in_db:
+            n = insert_features(conn, "feats", builder, form, since)
+        else:
+            n = conn.execute("INSERT INTO features BY NAME SELECT * FROM feats").fetchone()[0]
+        conn.unregister("feats")
+        rows = n + (meta["rows"] if incremental else 0)
+        save_state(conn, engine, builder, last, rows, full=not incremental, form=form, ratings=ratings)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return n, "incremental" if incremental else "full"
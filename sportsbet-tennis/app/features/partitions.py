@@ -0,0 +1,188 @@
+import argparse, time
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from ..utils.profiling import stage
+from .engine import FeatureEngine, sort_matches, day_numbers, DEFAULT_SURFACE, DEFAULT_REST_DAYS
+
+# Partitioned engine replay for full rebuilds.
+# Only the Elo series are truly sequential. Form, last played and H2H are running counts per
+# player or pair, computed here for all matches at once with grouped cumulative sums (exact
+# on integer counts, so bit for bit the loop's values). Each surface's Elo is independent of
+# the others. Tours whose histories share no player (ATP and WTA) are independent as well.
+# So the Elo replay runs as tasks on a process pool: one global-Elo task per tour group,
+# the only state that crosses surfaces, and one surface-Elo task per (group, surface). Each
+# task replays its slice of the date-ordered history in order. Outputs are written back by
+# row position, so the result stays in replay order, and the tasks' end states are merged
+# into one engine. The result equals FeatureEngine().process and the engine it leaves.
+# Matches without a tour form their own group, merged with any tour whose players they share.
+
+PART_COLUMNS = ["match_id", "p1_id", "p2_id", "winner_id", "surface", "date"]
+ELO_COLUMNS = {"global": ["elo_p1_global", "elo_p2_global"], "surface": ["elo_p1_surface", "elo_p2_surface"]}
+
+def tour_groups(matches):
+    # -> row positions per group of tours that share players (union-find over tour labels)
+    tour = (matches["tour"] if "tour" in matches else pd.Series(None, index=matches.index)).fillna("").astype(str).to_numpy()
+    parent = {t: t for t in np.unique(tour).tolist()}
+
+    def find(t):
+        while parent[t] != t:
+            t = parent[t]
+        return t
+
+    seen = pd.DataFrame({"player": np.concatenate([matches["p1_id"].to_numpy(), matches["p2_id"].to_numpy()]),
+                         "tour": np.concatenate([tour, tour])}).drop_duplicates()
+    shared = seen[seen.duplicated("player", keep=False)]
+    for tours in {tuple(sorted(ts)) for ts in shared.groupby("player")["tour"].agg(list)}:
+        root = find(tours[0])
+        for t in tours[1:]:
+            parent[find(t)] = root
+    roots = np.array([find(t) for t in tour], dtype=object)
+    return [np.flatnonzero(roots == r) for r in pd.unique(roots)]
+
+def plan(matches):
+    # -> [(part, row positions)]: a global-Elo task per tour group, a surface-Elo task per (group, surface)
+    surface = matches["surface"].where(matches["surface"].notna(), DEFAULT_SURFACE).to_numpy(dtype=object)
+    tasks = []
+    for rows in tour_groups(matches):
+        tasks.append(("global", rows))
+        for s in pd.unique(surface[rows]):
+            tasks.append(("surface", rows[surface[rows] == s]))
+    # largest first, so a long task does not start last
+    return sorted(tasks, key=lambda t: -len(t[1]))
+
+def _running(key, value, seq):
+    # events -> (order by key then seq, value sum and count before each event, group starts)
+    order = np.lexsort((seq, key))
+    key, value = key[order], value[order]
+    first = np.r_[True, key[1:] != key[:-1]]
+    start = np.maximum.accumulate(np.where(first, np.arange(len(key)), 0))
+    total = np.cumsum(value)
+    before = total - value - (total[start] - value[start])
+    return order, before, (np.arange(len(key)) - start).astype(float), first
+
+def keyed_state(matches):
+    # form, rest days and H2H going into every match, plus the end state behind them
+    n = len(matches)
+    p1 = matches["p1_id"].to_numpy(dtype=np.int64); p2 = matches["p2_id"].to_numpy(dtype=np.int64)
+    win1 = (matches["winner_id"].to_numpy(dtype=np.int64) == p1).astype(float)
+    day = day_numbers(matches["date"])
+    seq = np.arange(n)
+    # player events, two per match
+    player, ev_day = np.concatenate([p1, p2]), np.concatenate([day, day])
+    order, wins, count, first = _running(player, np.concatenate([win1, 1.0 - win1]), np.concatenate([seq, seq]))
+    d = ev_day[order]
+    form, rest = np.empty(2 * n), np.empty(2 * n, dtype=np.int64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        form[order] = np.where(count > 0, wins / count, 0.5)
+    rest[order] = np.where(first, DEFAULT_REST_DAYS, d - np.r_[d[:1], d[:-1]])
+    last = np.r_[first[1:], True]   # last event of each player
+    won = np.concatenate([win1, 1.0 - win1])[order]
+    players_df = pd.DataFrame({"player_id": player[order][last], "form_wins": (wins + won)[last],
+                               "form_total": count[last] + 1.0, "last_play": d[last].astype("datetime64[D]")})
+    # pair events, one per match, wins counted for the lower player id
+    lo, hi = np.minimum(p1, p2), np.maximum(p1, p2)
+    p1_lo = p1 == lo
+    lo_won = (win1.astype(bool) == p1_lo).astype(float)
+    order, lo_wins, total, first = _running((lo << 32) | hi, lo_won, seq)
+    h2h = np.empty(n)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rate = lo_wins / total
+    h2h[order] = np.where(total > 0, np.where(p1_lo[order], rate, 1.0 - rate), 0.5)
+    last = np.r_[first[1:], True]   # last event of each pair
+    h2h_df = pd.DataFrame({"lo_id": lo[order][last], "hi_id": hi[order][last],
+                           "lo_wins": (lo_wins + lo_won[order])[last], "total": total[last] + 1.0})
+    cols = {"form_p1": form[:n], "form_p2": form[n:], "days_since_p1": rest[:n], "days_since_p2": rest[n:], "h2h_rate": h2h}
+    return cols, players_df, h2h_df
+
+def _replay_part(matches, part, use_numba):
+    engine = FeatureEngine(use_numba=use_numba)
+    wide = engine.process(matches, part)
+    players_df, surface_df, _ = engine.export_state()
+    return wide[ELO_COLUMNS[part]], players_df[["player_id", "elo_global"]] if part == "global" else surface_df
+
+def merge(matches, tasks, results, keyed):
+    # Elo outputs back into replay order next to the keyed columns, end states into one engine
+    cols, players_df, h2h_df = keyed
+    cols = dict(cols)
+    glob, surfaces = [], []
+    for (part, rows), (elo, state) in zip(tasks, results):
+        for c in ELO_COLUMNS[part]:
+            cols.setdefault(c, np.empty(len(matches)))[rows] = elo[c].to_numpy()
+        (glob if part == "global" else surfaces).append(state)
+    surface_raw = matches["surface"]
+    p1 = matches["p1_id"].to_numpy(dtype=np.int64)
+    wide = pd.DataFrame({
+        "match_id": matches["match_id"].to_numpy(dtype=np.int64),
+        "p1_id": p1,
+        "p2_id": matches["p2_id"].to_numpy(dtype=np.int64),
+        "surface_raw": surface_raw.to_numpy(),
+        "surface": surface_raw.where(surface_raw.notna(), DEFAULT_SURFACE).to_numpy(),
+        **{c: cols[c] for c in ("elo_p1_global", "elo_p2_global", "elo_p1_surface", "elo_p2_surface",
+                                "form_p1", "form_p2", "days_since_p1", "days_since_p2", "h2h_rate")},
+        "label": (matches["winner_id"].to_numpy(dtype=np.int64) == p1).astype(np.int64),
+    })
+    players_df = pd.concat(glob, ignore_index=True).merge(players_df, on="player_id")
+    engine = FeatureEngine().restore(players_df, pd.concat(surfaces, ignore_index=True), h2h_df)
+    return wide, engine
+
+@stage("features.partitioned_replay", rows=lambda r: len(r[0]))
+def process_partitioned(matches, n_jobs=-1, use_numba=None):
+    # matches in replay order (see sort_matches) -> (wide frame, engine holding the end state),
+    # the same as FeatureEngine().process and the engine it leaves behind
+    tasks = plan(matches)
+    parts = [matches.iloc[rows][PART_COLUMNS] for _, rows in tasks]
+    kinds = [part for part, _ in tasks]
+    if n_jobs == 1 or len(tasks) == 1:
+        results = [_replay_part(m, k, use_numba) for m, k in zip(parts, kinds)]
+        keyed = keyed_state(matches)
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs if n_jobs > 0 else None) as ex:
+            futures = ex.map(_replay_part, parts, kinds, [use_numba] * len(tasks))
+            keyed = keyed_state(matches)   # vectorized, in this process while the pool replays
+            results = list(futures)
+    return merge(matches, tasks, results, keyed)
+
+def _same(x, y):
+    x, y = np.asarray(x), np.asarray(y)
+    if x.dtype.kind in "fiu" and y.dtype.kind in "fiu":
+        return x.shape == y.shape and bool(np.array_equal(x.astype(float), y.astype(float), equal_nan=True))
+    return bool((pd.Series(x).fillna("").to_numpy() == pd.Series(y).fillna("").to_numpy()).all())
+
+def check_parity(matches, n_jobs=-1):
+    # partitioned replay against the single-loop one: every output column and the saved state
+    m = sort_matches(matches)
+    t = time.perf_counter()
+    ref_engine = FeatureEngine()
+    ref = ref_engine.process(m)
+    t_seq = time.perf_counter() - t
+    t = time.perf_counter()
+    got, engine = process_partitioned(m, n_jobs)
+    t_par = time.perf_counter() - t
+    ok = list(ref.columns) == list(got.columns) and all(_same(ref[c], got[c]) for c in ref.columns)
+    keys = (["player_id"], ["surface", "player_id"], ["lo_id", "hi_id"])
+    for name, a, b, k in zip(("players", "surface_elo", "h2h"), ref_engine.export_state(), engine.export_state(), keys):
+        a = a.sort_values(k, ignore_index=True); b = b.sort_values(k, ignore_index=True)
+        same = list(a.columns) == list(b.columns) and len(a) == len(b) and all(_same(a[c], b[c]) for c in a.columns)
+        print(f"state {name:12s} {len(a)} rows -> {'OK' if same else 'MISMATCH'}")
+        ok &= same
+    print(f"{len(plan(m))} tasks over {len(tour_groups(m))} tour groups; single loop {t_seq:.2f}s, partitioned {t_par:.2f}s")
+    print(f"{len(m)} matches -> {'OK' if ok else 'MISMATCH'}")
+    return ok
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--check", action="store_true", help="compare with the single-loop replay on the DB matches")
+    parser.add_argument("--synthetic", type=int, default=0, metavar="N", help="check on N synthetic matches instead")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="worker processes (-1 = all cores)")
+    args = parser.parse_args()
+    if args.synthetic:
+        from ..bench.synth import generate
+        matches = generate(args.synthetic)[1]
+    else:
+        from ..utils.db import get_conn
+        conn = get_conn(readonly=True)
+        matches = conn.execute("SELECT * FROM matches WHERE winner_id IS NOT NULL").fetchdf()
+        conn.close()
+    if args.check or args.synthetic:
+        raise SystemExit(0 if check_parity(matches, args.n_jobs) else 1)
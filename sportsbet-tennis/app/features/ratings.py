@@ -0,0 +1,257 @@
+import argparse, math
+import numpy as np
+import pandas as pd
+from .elo import K_SURFACE
+from .engine import BASE_RATING, DEFAULT_K, DEFAULT_SURFACE, day_numbers, sort_matches
+
+# Rating systems updated in rating periods, as alternatives to the engine's match-by-match Elo.
+# Matches are grouped into calendar periods (weeks by default, so a tournament is one
+# period). Every match of a period sees the ratings as they stood when the period began.
+# All of the period's results then move the ratings at once, as array math over the keys
+# that played in it: np.bincount per period, not one Python call per match.
+# Glicko-2 keeps a rating deviation (RD) that grows while a player is idle, plus a
+# volatility. The decayed Elo pulls an idle player's rating back toward the base, with a
+# half-life in days. Surface ratings run the same system over (surface, player) keys.
+# Spec strings: elo | glicko2[:day|week] | decay-elo[:day|week][:HALF_LIFE_DAYS]
+
+RATINGS_ELO = "elo"
+RATING_SYSTEMS = ("elo", "glicko2", "decay-elo")
+PERIOD_DAYS = {"day": 1, "week": 7}
+DEFAULT_PERIOD = "week"
+DECAY_HALF_LIFE_DAYS = 365.0
+GLICKO_SCALE = 400.0 / math.log(10.0)   # Glicko-2 internal scale, ~173.72 rating points
+GLICKO_RD = 350.0           # deviation of an unrated player, and the ceiling for idle ones
+GLICKO_VOLATILITY = 0.06
+GLICKO_TAU = 0.5            # how fast volatility may change
+GLICKO_EPS = 1e-6
+GLICKO_MAX_ITERS = 100
+
+def parse_ratings(value):
+    # -> canonical spec string with every parameter spelled out
+    value = (value or RATINGS_ELO).strip().lower()
+    kind, *args = value.split(":")
+    if kind == RATINGS_ELO and not args:
+        return kind
+    if kind in ("glicko2", "decay-elo"):
+        period = args.pop(0) if args and args[0] in PERIOD_DAYS else DEFAULT_PERIOD
+        if kind == "glicko2" and not args:
+            return f"glicko2:{period}"
+        if kind == "decay-elo" and len(args) <= 1:
+            try:
+                half_life = float(args[0]) if args else DECAY_HALF_LIFE_DAYS
+            except ValueError:
+                half_life = 0.0
+            if half_life > 0:
+                return f"decay-elo:{period}:{half_life:g}"
+    raise ValueError(f"ratings must be elo, glicko2[:day|week] or decay-elo[:day|week][:HALF_LIFE_DAYS], got {value!r}")
+
+def period_numbers(day, period=DEFAULT_PERIOD):
+    # day numbers (days since epoch) -> calendar period numbers; weeks start on Monday
+    day = np.asarray(day, dtype=np.int64)
+    return day if period == "day" else (day + 3) // 7   # 1970-01-01 was a Thursday
+
+class PeriodRatings:
+    # shared period driver; subclasses keep extra per-key arrays and implement _age/_update
+    def __init__(self, period=DEFAULT_PERIOD, base=BASE_RATING):
+        self.period = period
+        self.base = base
+        self.rating = np.empty(0)
+        self.last_period = np.empty(0, dtype=np.int64)   # period of the key's last update
+
+    def _extend(self, extra):
+        self.rating = np.concatenate([self.rating, np.full(extra, self.base)])
+        self.last_period = np.concatenate([self.last_period, np.full(extra, np.iinfo(np.int64).min, dtype=np.int64)])
+
+    def seen(self, rating, idle):
+        # rating as read `idle` periods after its last update (identity unless it decays)
+        return rating
+
+    def rate(self, a, b, s1, period, k=None):
+        # a, b: dense key indexes in match order; period: non-decreasing period numbers;
+        # -> pre-match ratings (r1, r2) and ratings after each match's period (post1, post2)
+        a = np.asarray(a, dtype=np.int64); b = np.asarray(b, dtype=np.int64)
+        s1 = np.asarray(s1, dtype=float); period = np.asarray(period, dtype=np.int64)
+        n = len(a)
+        size = int(max(a.max(), b.max())) + 1 if n else 0
+        if size > len(self.rating):
+            self._extend(size - len(self.rating))
+        pre1, pre2, post1, post2 = (np.empty(n) for _ in range(4))
+        cuts = np.flatnonzero(np.diff(period)) + 1
+        # one hash pass for all periods: the distinct (period, key) pairs in order of first
+        # appearance - period order, as the sides are interleaved match by match - and each
+        # side's position among them; a period's keys are then one contiguous slice
+        rank = np.zeros(n, dtype=np.int64)
+        rank[cuts] = 1
+        rank = np.cumsum(rank)
+        inv, pairs = pd.factorize(np.column_stack([rank * size + a, rank * size + b]).ravel())
+        inv1, inv2 = inv[0::2], inv[1::2]
+        bounds = np.searchsorted(pairs // size, np.arange(len(cuts) + 2))
+        for j, (lo, hi) in enumerate(zip(np.r_[0, cuts], np.r_[cuts, n])):
+            start, end = bounds[j], bounds[j + 1]
+            keys = pairs[start:end] - j * size
+            i1, i2 = inv1[lo:hi] - start, inv2[lo:hi] - start
+            self._age(keys, period[lo])
+            r = self.rating[keys]
+            pre1[lo:hi], pre2[lo:hi] = r[i1], r[i2]
+            self._update(keys, i1, i2, s1[lo:hi], None if k is None else k[lo:hi])
+            r = self.rating[keys]
+            post1[lo:hi], post2[lo:hi] = r[i1], r[i2]
+            self.last_period[keys] = period[lo]
+        return pre1, pre2, post1, post2
+
+class DecayedElo(PeriodRatings):
+    # Elo with simultaneous updates per period; an idle rating halves its distance to the
+    # base every half_life days
+    def __init__(self, period=DEFAULT_PERIOD, half_life=DECAY_HALF_LIFE_DAYS, base=BASE_RATING):
+        super().__init__(period, base)
+        self.half_life = half_life
+
+    def seen(self, rating, idle):
+        idle = np.maximum(np.asarray(idle, dtype=float) - 1.0, 0.0)   # the period right after an update is not idle
+        return self.base + (rating - self.base) * 0.5 ** (idle * PERIOD_DAYS[self.period] / self.half_life)
+
+    def _age(self, keys, period):
+        rated = self.last_period[keys] > np.iinfo(np.int64).min
+        idx = keys[rated]
+        self.rating[idx] = self.seen(self.rating[idx], period - self.last_period[idx])
+
+    def _update(self, keys, i1, i2, s1, k):
+        r = self.rating[keys]
+        e1 = 1.0 / (1.0 + 10.0 ** ((r[i2] - r[i1]) / 400.0))
+        d = (DEFAULT_K if k is None else k) * (s1 - e1)
+        self.rating[keys] = r + np.bincount(i1, d, len(keys)) - np.bincount(i2, d, len(keys))
+
+class Glicko2(PeriodRatings):
+    # Glickman's Glicko-2, every player of a period updated at once
+    def __init__(self, period=DEFAULT_PERIOD, tau=GLICKO_TAU, base=BASE_RATING):
+        super().__init__(period, base)
+        self.tau = tau
+        self.rd = np.empty(0)
+        self.volatility = np.empty(0)
+
+    def _extend(self, extra):
+        super()._extend(extra)
+        self.rd = np.concatenate([self.rd, np.full(extra, GLICKO_RD)])
+        self.volatility = np.concatenate([self.volatility, np.full(extra, GLICKO_VOLATILITY)])
+
+    def _age(self, keys, period):
+        # RD grows by the volatility for every period a player sat out (not the current one)
+        rated = self.last_period[keys] > np.iinfo(np.int64).min
+        idx = keys[rated]
+        idle = np.maximum(period - self.last_period[idx] - 1, 0)
+        phi2 = (self.rd[idx] / GLICKO_SCALE) ** 2 + idle * self.volatility[idx] ** 2
+        self.rd[idx] = np.minimum(np.sqrt(phi2) * GLICKO_SCALE, GLICKO_RD)
+
+    def _volatility(self, phi, sigma, v, delta):
+        # Illinois iteration of step 5, vectorized over the players of the period
+        a = np.log(sigma ** 2)
+        tau2, spread = self.tau ** 2, phi ** 2 + v
+        gap = delta ** 2 - spread
+
+        def f(x, i=slice(None)):
+            ex = np.exp(x)
+            return ex * (gap[i] - ex) / (2.0 * (spread[i] + ex) ** 2) - (x - a[i]) / tau2
+
+        A = a.copy()
+        big = gap > 0
+        B = np.where(big, np.log(np.where(big, gap, 1.0)), a - self.tau)
+        low = np.flatnonzero(~big & (f(B) < 0))
+        while low.size:
+            B[low] -= self.tau
+            low = low[f(B[low], low) < 0]
+        fA, fB = f(A), f(B)
+        # iterate on the entries that have not converged yet only
+        act = np.flatnonzero(np.abs(B - A) > GLICKO_EPS)
+        for _ in range(GLICKO_MAX_ITERS):
+            if not act.size:
+                break
+            a_, b_, fa, fb = A[act], B[act], fA[act], fB[act]
+            C = a_ + (a_ - b_) * fa / (fb - fa)
+            fC = f(C, act)
+            swap = fC * fb <= 0
+            A[act] = np.where(swap, b_, a_)
+            fA[act] = np.where(swap, fb, fa / 2.0)
+            B[act], fB[act] = C, fC
+            act = act[np.abs(C - A[act]) > GLICKO_EPS]
+        return np.exp(A / 2.0)
+
+    def _update(self, keys, i1, i2, s1, k):
+        m = len(keys)
+        mu = (self.rating[keys] - self.base) / GLICKO_SCALE
+        phi = self.rd[keys] / GLICKO_SCALE
+        g = 1.0 / np.sqrt(1.0 + 3.0 * phi ** 2 / math.pi ** 2)
+        # every game seen from both sides: the player, the opponent's g and the expected score
+        me = np.concatenate([i1, i2]); opp = np.concatenate([i2, i1])
+        score = np.concatenate([s1, 1.0 - s1])
+        e = 1.0 / (1.0 + np.exp(-g[opp] * (mu[me] - mu[opp])))
+        v = 1.0 / np.bincount(me, g[opp] ** 2 * e * (1.0 - e), m)
+        gain = np.bincount(me, g[opp] * (score - e), m)
+        sigma = self._volatility(phi, self.volatility[keys], v, v * gain)
+        phi = 1.0 / np.sqrt(1.0 / (phi ** 2 + sigma ** 2) + 1.0 / v)
+        self.rating[keys] = self.base + GLICKO_SCALE * (mu + phi ** 2 * gain)
+        self.rd[keys] = phi * GLICKO_SCALE
+        self.volatility[keys] = sigma
+
+def rating_system(spec):
+    # fresh system for a spec, None for the engine's own Elo
+    spec = parse_ratings(spec)
+    kind, *args = spec.split(":")
+    if kind == "glicko2":
+        return Glicko2(args[0])
+    if kind == "decay-elo":
+        return DecayedElo(args[0], float(args[1]))
+    return None
+
+def rate_matches(p1_ids, p2_ids, win1, surface, day, spec):
+    # global and per-surface ratings of matches in replay order; -> (pre, post, periods)
+    # with pre/post keyed like the engine's Elo columns
+    p1_ids = np.asarray(p1_ids, dtype=np.int64); p2_ids = np.asarray(p2_ids, dtype=np.int64)
+    n = len(p1_ids)
+    inv, players = pd.factorize(np.concatenate([p1_ids, p2_ids]))
+    a, b = inv[:n], inv[n:]
+    code, surfaces = pd.factorize(np.asarray(surface, dtype=object))
+    surfaces = surfaces.tolist()
+    if (code < 0).any():   # missing surface: the engine's default
+        if DEFAULT_SURFACE not in surfaces:
+            surfaces.append(DEFAULT_SURFACE)
+        code[code < 0] = surfaces.index(DEFAULT_SURFACE)
+    k = np.array([K_SURFACE.get(s, DEFAULT_K) for s in surfaces])[code]
+    glob, surf = rating_system(spec), rating_system(spec)
+    periods = period_numbers(day, glob.period)
+    win1 = np.asarray(win1, dtype=float)
+    g = glob.rate(a, b, win1, periods, k)
+    s = surf.rate(code * len(players) + a, code * len(players) + b, win1, periods, k)
+    cols = ("elo_p1_global", "elo_p2_global", "elo_p1_surface", "elo_p2_surface")
+    return dict(zip(cols, (g[0], g[1], s[0], s[1]))), dict(zip(cols, (g[2], g[3], s[2], s[3]))), periods
+
+def apply_ratings(wide, day, spec):
+    # FeatureEngine.process frame with its Elo columns replaced by the spec's ratings
+    if parse_ratings(spec) == RATINGS_ELO:
+        return wide
+    pre, _, _ = rate_matches(wide["p1_id"], wide["p2_id"], wide["label"], wide["surface"], day, spec)
+    return wide.assign(**pre)
+
+def log_loss(matches, spec):
+    # out-of-sample log loss of the pre-match global rating gap (Elo logistic curve)
+    m = sort_matches(matches)
+    win1 = (m["winner_id"].to_numpy(dtype=np.int64) == m["p1_id"].to_numpy(dtype=np.int64)).astype(float)
+    if parse_ratings(spec) == RATINGS_ELO:
+        from .engine import FeatureEngine
+        w = FeatureEngine().process(m)
+        diff = (w["elo_p1_global"] - w["elo_p2_global"]).to_numpy()
+    else:
+        pre, _, _ = rate_matches(m["p1_id"], m["p2_id"], win1, m["surface"], day_numbers(m["date"]), spec)
+        diff = pre["elo_p1_global"] - pre["elo_p2_global"]
+    p = np.clip(1.0 / (1.0 + 10.0 ** (-diff / 400.0)), 1e-12, 1 - 1e-12)
+    return float(-np.mean(win1 * np.log(p) + (1.0 - win1) * np.log1p(-p)))
+
+if __name__ == "__main__":
+    from ..utils.db import get_conn
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ratings", nargs="+", default=["elo", "glicko2", "decay-elo"], help="specs to compare on the DB matches")
+    args = parser.parse_args()
+    conn = get_conn(readonly=True)
+    matches = conn.execute("SELECT * FROM matches WHERE winner_id IS NOT NULL").fetchdf()
+    conn.close()
+    for spec in args.ratings:
+        print(f"{parse_ratings(spec):24s} log loss {log_loss(matches, spec):.4f} ({len(matches)} matches)")
@@ -0,0 +1,170 @@
+import argparse, math
+import numpy as np
+import pandas as pd
+
+# Non-Elo features (form, head-to-head, rest days) computed inside DuckDB.
+# Each completed match is unfolded into one appearance row per player; form and rest days
+# are window aggregates partitioned by player, H2H by (lower id, higher id) pair, all
+# ordered by (date, match_id) with frames that end at 1 PRECEDING, so a row only sees
+# matches replayed before it. DuckDB runs the windows on all cores and the result is
+# joined to the engine's sequential Elo series in the INSERT itself (no pandas round trip).
+# Form is configurable: all history (the engine's definition), the last N matches, or an
+# exponentially decayed win rate where the match k appearances back weighs decay**(k-1).
+
+FORM_ALL = "all"
+DEFAULT_REST_DAYS = 30
+MAX_EXP = 700.0   # |log weight| kept below double overflow; see form_expr
+
+def parse_form(value):
+    # "all" | "last:N" | "decay:D" -> canonical spec string
+    value = (value or FORM_ALL).strip().lower()
+    if value == FORM_ALL:
+        return value
+    kind, _, arg = value.partition(":")
+    if kind == "last" and arg.isdigit() and int(arg) > 0:
+        return f"last:{int(arg)}"
+    if kind == "decay":
+        try:
+            d = float(arg)
+        except ValueError:
+            d = None
+        if d is not None and 0.0 < d < 1.0:
+            return f"decay:{d:g}"
+    raise ValueError(f"form must be all, last:N (N >= 1) or decay:D (0 < D < 1), got {value!r}")
+
+def form_expr(spec):
+    # SQL for the pre-match win rate over window w (NULL before a player's first match)
+    spec = parse_form(spec)
+    if spec == FORM_ALL:
+        return "SUM(won) OVER w / NULLIF(COUNT(*) OVER w, 0)"
+    kind, arg = spec.split(":")
+    if kind == "last":
+        last_n = f"(PARTITION BY player_id ORDER BY date, match_id ROWS BETWEEN {int(arg)} PRECEDING AND 1 PRECEDING)"
+        return f"SUM(won) OVER {last_n} / NULLIF(COUNT(*) OVER {last_n}, 0)"
+    # sum_j won_j d^(i-j) / sum_j d^(i-j): the d^i factor cancels, so each row carries
+    # d^(c-j) with c the middle of the player's career to keep the powers in range. Exact
+    # while a career is shorter than 2 * MAX_EXP / |ln d| matches (~13k at d=0.9).
+    log_d = math.log(float(arg))
+    weight = f"exp(least(greatest(({log_d!r}) * (career_mid - rn), -{MAX_EXP}), {MAX_EXP}))"
+    return f"SUM(won * {weight}) OVER w / NULLIF(SUM({weight}) OVER w, 0)"
+
+FEATURE_SQL = '''
+WITH done AS (
+    SELECT match_id, date, p1_id, p2_id, (winner_id = p1_id)::DOUBLE AS win1
+    FROM matches
+    WHERE winner_id IS NOT NULL AND p1_id IS NOT NULL AND p2_id IS NOT NULL
+), batch AS (
+    -- matches to write rows for: everything, or those after the (date, match_id) watermark
+    SELECT * FROM done WHERE $since_date IS NULL OR date > $since_date OR (date = $since_date AND match_id > $since_id)
+), appearances AS (
+    SELECT match_id, date, p1_id AS player_id, win1 AS won, 1 AS side FROM done
+    WHERE $since_date IS NULL OR p1_id IN (SELECT p1_id FROM batch UNION SELECT p2_id FROM batch)
+    UNION ALL
+    SELECT match_id, date, p2_id, 1.0 - win1, 2 FROM done
+    WHERE $since_date IS NULL OR p2_id IN (SELECT p1_id FROM batch UNION SELECT p2_id FROM batch)
+), ranked AS (
+    SELECT *,
+        row_number() OVER (PARTITION BY player_id ORDER BY date, match_id) AS rn,
+        (count(*) OVER (PARTITION BY player_id) + 1) / 2.0 AS career_mid
+    FROM appearances
+), player_rows AS (
+    SELECT match_id, side,
+        {form} AS form,
+        date - lag(date) OVER (PARTITION BY player_id ORDER BY date, match_id) AS days_since
+    FROM ranked
+    WINDOW w AS (PARTITION BY player_id ORDER BY date, match_id ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING)
+), pairs AS (
+    SELECT match_id, date, least(p1_id, p2_id) AS lo_id, greatest(p1_id, p2_id) AS hi_id,
+        p1_id <= p2_id AS p1_lo,
+        CASE WHEN p1_id <= p2_id THEN win1 ELSE 1.0 - win1 END AS lo_won
+    FROM done
+    WHERE $since_date IS NULL OR (least(p1_id, p2_id), greatest(p1_id, p2_id)) IN (SELECT (least(p1_id, p2_id), greatest(p1_id, p2_id)) FROM batch)
+), pair_rows AS (
+    SELECT match_id, p1_lo,
+        SUM(lo_won) OVER w / NULLIF(COUNT(*) OVER w, 0) AS lo_rate
+    FROM pairs
+    WINDOW w AS (PARTITION BY lo_id, hi_id ORDER BY date, match_id ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING)
+)
+SELECT b.match_id,
+    coalesce(CASE WHEN h.p1_lo THEN h.lo_rate ELSE 1.0 - h.lo_rate END, 0.5) AS h2h_p1,
+    coalesce(f1.form, 0.5) AS form_p1,
+    coalesce(f2.form, 0.5) AS form_p2,
+    coalesce(f1.days_since, {rest})::BIGINT AS days_since_p1,
+    coalesce(f2.days_since, {rest})::BIGINT AS days_since_p2
+FROM batch b
+JOIN player_rows f1 ON f1.match_id = b.match_id AND f1.side = 1
+JOIN player_rows f2 ON f2.match_id = b.match_id AND f2.side = 2
+JOIN pair_rows h ON h.match_id = b.match_id
+'''
+
+def running_form(won, player, spec=FORM_ALL):
+    # NumPy twin of form_expr for event arrays sorted by (player, match order): the form
+    # *after* each event, i.e. what the player's next match sees (used by the as-of store)
+    spec = parse_form(spec)
+    won = np.asarray(won, dtype=float)
+    groups = pd.Series(won).groupby(np.asarray(player))
+    if spec == FORM_ALL:
+        return groups.cumsum().to_numpy() / (groups.cumcount().to_numpy(dtype=float) + 1.0)
+    kind, arg = spec.split(":")
+    if kind == "last":
+        return groups.rolling(int(arg), min_periods=1).mean().to_numpy()
+    rn = groups.cumcount().to_numpy(dtype=float) + 1.0
+    mid = (groups.transform("size").to_numpy(dtype=float) + 1.0) / 2.0
+    w = np.exp(np.clip(math.log(float(arg)) * (mid - rn), -MAX_EXP, MAX_EXP))
+    return pd.Series(won * w).groupby(np.asarray(player)).cumsum().to_numpy() / pd.Series(w).groupby(np.asarray(player)).cumsum().to_numpy()
+
+def feature_sql(form=FORM_ALL):
+    return FEATURE_SQL.format(form=form_expr(form), rest=DEFAULT_REST_DAYS)
+
+def _params(since):
+    return {"since_date": since[0] if since else None, "since_id": int(since[1]) if since else None}
+
+def window_features(conn, form=FORM_ALL, since=None):
+    # DataFrame of the SQL features, optionally only for matches after the since=(date, match_id) watermark
+    return conn.execute(feature_sql(form), _params(since)).fetchdf()
+
+# columns each builder takes from SQL; the rest (Elo series, ids, surface, label) come from the engine
+SQL_COLUMNS = {
+    "basic": ["form_p1", "form_p2"],   # basic builds keep the 0.5 h2h placeholder
+    "extended": ["h2h_p1", "form_p1", "form_p2", "days_since_p1", "days_since_p2"],
+}
+
+def insert_features(conn, elo_view, builder, form=FORM_ALL, since=None):
+    # INSERT INTO features: the registered engine frame elo_view with its non-Elo columns
+    # replaced by the window results; returns the row count
+    cols = SQL_COLUMNS[builder]
+    n = conn.execute(f'''
+        INSERT INTO features BY NAME
+        SELECT e.* EXCLUDE ({", ".join(cols)}), {", ".join("s." + c for c in cols)}
+        FROM {elo_view} e JOIN ({feature_sql(form)}) s USING (match_id)
+    ''', _params(since)).fetchone()[0]
+    return n
+
+def check_parity(conn, atol=1e-9):
+    # all-history SQL features against the engine's replay of the same matches
+    from .engine import FeatureEngine, sort_matches
+    matches = conn.execute("SELECT * FROM matches WHERE winner_id IS NOT NULL").fetchdf()
+    wide = FeatureEngine().process(sort_matches(matches))
+    got = window_features(conn).set_index("match_id").loc[wide["match_id"].to_numpy()]
+    ok = True
+    for col, ref in (("form_p1", wide["form_p1"]), ("form_p2", wide["form_p2"]), ("h2h_p1", wide["h2h_rate"]),
+                     ("days_since_p1", wide["days_since_p1"]), ("days_since_p2", wide["days_since_p2"])):
+        diff = float(np.max(np.abs(got[col].to_numpy(dtype=float) - ref.to_numpy(dtype=float)))) if len(ref) else 0.0
+        print(f"{col:14s} max |diff| {diff:.2e}")
+        ok &= diff <= atol
+    print(f"{len(wide)} matches -> {'OK' if ok else 'MISMATCH'}")
+    return ok
+
+if __name__ == "__main__":
+    from ..utils.db import get_conn
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--check", action="store_true", help="compare the all-history SQL features with the engine replay")
+    parser.add_argument("--form", default=FORM_ALL, help="all | last:N | decay:D (with --show)")
+    parser.add_argument("--show", type=int, default=0, metavar="N", help="print the last N rows")
+    args = parser.parse_args()
+    conn = get_conn(readonly=True)
+    if args.show:
+        print(window_features(conn, args.form).sort_values("match_id").tail(args.show).to_string(index=False))
+    ok = check_parity(conn) if args.check else True
+    conn.close()
+    raise SystemExit(0 if ok else 1)
@@ -1,28 +1,163 @@
-import argparse
+import argparse, glob, os, time
 import pandas as pd
 from pathlib import Path
 from ..utils.db import get_conn
 from ..utils.paths import DB_PATH
+from ..utils.profiling import stage, add_profile_args, profiled
 
 DATA_DIR = Path(__file__).parent.parent / "data"
+ARCHIVE_PATTERNS = ("atp_matches_*.csv", "wta_matches_*.csv")
+BATCH_FILES = 8  # files per DuckDB read_csv call; each call reads its files in parallel
 
-def load_sample():
+@stage("load_sample")
+def load_sample(data_dir=DATA_DIR):
+    # players.csv + sample_matches.csv from data_dir (the bundled sample by default)
     conn = get_conn()
-    players = pd.read_csv(DATA_DIR / "players.csv")
-    matches = pd.read_csv(DATA_DIR / "sample_matches.csv", parse_dates=["date"])
-    conn.execute("DELETE FROM players")
-    conn.execute("DELETE FROM matches")
-    conn.execute("DELETE FROM features")
-    conn.execute("DELETE FROM signals")
-    conn.execute("DELETE FROM artifacts")
-    conn.execute("INSERT INTO players SELECT * FROM players_df", {"players_df": players})
-    conn.execute("INSERT INTO matches SELECT * FROM matches_df", {"matches_df": matches})
+    players = pd.read_csv(Path(data_dir) / "players.csv")
+    matches = pd.read_csv(Path(data_dir) / "sample_matches.csv", parse_dates=["date"])
+    # upsert: features, signals and trained models in artifacts are left alone
+    conn.register("players_df", players)
+    conn.register("matches_df", matches)
+    conn.execute("INSERT INTO players SELECT * FROM players_df ON CONFLICT (player_id) DO UPDATE SET name=excluded.name")
+    conn.execute(f"INSERT INTO matches SELECT * FROM matches_df ON CONFLICT (match_id) DO UPDATE SET {_update_set(MATCH_COLUMNS)}")
     conn.close()
     print(f"Loaded {len(players)} players and {len(matches)} matches into {DB_PATH}")
+    return len(matches)
+
+# p1_id/p2_id are left out on conflict: DuckDB turns updates of foreign-key columns into
+# delete+insert, which fails once features reference the match. Both are stable per match.
+MATCH_COLUMNS = ["date","tour","surface","best_of","winner_id","p1_odd","p2_odd"]
+
+def _update_set(cols):
+    return ", ".join(f"{c}=excluded.{c}" for c in cols)
+
+def archive_files(paths):
+    # directories are scanned for the Sackmann file layout; files and globs are taken as given
+    files = []
+    for p in paths:
+        if os.path.isdir(p):
+            for pat in ARCHIVE_PATTERNS:
+                files += glob.glob(os.path.join(p, pat))
+        else:
+            files += glob.glob(p)
+    return sorted(set(files))
+
+# Sackmann files date every match of a tournament with its start date, so within a date matches
+# are numbered by round (qualifying first, round robin before the knockout rounds) and then by
+# match_num as a number: the final has to come after the semifinals in the replay order
+ROUND_ORDER = ["Q1", "Q2", "Q3", "Q4", "ER", "RR", "R128", "R64", "R32", "R16", "QF", "SF", "BR", "F"]
+ROUND_RANK_SQL = "CASE round " + " ".join(f"WHEN '{r}' THEN {i}" for i, r in enumerate(ROUND_ORDER)) + " END"
+
+def _sql_list(files):
+    return "[" + ", ".join("'" + f.replace("'", "''") + "'" for f in files) + "]"
+
+STAGE_SQL = '''
+CREATE OR REPLACE TEMP TABLE ingest_stage AS
+SELECT * FROM (
+    SELECT
+        source, tour,
+        tour || ':' || tourney_id || ':' || match_num AS ext_key,
+        strptime(tourney_date, '%Y%m%d')::DATE AS date,
+        NULLIF(surface, '') AS surface,
+        TRY_CAST(best_of AS INTEGER) AS best_of,
+        {round_rank} AS round_rank,
+        TRY_CAST(match_num AS INTEGER) AS match_no,
+        winner_id AS w_ext, winner_name AS w_name,
+        loser_id AS l_ext, loser_name AS l_name,
+        hash(tour || ':' || tourney_id || ':' || match_num) % 2 = 1 AS swap,
+        row_number() OVER (PARTITION BY source, tour, tourney_id, match_num ORDER BY filename DESC) AS rn
+    FROM (
+        SELECT *,
+            CASE WHEN regexp_matches(filename, 'wta_[^/\\\\]*$') THEN 'wta' ELSE 'atp' END AS source,
+            CASE WHEN regexp_matches(filename, 'chall[^/\\\\]*$') THEN 'Challenger'
+                 WHEN regexp_matches(filename, '(futures|itf)[^/\\\\]*$') THEN 'ITF'
+                 WHEN regexp_matches(filename, 'wta_[^/\\\\]*$') THEN 'WTA'
+                 ELSE 'ATP' END AS tour
+        FROM read_csv({files}, union_by_name=true, filename=true, all_varchar=true, header=true)
+    )
+    WHERE winner_id IS NOT NULL AND loser_id IS NOT NULL AND tourney_date IS NOT NULL
+)
+WHERE rn = 1
+'''
+
+def _ingest_batch(conn, files):
+    conn.execute(STAGE_SQL.format(files=_sql_list(files), round_rank=ROUND_RANK_SQL))
+    n = conn.execute("SELECT count(*) FROM ingest_stage").fetchone()[0]
+    conn.execute("BEGIN TRANSACTION")
+    try:
+        # new external players -> fresh player ids, inserted into players + player_map in bulk
+        conn.execute('''
+            CREATE OR REPLACE TEMP TABLE ingest_new_players AS
+            WITH ext AS (
+                SELECT source, w_ext AS ext_id, any_value(w_name) AS name FROM ingest_stage GROUP BY ALL
+                UNION ALL
+                SELECT source, l_ext, any_value(l_name) FROM ingest_stage GROUP BY ALL
+            ), uniq AS (
+                SELECT source, ext_id, any_value(name) AS name FROM ext GROUP BY ALL
+            )
+            SELECT u.source, u.ext_id, u.name,
+                   (SELECT greatest(coalesce(max(player_id), 0), (SELECT coalesce(max(player_id), 0) FROM player_map)) FROM players)
+                   + row_number() OVER (ORDER BY u.source, u.ext_id) AS player_id
+            FROM uniq u ANTI JOIN player_map pm ON pm.source = u.source AND pm.ext_id = u.ext_id
+        ''')
+        conn.execute("INSERT INTO players SELECT player_id, name FROM ingest_new_players")
+        conn.execute("INSERT INTO player_map SELECT source, ext_id, player_id FROM ingest_new_players")
+        # new external matches -> fresh match ids in date, round and match number order
+        conn.execute('''
+            INSERT INTO match_map
+            SELECT s.source, s.ext_key,
+                   (SELECT greatest(coalesce(max(match_id), 0), (SELECT coalesce(max(match_id), 0) FROM match_map)) FROM matches)
+                   + row_number() OVER (ORDER BY s.date, s.round_rank NULLS FIRST, s.match_no NULLS FIRST, s.ext_key)
+            FROM ingest_stage s ANTI JOIN match_map mm ON mm.source = s.source AND mm.ext_key = s.ext_key
+        ''')
+        # upsert on match_id; p1/p2 order is a stable hash of the match key so p1 is not always the winner
+        conn.execute(f'''
+            INSERT INTO matches (match_id, date, tour, surface, best_of, p1_id, p2_id, winner_id)
+            SELECT mm.match_id, s.date, s.tour, s.surface, s.best_of,
+                   CASE WHEN s.swap THEN l.player_id ELSE w.player_id END,
+                   CASE WHEN s.swap THEN w.player_id ELSE l.player_id END,
+                   w.player_id
+            FROM ingest_stage s
+            JOIN match_map mm ON mm.source = s.source AND mm.ext_key = s.ext_key
+            JOIN player_map w ON w.source = s.source AND w.ext_id = s.w_ext
+            JOIN player_map l ON l.source = s.source AND l.ext_id = s.l_ext
+            ON CONFLICT (match_id) DO UPDATE SET {_update_set(["date","tour","surface","best_of","winner_id"])}
+        ''')
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return n
+
+@stage("load_archive")
+def load_archive(paths, batch_files=BATCH_FILES):
+    files = archive_files(paths)
+    if not files:
+        print("No archive files found.")
+        return 0
+    conn = get_conn()
+    total, t0 = 0, time.perf_counter()
+    for i in range(0, len(files), batch_files):
+        batch = files[i:i + batch_files]
+        t = time.perf_counter()
+        n = _ingest_batch(conn, batch)
+        total += n
+        dt = time.perf_counter() - t
+        print(f"[{min(i + batch_files, len(files))}/{len(files)} files] {n} rows in {dt:.2f}s ({n / max(dt, 1e-9):,.0f} rows/s)")
+    conn.close()
+    dt = time.perf_counter() - t0
+    print(f"Ingested {total} matches from {len(files)} files into {DB_PATH} in {dt:.2f}s ({total / max(dt, 1e-9):,.0f} rows/s)")
+    return total
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--load-sample", action="store_true")
+    parser.add_argument("--archive", nargs="+", metavar="PATH", help="directories, files or globs of atp_/wta_matches_YYYY.csv")
+    parser.add_argument("--batch-files", type=int, default=BATCH_FILES)
+    add_profile_args(parser)
     args = parser.parse_args()
-    if args.load_sample:
-        load_sample()
+    with profiled(args.profile):
+        if args.load_sample:
+            load_sample()
+        if args.archive:
+            load_archive(args.archive, args.batch_files)
@@ -0,0 +1,185 @@
+import argparse, hashlib, io, json, os, time, zlib
+from datetime import datetime
+from pathlib import Path
+import joblib
+from ..utils.paths import ARTIFACTS_DIR
+from ..utils.profiling import stage
+
+# Versioned model artifacts.
+# Every save appends an immutable row to artifact_versions (sha256 of the serialized bytes,
+# fingerprint of the feature list, codec, sizes) and then moves the artifacts.<name>
+# pointer to it, so rollback is a one-row update. Pickles are stored zlib-compressed.
+# Loaders keep an uncompressed joblib copy per content hash under ARTIFACT_CACHE_DIR and
+# open it with mmap_mode="r": the model's NumPy arrays sit in the page cache once and every
+# API worker maps the same pages instead of decompressing and unpickling its own copy.
+# Rows written before versioning (blob inline in artifacts, plain joblib) still load.
+
+ARTIFACT_CACHE_DIR = Path(os.getenv("ARTIFACT_CACHE_DIR", str(ARTIFACTS_DIR / "cache"))).resolve()
+ARTIFACT_MMAP = os.getenv("ARTIFACT_MMAP", "1") != "0"
+CODEC_JOBLIB = "joblib"            # legacy: plain pickle
+CODEC_JOBLIB_ZLIB = "joblib+zlib"
+CODEC_NPZ = "npz"                  # compiled model (CompiledModel.to_bytes, already compressed)
+ZLIB_LEVEL = 6
+
+POINTER_SQL = '''
+    SELECT a.created_at, a.meta, a.version, v.content_hash, COALESCE(v.codec, 'joblib')
+    FROM artifacts a LEFT JOIN artifact_versions v ON v.name = a.name AND v.version = a.version
+    WHERE a.name = ?
+'''
+
+def feature_fingerprint(features):
+    return hashlib.sha256(json.dumps(list(features)).encode()).hexdigest()[:16]
+
+def encode(obj):
+    # -> (raw bytes, stored bytes)
+    buf = io.BytesIO()
+    joblib.dump(obj, buf)
+    raw = buf.getvalue()
+    return raw, zlib.compress(raw, ZLIB_LEVEL)
+
+def decode(codec, blob):
+    if codec == CODEC_NPZ:
+        from .compiled import CompiledModel
+        return CompiledModel.from_bytes(blob)
+    if codec == CODEC_JOBLIB_ZLIB:
+        blob = zlib.decompress(blob)
+    return joblib.load(io.BytesIO(blob))
+
+def save_artifact(conn, name, meta, created_at=None, obj=None, raw=None, codec=CODEC_JOBLIB_ZLIB):
+    # pass obj (pickled here) or raw bytes already in `codec`; returns the new version number
+    created_at = created_at or datetime.utcnow()
+    if obj is not None:
+        raw, stored = encode(obj)
+    else:
+        stored = raw
+    version = conn.execute("SELECT COALESCE(MAX(version), 0) + 1 FROM artifact_versions WHERE name=?", [name]).fetchone()[0]
+    conn.execute('''
+        INSERT INTO artifact_versions (name, version, created_at, content_hash, feature_fingerprint, codec, raw_bytes, stored_bytes, meta, blob)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', [name, version, created_at, hashlib.sha256(raw).hexdigest(), feature_fingerprint(meta.get("features", [])),
+          codec, len(raw), len(stored), json.dumps(meta), stored])
+    # the pointer moves last: a crash in between only leaves an unreferenced version
+    conn.execute("INSERT OR REPLACE INTO artifacts (name, created_at, meta, blob, version) VALUES (?, ?, ?, NULL, ?)",
+                 [name, created_at, json.dumps(meta), version])
+    return version
+
+@stage("publish_model")
+def publish_model(conn, model, meta, created_at=None, name="model_latest", compile=False, X_check=None):
+    # new version of the model (and of its compiled copy) in one transaction
+    from .compiled import export_compiled
+    created_at = created_at or datetime.utcnow()
+    conn.execute("BEGIN TRANSACTION")
+    try:
+        version = save_artifact(conn, name, meta, created_at, obj=model)
+        if compile:
+            export_compiled(conn, model, meta, created_at, name, X=X_check)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return version
+
+def pointer(conn, name):
+    # current version of name without its blob, or None
+    row = conn.execute(POINTER_SQL, [name]).fetchone()
+    if not row:
+        return None
+    return dict(zip(["created_at", "meta", "version", "content_hash", "codec"], row))
+
+def fetch_blob(conn, name):
+    return conn.execute('''
+        SELECT COALESCE(v.blob, a.blob) FROM artifacts a
+        LEFT JOIN artifact_versions v ON v.name = a.name AND v.version = a.version WHERE a.name = ?
+    ''', [name]).fetchone()[0]
+
+def cache_path(content_hash):
+    return ARTIFACT_CACHE_DIR / f"{content_hash[:32]}.joblib"
+
+def _cache_payload(codec, obj):
+    # compiled models are cached as their arrays so any process can rebuild them with its own numba setting
+    if codec == CODEC_NPZ:
+        return {"arrays": obj.arrays, "calibrators": obj.calibrators, "response": obj.response, "features": obj.features}
+    return obj
+
+def _from_cache(codec, payload):
+    if codec == CODEC_NPZ:
+        from .compiled import CompiledModel
+        return CompiledModel(**payload)
+    return payload
+
+def load_artifact(conn, name, created_at=None, mmap=ARTIFACT_MMAP):
+    # -> (obj, meta, created_at); (None, None, None) if missing or not stamped with created_at
+    ptr = pointer(conn, name)
+    if ptr is None or (created_at is not None and ptr["created_at"] != created_at):
+        return None, None, None
+    meta = json.loads(ptr["meta"]) if ptr["meta"] else {}
+    codec, digest = ptr["codec"], ptr["content_hash"]
+    if not mmap or digest is None:
+        return decode(codec, fetch_blob(conn, name)), meta, ptr["created_at"]
+    path = cache_path(digest)
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        joblib.dump(_cache_payload(codec, decode(codec, fetch_blob(conn, name))), tmp)
+        os.replace(tmp, path)
+    return _from_cache(codec, joblib.load(path, mmap_mode="r")), meta, ptr["created_at"]
+
+def versions(conn, name):
+    return conn.execute('''
+        SELECT v.version, v.created_at, v.content_hash, v.feature_fingerprint, v.codec, v.raw_bytes, v.stored_bytes,
+               v.version = a.version AS current
+        FROM artifact_versions v LEFT JOIN artifacts a ON a.name = v.name
+        WHERE v.name = ? ORDER BY v.version
+    ''', [name]).fetchdf()
+
+def rollback(conn, name, version):
+    # re-point name at an older version; its compiled copy follows if one was stamped with the same created_at
+    from .compiled import COMPILED_SUFFIX
+    row = conn.execute("SELECT created_at, meta FROM artifact_versions WHERE name=? AND version=?", [name, version]).fetchone()
+    if not row:
+        raise ValueError(f"{name} has no version {version}")
+    conn.execute("BEGIN TRANSACTION")
+    try:
+        conn.execute("INSERT OR REPLACE INTO artifacts (name, created_at, meta, blob, version) VALUES (?, ?, ?, NULL, ?)",
+                     [name, row[0], row[1], version])
+        compiled = conn.execute("SELECT version, meta FROM artifact_versions WHERE name=? AND created_at=? ORDER BY version DESC LIMIT 1",
+                                [name + COMPILED_SUFFIX, row[0]]).fetchone()
+        if compiled:
+            conn.execute("INSERT OR REPLACE INTO artifacts (name, created_at, meta, blob, version) VALUES (?, ?, ?, NULL, ?)",
+                         [name + COMPILED_SUFFIX, row[0], compiled[1], compiled[0]])
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return row[0]
+
+def prune_cache(conn):
+    # drop cached copies no stored version refers to any more
+    keep = {cache_path(r[0]).name for r in conn.execute("SELECT content_hash FROM artifact_versions").fetchall()}
+    removed = 0
+    for p in ARTIFACT_CACHE_DIR.glob("*.joblib"):
+        if p.name not in keep:
+            p.unlink(); removed += 1
+    return removed
+
+if __name__ == "__main__":
+    from ..utils.db import get_conn
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--name", default="model_latest")
+    parser.add_argument("--list", action="store_true", help="show stored versions")
+    parser.add_argument("--rollback", type=int, metavar="VERSION", help="point --name back at VERSION")
+    parser.add_argument("--load", action="store_true", help="time a load of the current version")
+    parser.add_argument("--prune-cache", action="store_true")
+    args = parser.parse_args()
+    conn = get_conn()
+    if args.rollback is not None:
+        print(f"{args.name} -> version {args.rollback} (created_at {rollback(conn, args.name, args.rollback)})")
+    if args.list:
+        print(versions(conn, args.name).to_string(index=False))
+    if args.load:
+        t0 = time.perf_counter()
+        obj, meta, created_at = load_artifact(conn, args.name)
+        print(f"loaded {type(obj).__name__} ({created_at}) in {1000 * (time.perf_counter() - t0):.1f} ms")
+    if args.prune_cache:
+        print(f"removed {prune_cache(conn)} cached files")
+    conn.close()
@@ -0,0 +1,283 @@
+import argparse, bisect, io, json, math
+import numpy as np
+from .artifacts import save_artifact, load_artifact, CODEC_NPZ
+
+try:
+    from numba import njit
+except ImportError:  # optional: batches fall back to a NumPy walk, single rows to plain Python
+    njit = None
+
+# Compiled form of the calibrated LightGBM model for serving.
+# export_compiled() parses LightGBM's native model string into flat node arrays (split
+# feature, threshold, children, missing-value handling, leaf values) and copies the
+# isotonic calibration table; CompiledModel scores raw NumPy rows with them. Scoring
+# needs neither sklearn, pandas nor lightgbm, so the registry can serve it without
+# unpickling the CalibratedClassifierCV at all.
+
+FORMAT = "lgbm-trees-v1"
+COMPILED_SUFFIX = "_compiled"
+PARITY_TOL = 1e-6
+K_ZERO = 1e-35          # LightGBM's kZeroThreshold
+MISSING_ZERO, MISSING_NAN = 1, 2
+
+def _ints(v):
+    return [int(x) for x in v.split()] if v else []
+
+def _floats(v):
+    return [float(x) for x in v.split()] if v else []
+
+def parse_model_string(text):
+    # LightGBM text model -> flattened arrays; child < 0 means leaf ~child in the same tree
+    header, trees, cur = {}, [], None
+    for line in text.splitlines():
+        if line.startswith("Tree="):
+            cur = {}; trees.append(cur)
+            continue
+        if line.startswith("end of trees"):
+            break
+        if "=" in line:
+            k, v = line.split("=", 1)
+            (header if cur is None else cur)[k] = v
+    objective = header.get("objective", "").split()
+    if not objective or objective[0] != "binary" or int(header.get("num_tree_per_iteration", 1)) != 1:
+        raise ValueError(f"only binary LightGBM models can be compiled (objective={header.get('objective')!r})")
+    sigmoid = next((float(o.split(":")[1]) for o in objective[1:] if o.startswith("sigmoid:")), 1.0)
+    roots, feat, thr, left, right, dleft, missing, leaves = [], [], [], [], [], [], [], []
+    for t in trees:
+        leaf_off, node_off = len(leaves), len(feat)
+        leaves += _floats(t["leaf_value"])
+        if int(t["num_leaves"]) == 1:
+            roots.append(-(leaf_off + 1))
+            continue
+        if int(t.get("num_cat", 0)) > 0:
+            raise ValueError("categorical splits are not supported")
+        dt = _ints(t["decision_type"])
+        child = lambda c: node_off + c if c >= 0 else -(leaf_off + ~c + 1)
+        roots.append(node_off)
+        feat += _ints(t["split_feature"])
+        thr += _floats(t["threshold"])
+        left += [child(c) for c in _ints(t["left_child"])]
+        right += [child(c) for c in _ints(t["right_child"])]
+        dleft += [(d >> 1) & 1 for d in dt]
+        missing += [(d >> 2) & 3 for d in dt]
+    return {
+        "roots": np.array(roots, dtype=np.int32), "feature": np.array(feat, dtype=np.int32),
+        "threshold": np.array(thr, dtype=np.float64), "left": np.array(left, dtype=np.int32),
+        "right": np.array(right, dtype=np.int32), "default_left": np.array(dleft, dtype=np.uint8),
+        "missing": np.array(missing, dtype=np.uint8), "leaf_value": np.array(leaves, dtype=np.float64),
+        "sigmoid": np.array([sigmoid]), "feature_names": header.get("feature_names", "").split(),
+    }
+
+def _raw_scores(X, roots, feature, threshold, left, right, default_left, missing, leaf_value, out):
+    # LightGBM's NumericalDecision, one row and one tree at a time
+    for i in range(X.shape[0]):
+        s = 0.0
+        for t in range(roots.shape[0]):
+            node = roots[t]
+            while node >= 0:
+                v = X[i, feature[node]]
+                mt = missing[node]
+                if v != v and mt != MISSING_NAN:
+                    v = 0.0
+                if (mt == MISSING_ZERO and -K_ZERO <= v <= K_ZERO) or (mt == MISSING_NAN and v != v):
+                    node = left[node] if default_left[node] else right[node]
+                elif v <= threshold[node]:
+                    node = left[node]
+                else:
+                    node = right[node]
+            s += leaf_value[-node - 1]
+        out[i] = s
+
+_raw_scores_jit = njit(cache=True)(_raw_scores) if njit is not None else None
+
+def _raw_scores_numpy(X, roots, feature, threshold, left, right, default_left, missing, leaf_value):
+    # same walk, vectorized over rows; trees are still summed in order
+    n = X.shape[0]
+    out = np.zeros(n)
+    rows = np.arange(n)
+    for root in roots:
+        node = np.full(n, root, dtype=np.int64)
+        active = node >= 0
+        while active.any():
+            idx, r = node[active], rows[active]
+            v = X[r, feature[idx]]
+            mt = missing[idx]
+            v = np.where(np.isnan(v) & (mt != MISSING_NAN), 0.0, v)
+            use_default = ((mt == MISSING_ZERO) & (np.abs(v) <= K_ZERO)) | ((mt == MISSING_NAN) & np.isnan(v))
+            go_left = np.where(use_default, default_left[idx] == 1, v <= threshold[idx])
+            node[active] = np.where(go_left, left[idx], right[idx])
+            active = node >= 0
+        out += leaf_value[-node - 1]
+    return out
+
+class CompiledModel:
+    # drop-in for the calibrated model's predict_proba, plus a fast single-row path
+    compiled = True
+
+    def __init__(self, arrays, calibrators, response="decision_function", features=None, use_numba=None):
+        self.arrays = arrays
+        self.calibrators = calibrators            # [(x_thresholds, y_thresholds)], averaged like sklearn's ensemble
+        self.response = response                  # what the calibrators were fitted on
+        self.features = features or arrays["feature_names"]
+        self.sigmoid = float(arrays["sigmoid"][0])
+        self.use_numba = (_raw_scores_jit is not None) if use_numba is None else (use_numba and _raw_scores_jit is not None)
+        self._tree_args = [arrays[k] for k in ("roots","feature","threshold","left","right","default_left","missing","leaf_value")]
+        self._calib_lists = [(x.tolist(), y.tolist()) for x, y in calibrators]
+        if not self.use_numba:
+            self._tree_lists = [a.tolist() for a in self._tree_args]
+
+    def raw_score(self, X):
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X[None, :]
+        if self.use_numba:
+            out = np.empty(X.shape[0])
+            _raw_scores_jit(X, *self._tree_args, out)
+            return out
+        return _raw_scores_numpy(X, *self._tree_args)
+
+    def _calibrate(self, raw):
+        if not self.calibrators:
+            return 1.0 / (1.0 + np.exp(-self.sigmoid * raw))
+        score = raw if self.response == "decision_function" else 1.0 / (1.0 + np.exp(-self.sigmoid * raw))
+        # isotonic with out_of_bounds="clip": np.interp holds the end values outside the table
+        return np.mean([np.interp(score, x, y) for x, y in self.calibrators], axis=0)
+
+    def predict_p1(self, X):
+        p = self._calibrate(self.raw_score(X))
+        return np.where((p > 1.0) & (p <= 1.0 + 1e-5), 1.0, p)
+
+    def predict_proba(self, X):
+        p = self.predict_p1(X)
+        return np.column_stack([1.0 - p, p])
+
+    def predict_one(self, row):
+        # one feature row (sequence of floats in self.features order) -> P(p1 wins)
+        if self.use_numba:
+            out = np.empty(1)
+            _raw_scores_jit(np.asarray(row, dtype=np.float64).reshape(1, -1), *self._tree_args, out)
+            raw = float(out[0])
+        else:
+            raw = _walk_one(row, *self._tree_lists)
+        if not self._calib_lists:
+            return 1.0 / (1.0 + math.exp(-self.sigmoid * raw))
+        score = raw if self.response == "decision_function" else 1.0 / (1.0 + math.exp(-self.sigmoid * raw))
+        p = sum(_interp_one(score, x, y) for x, y in self._calib_lists) / len(self._calib_lists)
+        return 1.0 if 1.0 < p <= 1.0 + 1e-5 else p
+
+    def warmup(self):
+        # triggers the numba compile (or cache load) up front instead of on the first request
+        self.predict_one([0.0] * len(self.features))
+        return self
+
+    def to_bytes(self):
+        buf = io.BytesIO()
+        arrays = {k: v for k, v in self.arrays.items() if k != "feature_names"}
+        for i, (x, y) in enumerate(self.calibrators):
+            arrays[f"calib_x_{i}"] = x; arrays[f"calib_y_{i}"] = y
+        header = json.dumps({"format": FORMAT, "response": self.response, "features": list(self.features),
+                             "calibrators": len(self.calibrators)})
+        np.savez_compressed(buf, header=np.frombuffer(header.encode(), dtype=np.uint8), **arrays)
+        return buf.getvalue()
+
+    @classmethod
+    def from_bytes(cls, blob, use_numba=None):
+        with np.load(io.BytesIO(blob)) as z:
+            header = json.loads(z["header"].tobytes().decode())
+            if header["format"] != FORMAT:
+                raise ValueError(f"unsupported compiled model format {header['format']!r}")
+            arrays = {k: z[k] for k in z.files if k != "header" and not k.startswith("calib_")}
+            calibrators = [(z[f"calib_x_{i}"], z[f"calib_y_{i}"]) for i in range(header["calibrators"])]
+        arrays["feature_names"] = header["features"]
+        return cls(arrays, calibrators, header["response"], header["features"], use_numba)
+
+def _walk_one(row, roots, feature, threshold, left, right, default_left, missing, leaf_value):
+    x = [float(v) for v in row]
+    s = 0.0
+    for node in roots:
+        while node >= 0:
+            v = x[feature[node]]
+            mt = missing[node]
+            if v != v and mt != MISSING_NAN:
+                v = 0.0
+            if (mt == MISSING_ZERO and -K_ZERO <= v <= K_ZERO) or (mt == MISSING_NAN and v != v):
+                node = left[node] if default_left[node] else right[node]
+            elif v <= threshold[node]:
+                node = left[node]
+            else:
+                node = right[node]
+        s += leaf_value[-node - 1]
+    return s
+
+def _interp_one(v, xs, ys):
+    if v <= xs[0]:
+        return ys[0]
+    if v >= xs[-1]:
+        return ys[-1]
+    j = bisect.bisect_right(xs, v)
+    x0, x1 = xs[j - 1], xs[j]
+    return ys[j - 1] + (ys[j] - ys[j - 1]) * (v - x0) / (x1 - x0)
+
+def compile_model(model, features):
+    # CalibratedClassifierCV(FrozenEstimator(LGBMClassifier)) or a bare LGBMClassifier
+    calibrated = getattr(model, "calibrated_classifiers_", None)
+    if calibrated:
+        base = calibrated[0].estimator
+        calibrators = []
+        for cc in calibrated:
+            if getattr(cc, "method", "isotonic") != "isotonic":
+                raise ValueError(f"only isotonic calibration can be compiled (got {cc.method!r})")
+            iso = cc.calibrators[0]
+            calibrators.append((np.asarray(iso.X_thresholds_, dtype=float), np.asarray(iso.y_thresholds_, dtype=float)))
+        response = "decision_function" if hasattr(base, "decision_function") else "predict_proba"
+    else:
+        base, calibrators, response = model, [], "predict_proba"
+    base = getattr(base, "estimator", base)          # unwrap FrozenEstimator
+    booster = getattr(base, "booster_", None)
+    if booster is None:
+        raise ValueError(f"not a LightGBM model: {type(base).__name__}")
+    best = getattr(base, "best_iteration_", None) or None
+    arrays = parse_model_string(booster.model_to_string(num_iteration=best))
+    if arrays["feature_names"] and list(arrays["feature_names"]) != list(features):
+        raise ValueError(f"model was trained on {arrays['feature_names']}, artifact lists {features}")
+    return CompiledModel(arrays, calibrators, response, list(features))
+
+def check_parity(model, compiled, X, tol=PARITY_TOL):
+    import pandas as pd
+    ref = model.predict_proba(pd.DataFrame(X, columns=compiled.features))[:, 1]
+    got = compiled.predict_p1(X)
+    one = np.array([compiled.predict_one(r) for r in X[:1000]])
+    diff = max(float(np.max(np.abs(ref - got))), float(np.max(np.abs(ref[:1000] - one))))
+    print(f"compiled vs pickled: {len(X)} rows, max |dp|={diff:.2e} ({'OK' if diff <= tol else 'MISMATCH'})")
+    return diff <= tol
+
+def export_compiled(conn, model, meta, created_at, name="model_latest", X=None):
+    # stores <name>_compiled next to the pickle, stamped with the same created_at
+    compiled = compile_model(model, meta["features"])
+    if X is not None and len(X) and not check_parity(model, compiled, X):
+        raise RuntimeError("compiled model does not match the pickled model; not exported")
+    save_artifact(conn, name + COMPILED_SUFFIX, {"format": FORMAT, "source": name, "features": meta["features"]},
+                  created_at, raw=compiled.to_bytes(), codec=CODEC_NPZ)
+    return compiled
+
+if __name__ == "__main__":
+    from ..utils.db import get_conn
+    from .dataset import load_xy
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--export", action="store_true", help="compile model_latest and store it next to the pickle")
+    parser.add_argument("--check", action="store_true", help="compare compiled and pickled predictions on the features table")
+    parser.add_argument("--rows", type=int, default=20000, help="feature rows used for the parity check")
+    args = parser.parse_args()
+    conn = get_conn()
+    model, meta, created_at = load_artifact(conn, "model_latest", mmap=False)
+    if model is None:
+        print("No model found. Train a model first.")
+    else:
+        _, X, _ = load_xy(conn, meta["features"], label=False)
+        X = X[-args.rows:].astype(np.float64)
+        if args.export:
+            export_compiled(conn, model, meta, created_at, X=X)
+            print("Compiled model stored as model_latest" + COMPILED_SUFFIX)
+        elif args.check:
+            check_parity(model, compile_model(model, meta["features"]), X)
+    conn.close()
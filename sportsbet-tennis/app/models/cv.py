@@ -0,0 +1,195 @@
+import argparse, importlib.util, os, time
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.linear_model import LogisticRegression
+from sklearn.calibration import CalibratedClassifierCV
+from sklearn.frozen import FrozenEstimator
+from sklearn.metrics import roc_auc_score, brier_score_loss, log_loss, accuracy_score
+from ..utils.db import get_conn
+from ..utils.shm import publish, attach, release
+from ..utils.profiling import stage, set_rows, add_profile_args, profiled
+from .dataset import load_xy, feature_problem, check_features
+from .artifacts import publish_model
+
+# Training orchestrator: rolling-origin time-series CV across model kinds, in parallel.
+# The feature matrix (union of every model's columns) is read once and published to the
+# workers as shared memory; a fold is just a (train_end, test_end) row range into it, so
+# no fold dataset is ever rebuilt or pickled. Every (model, fold) pair is one task. Only
+# models whose columns the current features build fills are candidates (logreg takes the
+# basic builder's, lgbm/xgb the extended one's), so the candidates compared always share
+# one build. The model with the lowest mean fold log loss is refit on all rows and promoted to
+# model_latest (plus its compiled copy for LightGBM) in a single transaction; fold
+# metrics and timings of all candidates go into its artifacts.meta.
+
+MODELS = ("logreg", "lgbm", "xgb")
+MODEL_FEATURES = {
+    "logreg": ["elo_diff", "h2h_p1", "form_p1", "form_p2"],
+    "lgbm": ["elo_diff_surface","elo_diff_global","h2h_p1","form_p1","form_p2","days_since_p1","days_since_p2","serve_p1","serve_p2"],
+    "xgb": ["elo_diff_surface","elo_diff_global","h2h_p1","form_p1","form_p2","days_since_p1","days_since_p2","serve_p1","serve_p2"],
+}
+OPTIONAL_MODULES = {"lgbm": "lightgbm", "xgb": "xgboost"}
+VALID_FRAC = 0.2   # tail of a training window used for early stopping + isotonic calibration
+
+_shared = {}   # name -> ndarray; views onto the shared blocks inside workers
+
+def available(kind):
+    mod = OPTIONAL_MODULES.get(kind)
+    return mod is None or importlib.util.find_spec(mod) is not None
+
+def rolling_origin_folds(n, n_folds=5, min_train_frac=0.5):
+    # [(train_end, test_end)]: fold k trains on rows [0, train_end) and tests on [train_end, test_end)
+    edges = np.linspace(int(n * min_train_frac), n, n_folds + 1).astype(int)
+    return [(int(a), int(b)) for a, b in zip(edges[:-1], edges[1:]) if a > 0 and b > a]
+
+def classification_metrics(y, proba):
+    return {
+        "roc_auc": float(roc_auc_score(y, proba)) if len(set(y))>1 else None,
+        "brier": float(brier_score_loss(y, proba)),
+        "log_loss": float(log_loss(y, proba, labels=[0, 1])),
+        "accuracy": float(accuracy_score(y, (proba>0.5).astype(int))),
+    }
+
+def mean_metrics(folds):
+    keys = folds[0].keys() if folds else []
+    out = {}
+    for k in keys:
+        vals = [f[k] for f in folds if f[k] is not None]
+        out[k] = float(np.mean(vals)) if vals else None
+    return out
+
+def fit_model(kind, X, y, n_jobs=1):
+    # X: DataFrame with the model's columns, rows in time order
+    if kind == "logreg":
+        return LogisticRegression(max_iter=200).fit(X, y)
+    split = int(len(y) * (1 - VALID_FRAC))
+    X_fit, X_val, y_fit, y_val = X.iloc[:split], X.iloc[split:], y[:split], y[split:]
+    if kind == "lgbm":
+        import lightgbm as lgb
+        base = lgb.LGBMClassifier(objective='binary', n_estimators=1000, learning_rate=0.05, num_leaves=31,
+                                  n_jobs=n_jobs, verbose=-1)
+        base.fit(X_fit, y_fit, eval_set=[(X_val, y_val)], callbacks=[lgb.early_stopping(50, verbose=False)])
+    elif kind == "xgb":
+        from xgboost import XGBClassifier
+        base = XGBClassifier(n_estimators=1000, learning_rate=0.05, max_depth=4, early_stopping_rounds=50,
+                             eval_metric="logloss", n_jobs=n_jobs)
+        base.fit(X_fit, y_fit, eval_set=[(X_val, y_val)], verbose=False)
+    else:
+        raise ValueError(f"unknown model kind: {kind!r}")
+    # isotonic calibration on the held-out tail, like train_lgbm
+    return CalibratedClassifierCV(FrozenEstimator(base), method='isotonic').fit(X_val, y_val)
+
+def _attach(specs, columns):
+    attach(specs, _shared)
+    _shared["columns"] = columns
+
+def _frame(kind, rows):
+    cols = _shared["columns"][kind]
+    return pd.DataFrame(_shared["X"][rows][:, cols], columns=MODEL_FEATURES[kind])
+
+def _fit_fold(kind, fold, train_end, test_end):
+    # one (model, fold) task; returns timings as wall-clock stamps so per-model spans can be merged
+    started = time.time(); t0 = time.perf_counter()
+    y = _shared["y"]
+    model = fit_model(kind, _frame(kind, slice(0, train_end)), y[:train_end])
+    proba = model.predict_proba(_frame(kind, slice(train_end, test_end)))[:, 1]
+    metrics = classification_metrics(y[train_end:test_end], proba)
+    return kind, fold, metrics, time.perf_counter() - t0, started, time.time()
+
+def cross_validate(X, y, kinds, folds, n_jobs=1):
+    # {kind: {"folds": [...], "mean": {...}, "fit_seconds", "wall_seconds"}}
+    union = list(dict.fromkeys(c for k in kinds for c in MODEL_FEATURES[k]))
+    columns = {k: np.array([union.index(c) for c in MODEL_FEATURES[k]]) for k in kinds}
+    tasks = [(k, i, a, b) for k in kinds for i, (a, b) in enumerate(folds)]
+    blocks = []
+    try:
+        if n_jobs == 1:
+            _shared.update(X=X, y=y, columns=columns)
+            results = [_fit_fold(*t) for t in tasks]
+        else:
+            blocks, specs = publish({"X": X, "y": y})
+            with ProcessPoolExecutor(max_workers=n_jobs if n_jobs > 0 else None, initializer=_attach, initargs=(specs, columns)) as ex:
+                results = list(ex.map(_fit_fold, *zip(*tasks)))
+    finally:
+        _shared.clear()
+        release(blocks)
+    out = {}
+    for k in kinds:
+        rows = sorted((r for r in results if r[0] == k), key=lambda r: r[1])
+        fold_rows = [dict(fold=i, train_rows=folds[i][0], test_rows=folds[i][1] - folds[i][0], fit_seconds=s, **m)
+                     for _, i, m, s, _, _ in rows]
+        out[k] = {"folds": fold_rows, "mean": mean_metrics([r[2] for r in rows]),
+                  "fit_seconds": float(sum(r[3] for r in rows)),
+                  "wall_seconds": float(max(r[5] for r in rows) - min(r[4] for r in rows)) if rows else 0.0}
+    return out
+
+@stage("train_cv")
+def train_cv(kinds=MODELS, n_folds=5, min_train_frac=0.5, n_jobs=1, start=None, end=None, surfaces=None, promote_best=True):
+    t_start = time.perf_counter()
+    skipped = [k for k in kinds if not available(k)]
+    kinds = [k for k in kinds if k not in skipped]
+    if skipped:
+        print(f"Skipping {', '.join(skipped)} (not installed).")
+    if not kinds:
+        return None
+    conn = get_conn()
+    problems = {k: feature_problem(conn, MODEL_FEATURES[k]) for k in kinds}
+    for k in kinds:
+        if problems[k]:
+            print(f"Skipping {k}: {problems[k]}")
+    kinds = [k for k in kinds if not problems[k]]
+    if not kinds:
+        conn.close()
+        print("No candidate model uses the columns of the current features build.")
+        return None
+    union = list(dict.fromkeys(c for k in kinds for c in MODEL_FEATURES[k]))
+    _, X, y = load_xy(conn, union, start, end, surfaces)
+    set_rows(len(y))
+    folds = rolling_origin_folds(len(y), n_folds, min_train_frac)
+    if not folds:
+        conn.close()
+        print("Not enough features for time-series CV. Build features first.")
+        return None
+    results = cross_validate(X, y, kinds, folds, n_jobs)
+    cv_seconds = time.perf_counter() - t_start
+    for k in kinds:
+        m = results[k]["mean"]
+        print(f"{k:7s} log_loss={m['log_loss']:.4f} brier={m['brier']:.4f} auc={m['roc_auc']} "
+              f"fit={results[k]['fit_seconds']:.1f}s wall={results[k]['wall_seconds']:.1f}s")
+    best = min(kinds, key=lambda k: results[k]["mean"]["log_loss"])
+    if promote_best:
+        t0 = time.perf_counter()
+        cols = [union.index(c) for c in MODEL_FEATURES[best]]
+        X_best = pd.DataFrame(X[:, cols], columns=MODEL_FEATURES[best])
+        model = fit_model(best, X_best, y, n_jobs=os.cpu_count() or 1)
+        results[best]["refit_seconds"] = time.perf_counter() - t0
+        meta = {"features": MODEL_FEATURES[best], "metrics": results[best]["mean"], "model": best,
+                "cv": {"folds": len(folds), "min_train_frac": min_train_frac, "rows": len(y), "n_jobs": n_jobs,
+                       "seconds": cv_seconds, "models": results}}
+        X_check = X_best.to_numpy(dtype=np.float64)[folds[-1][0]:]
+        # model_latest (and the compiled copy for LightGBM) replaced together or not at all
+        check_features(conn, MODEL_FEATURES[best])   # the table may have been rebuilt meanwhile
+        version = publish_model(conn, model, meta, datetime.utcnow(), compile=best == "lgbm", X_check=X_check)
+        print(f"Promoted {best} to model_latest (version {version}).")
+    conn.close()
+    return best, results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--models", default=",".join(MODELS), help=f"comma list of {', '.join(MODELS)}")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--min-train-frac", type=float, default=0.5, help="share of rows in the first training window")
+    parser.add_argument("--n-jobs", type=int, default=1, help="worker processes (-1 = all cores)")
+    parser.add_argument("--start", help="only matches on/after this date (YYYY-MM-DD)")
+    parser.add_argument("--end", help="only matches before this date (YYYY-MM-DD)")
+    parser.add_argument("--surface", action="append", help="restrict to a surface (repeatable)")
+    parser.add_argument("--no-promote", action="store_true", help="only report fold metrics")
+    add_profile_args(parser)
+    args = parser.parse_args()
+    with profiled(args.profile):
+        kinds = [k.strip() for k in args.models.split(",") if k.strip()]
+        unknown = [k for k in kinds if k not in MODELS]
+        if unknown:
+            parser.error(f"unknown models: {unknown}")
+        train_cv(kinds, args.folds, args.min_train_frac, args.n_jobs, args.start, args.end, args.surface, not args.no_promote)
@@ -0,0 +1,95 @@
+import numpy as np
+from ..utils.profiling import stage
+from ..features.engine import BASIC_COLUMNS, EXTENDED_COLUMNS
+from ..features.incremental import STATE_NAME
+
+# Column-pruned feature reads for training and batch scoring.
+# Only the requested feature columns (plus match_id/label) leave DuckDB, already cast to
+# float32/int8 with NULLs filled by 0, and date/surface filters run inside the query.
+# Rows come back in (date, match_id) order, so time-ordered splits stay valid.
+# The 0 fill is for the odd missing value only: a requested column the last build did not
+# fill (the other builder's columns) or that holds no value at all raises instead.
+
+CHUNK_ROWS = 65536   # DuckDB hands out whole 2048-row vectors, so chunks are rounded to that
+
+BUILDER_COLUMNS = {"basic": BASIC_COLUMNS, "extended": EXTENDED_COLUMNS}
+
+def feature_columns(conn):
+    return [r[0] for r in conn.execute("DESCRIBE features").fetchall()]
+
+def feature_problem(conn, features):
+    # why these columns cannot be used, or None: every requested column must exist, be written
+    # by the builder that last filled the features table (feature_state_meta) and have a value
+    known = set(feature_columns(conn))
+    unknown = [c for c in features if c not in known]
+    if unknown:
+        return f"unknown feature columns: {unknown}"
+    row = conn.execute("SELECT builder FROM feature_state_meta WHERE name=?", [STATE_NAME]).fetchone()
+    if row and row[0] in BUILDER_COLUMNS:
+        unbuilt = [c for c in features if c not in BUILDER_COLUMNS[row[0]]]
+        if unbuilt:
+            return f"feature columns {unbuilt} are not written by the {row[0]} builder that built the features table"
+    counts = conn.execute(f"SELECT COUNT(*), {', '.join(f'COUNT({c})' for c in features)} FROM features").fetchone()
+    empty = [c for c, n in zip(features, counts[1:]) if n == 0]
+    if counts[0] and empty:
+        return f"feature columns {empty} are NULL in every row; rebuild features with the builder that fills them"
+    return None
+
+def check_features(conn, features):
+    problem = feature_problem(conn, features)
+    if problem:
+        raise ValueError(problem)
+
+def _filters(start=None, end=None, surfaces=None):
+    where, params = [], []
+    if start is not None:
+        where.append("m.date >= ?"); params.append(start)
+    if end is not None:
+        where.append("m.date < ?"); params.append(end)
+    if surfaces:
+        where.append("f.surface IN (SELECT UNNEST(?))"); params.append(list(surfaces))
+    return (" WHERE " + " AND ".join(where)) if where else "", params
+
+def feature_query(conn, features, start=None, end=None, surfaces=None, label=True):
+    check_features(conn, features)
+    cols = ", ".join(f"CAST(COALESCE(f.{c}, 0) AS FLOAT) AS {c}" for c in features)
+    if label:
+        cols += ", CAST(f.label AS TINYINT) AS label"
+    where, params = _filters(start, end, surfaces)
+    sql = f"SELECT f.match_id, {cols} FROM features f JOIN matches m USING (match_id){where} ORDER BY m.date, f.match_id"
+    return sql, params
+
+def count_rows(conn, start=None, end=None, surfaces=None):
+    where, params = _filters(start, end, surfaces)
+    return conn.execute(f"SELECT COUNT(*) FROM features f JOIN matches m USING (match_id){where}", params).fetchone()[0]
+
+def iter_chunks(conn, features, start=None, end=None, surfaces=None, label=True, chunk_rows=CHUNK_ROWS):
+    # yields (match_id, X float32 [n, k], y int8 or None) without building the full result
+    sql, params = feature_query(conn, features, start, end, surfaces, label)
+    res = conn.execute(sql, params)
+    vectors = max(1, chunk_rows // 2048)
+    while True:
+        chunk = res.fetch_df_chunk(vectors)
+        if chunk.empty:
+            return
+        X = chunk[list(features)].to_numpy(dtype=np.float32)
+        y = chunk["label"].to_numpy(dtype=np.int8) if label else None
+        yield chunk["match_id"].to_numpy(), X, y
+
+@stage("load_xy", rows=lambda r: len(r[0]))
+def load_xy(conn, features, start=None, end=None, surfaces=None, label=True, chunk_rows=CHUNK_ROWS):
+    # fills preallocated arrays chunk by chunk: peak memory is the result plus one chunk
+    n = count_rows(conn, start, end, surfaces)
+    ids = np.empty(n, dtype=np.int64)
+    X = np.empty((n, len(features)), dtype=np.float32)
+    y = np.empty(n, dtype=np.int8) if label else None
+    i = 0
+    for mid, xc, yc in iter_chunks(conn, features, start, end, surfaces, label, chunk_rows):
+        j = i + len(mid)
+        if j > n:
+            raise RuntimeError("features changed while reading; retry")
+        ids[i:j] = mid; X[i:j] = xc
+        if label:
+            y[i:j] = yc
+        i = j
+    return ids[:i], X[:i], (y[:i] if label else None)
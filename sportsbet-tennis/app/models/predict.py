@@ -1,21 +1,22 @@
-import io, joblib, pandas as pd
+import numpy as np, pandas as pd
 from ..utils.db import get_conn
+from .dataset import iter_chunks
+from .artifacts import load_artifact
 
 def load_model(conn):
-    row = conn.execute("SELECT blob, meta FROM artifacts WHERE name='model_latest'").fetchone()
-    if not row:
-        return None, None
-    blob, meta = row
-    model = joblib.load(io.BytesIO(blob))
+    model, meta, _ = load_artifact(conn, "model_latest")
     return model, meta
 
-def predict_probabilities(conn):
+def predict_probabilities(conn, start=None, end=None, surfaces=None):
     model, meta = load_model(conn)
     if not model:
         raise RuntimeError("No model found. Train a model first.")
-    feats = conn.execute("SELECT * FROM features").fetchdf()
-    X = feats[[*json.loads(meta)['features']]]  # Not used; left for future
-    # We'll reselect the same features in a safer way:
-    X = feats[['elo_diff','h2h_p1','form_p1','form_p2']]
-    p1_prob = model.predict_proba(X)[:,1]
-    return feats[['match_id']], p1_prob
+    features = meta['features']
+    # score chunk by chunk so the feature table is never held in memory at once
+    ids, probs = [], []
+    for mid, X, _ in iter_chunks(conn, features, start, end, surfaces, label=False):
+        ids.append(mid)
+        probs.append(model.predict_proba(pd.DataFrame(X, columns=features, copy=False))[:,1])
+    if not ids:
+        return pd.DataFrame({"match_id": []}), np.array([])
+    return pd.DataFrame({"match_id": np.concatenate(ids)}), np.concatenate(probs)
@@ -0,0 +1,69 @@
+import json, os, threading, time
+from .compiled import COMPILED_SUFFIX
+from .artifacts import load_artifact, pointer, ARTIFACT_MMAP
+
+# Process-level model registry for the serving path.
+# The pickled model is loaded once and reused; a cheap created_at lookup (at most once
+# every check_interval seconds) detects a newly trained artifact and hot-swaps it.
+# When a compiled export with the same created_at exists it is served instead of the pickle.
+# Loads go through the artifacts mmap cache, so workers share one copy of the arrays.
+# conn is the caller's reader() cursor: the API's read-only handle lets go of the file lock
+# every DB_RELEASE_INTERVAL seconds, which is when a trainer in another process can publish.
+
+MODEL_CHECK_INTERVAL = float(os.getenv("MODEL_CHECK_INTERVAL", "5"))
+MODEL_USE_COMPILED = os.getenv("MODEL_USE_COMPILED", "1") != "0"
+
+class ModelRegistry:
+    def __init__(self, name="model_latest", check_interval=MODEL_CHECK_INTERVAL, use_compiled=MODEL_USE_COMPILED, mmap=ARTIFACT_MMAP):
+        self.name = name
+        self.check_interval = check_interval
+        self.use_compiled = use_compiled
+        self.mmap = mmap
+        self.model = None
+        self.meta = None
+        self.created_at = None
+        self.version = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+        self.checks = 0
+        self.load_seconds = None
+
+    def get(self, conn):
+        # returns (model, meta); (None, None) when nothing has been trained yet
+        now = time.monotonic()
+        if self.model is not None and now - self._checked < self.check_interval:
+            self.hits += 1
+            return self.model, self.meta
+        with self._lock:
+            self.checks += 1
+            self._checked = now
+            row = conn.execute("SELECT created_at FROM artifacts WHERE name=?", [self.name]).fetchone()
+            if not row:
+                self.model, self.meta, self.created_at = None, None, None
+                return None, None
+            if self.model is not None and row[0] == self.created_at:
+                self.hits += 1
+                return self.model, self.meta
+            t0 = time.perf_counter()
+            ptr = pointer(conn, self.name)
+            compiled = None
+            if self.use_compiled:
+                compiled, _, _ = load_artifact(conn, self.name + COMPILED_SUFFIX, created_at=ptr["created_at"], mmap=self.mmap)
+            if compiled is not None:
+                self.model = compiled.warmup()
+            else:
+                self.model, _, _ = load_artifact(conn, self.name, mmap=self.mmap)
+            self.meta = json.loads(ptr["meta"])
+            self.created_at = ptr["created_at"]
+            self.version = ptr["version"]
+            self.load_seconds = time.perf_counter() - t0
+            self.loads += 1
+            return self.model, self.meta
+
+    def stats(self):
+        return {"name": self.name, "created_at": str(self.created_at) if self.created_at else None,
+                "hits": self.hits, "loads": self.loads, "checks": self.checks, "check_interval": self.check_interval,
+                "compiled": bool(getattr(self.model, "compiled", False)), "version": self.version,
+                "mmap": self.mmap, "load_seconds": self.load_seconds}
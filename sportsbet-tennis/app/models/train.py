@@ -1,22 +1,25 @@
-import argparse, json, io
-import joblib
+import argparse
 import pandas as pd
-from datetime import datetime
 from sklearn.linear_model import LogisticRegression
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import roc_auc_score, brier_score_loss, log_loss, accuracy_score
 from ..utils.db import get_conn
+from .dataset import load_xy
+from .artifacts import publish_model
+from ..utils.profiling import stage, set_rows, add_profile_args, profiled
 
 FEATURES = ["elo_diff", "h2h_p1", "form_p1", "form_p2"]
 
-def train():
+@stage("train")
+def train(start=None, end=None, surfaces=None):
     conn = get_conn()
-    df = conn.execute("SELECT * FROM features").fetchdf()
-    if df.empty:
+    # only the model columns, as float32/int8, in date order
+    _, X, y = load_xy(conn, FEATURES, start, end, surfaces)
+    if len(y) == 0:
         print("No features found. Build features first.")
         return
-    X = df[FEATURES]
-    y = df["label"]
+    set_rows(len(y))
+    X = pd.DataFrame(X, columns=FEATURES, copy=False)
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.25, shuffle=False)
     model = LogisticRegression(max_iter=200)
     model.fit(X_train, y_train)
@@ -27,20 +30,19 @@ def train():
         "log_loss": float(log_loss(y_test, proba)),
         "accuracy": float(accuracy_score(y_test, (proba>0.5).astype(int))),
     }
-    # persist model in artifacts
-    buf = io.BytesIO()
-    joblib.dump(model, buf)
-    buf.seek(0)
-    conn.execute(
-        "INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?, ?)",
-        ["model_latest", datetime.utcnow(), json.dumps({"features": FEATURES, "metrics": metrics}), buf.read()]
-    )
+    # persist model as a new model_latest version
+    publish_model(conn, model, {"features": FEATURES, "metrics": metrics})
     conn.close()
     print("Model trained. Metrics:", metrics)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--train", action="store_true")
+    parser.add_argument("--start", help="only matches on/after this date (YYYY-MM-DD)")
+    parser.add_argument("--end", help="only matches before this date (YYYY-MM-DD)")
+    parser.add_argument("--surface", action="append", help="restrict to a surface (repeatable)")
+    add_profile_args(parser)
     args = parser.parse_args()
-    if args.train:
-        train()
+    with profiled(args.profile):
+        if args.train:
+            train(args.start, args.end, args.surface)
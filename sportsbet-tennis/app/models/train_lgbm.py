@@ -1,29 +1,33 @@
 
-import argparse, io, json
-import joblib
+import argparse
 import pandas as pd
 import numpy as np
-from datetime import datetime
 from sklearn.calibration import CalibratedClassifierCV
+from sklearn.frozen import FrozenEstimator
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import roc_auc_score, brier_score_loss, log_loss, accuracy_score
 from ..utils.db import get_conn
+from .dataset import load_xy
+from .artifacts import publish_model
+from ..utils.profiling import stage, set_rows, add_profile_args, profiled
 import lightgbm as lgb
 
 FEATURES = ["elo_diff_surface","elo_diff_global","h2h_p1","form_p1","form_p2","days_since_p1","days_since_p2","serve_p1","serve_p2"]
 
-def train_lgbm_model():
+@stage("train_lgbm")
+def train_lgbm_model(start=None, end=None, surfaces=None):
     conn = get_conn()
-    df = conn.execute("SELECT * FROM features").fetchdf()
-    if df.empty:
+    # only the model columns, as float32/int8 with NULLs filled, in date order
+    _, X, y = load_xy(conn, FEATURES, start, end, surfaces)
+    if len(y) == 0:
         print("No features found. Build features first.")
         return
-    X = df[FEATURES].fillna(0.0)
-    y = df["label"]
+    set_rows(len(y))
+    X = pd.DataFrame(X, columns=FEATURES, copy=False)
     # time-ordered split: last 20% as test
-    split = int(len(df)*0.8)
+    split = int(len(y)*0.8)
     X_train, X_test = X.iloc[:split], X.iloc[split:]
-    y_train, y_test = y.iloc[:split], y.iloc[split:]
+    y_train, y_test = y[:split], y[split:]
     lgb_train = lgb.LGBMClassifier(
         objective='binary',
         n_estimators=1000,
@@ -31,9 +35,9 @@ def train_lgbm_model():
         num_leaves=31,
         n_jobs=1
     )
-    lgb_train.fit(X_train, y_train, eval_set=[(X_test,y_test)], early_stopping_rounds=50, verbose=False)
+    lgb_train.fit(X_train, y_train, eval_set=[(X_test,y_test)], callbacks=[lgb.early_stopping(50, verbose=False)])
     # calibration via isotonic on validation (use small split)
-    calib = CalibratedClassifierCV(lgb_train, method='isotonic', cv='prefit')
+    calib = CalibratedClassifierCV(FrozenEstimator(lgb_train), method='isotonic')
     calib.fit(X_test, y_test)
     proba = calib.predict_proba(X_test)[:,1]
     metrics = {
@@ -42,16 +46,19 @@ def train_lgbm_model():
         "log_loss": float(log_loss(y_test, proba)),
         "accuracy": float(accuracy_score(y_test, (proba>0.5).astype(int))),
     }
-    # persist model in artifacts
-    buf = io.BytesIO()
-    joblib.dump(calib, buf)
-    buf.seek(0)
-    conn.execute(
-        "INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?, ?)",
-        ["model_latest", datetime.utcnow(), json.dumps({"features": FEATURES, "metrics": metrics}), buf.read()]
-    )
+    # new model_latest version plus its numpy-only copy for serving, checked against the
+    # calibrated model on the test split
+    meta = {"features": FEATURES, "metrics": metrics}
+    publish_model(conn, calib, meta, compile=True, X_check=X_test.to_numpy(dtype=np.float64))
     conn.close()
     print("LightGBM model trained + calibrated. Metrics:", metrics)
 
 if __name__ == '__main__':
-    train_lgbm_model()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--start", help="only matches on/after this date (YYYY-MM-DD)")
+    parser.add_argument("--end", help="only matches before this date (YYYY-MM-DD)")
+    parser.add_argument("--surface", action="append", help="restrict to a surface (repeatable)")
+    add_profile_args(parser)
+    args = parser.parse_args()
+    with profiled(args.profile):
+        train_lgbm_model(args.start, args.end, args.surface)
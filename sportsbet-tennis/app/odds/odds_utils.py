@@ -1,15 +1,91 @@
+import numpy as np
+
+# Array-native odds math. Every function accepts scalars, NumPy arrays or pandas Series
+# and marks zero, negative, missing or non-finite odds as NaN instead of returning None.
+# The original scalar helpers below are thin wrappers that map NaN back to None.
+
+DEVIG_METHODS = ("proportional", "additive", "power", "shin")
+POWER_NEWTON_ITERS = 8
+
+def _arr(x):
+    return np.asarray(x, dtype=float)
+
+def implied_probs(odds):
+    o = _arr(odds)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(np.isfinite(o) & (o > 0), 1.0 / o, np.nan)
+
+def fair_odds(prob):
+    p = _arr(prob)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(np.isfinite(p) & (p > 0), 1.0 / p, np.nan)
+
+def _solve_bisect(f, lo, hi, shape, iters=60):
+    # vectorized bisection for an increasing f on [lo, hi]
+    lo = np.full(shape, lo, dtype=float); hi = np.full(shape, hi, dtype=float)
+    for _ in range(iters):
+        mid = 0.5 * (lo + hi)
+        below = f(mid) < 0
+        lo = np.where(below, mid, lo)
+        hi = np.where(below, hi, mid)
+    return 0.5 * (lo + hi)
+
+def devig(p1_implied, p2_implied, method="proportional"):
+    # fair probabilities for a two-way market; NaN wherever an input is NaN
+    p1 = _arr(p1_implied); p2 = _arr(p2_implied)
+    total = p1 + p2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if method == "proportional":
+            return p1 / total, p2 / total
+        if method == "additive":
+            # subtract the margin equally; clipped so longshots cannot go negative
+            m = (total - 1.0) / 2.0
+            f1 = np.clip(p1 - m, 0.0, 1.0)
+            return f1, 1.0 - f1
+        if method == "power":
+            # fair_i = p_i ** k with k such that the fair probabilities sum to 1 (Newton from k=1)
+            l1 = np.log(np.clip(p1, 1e-12, 1 - 1e-12)); l2 = np.log(np.clip(p2, 1e-12, 1 - 1e-12))
+            k = np.ones_like(total)
+            for _ in range(POWER_NEWTON_ITERS):
+                e1 = np.exp(k * l1); e2 = np.exp(k * l2)
+                k = k - (e1 + e2 - 1.0) / (e1 * l1 + e2 * l2)
+            f1 = np.exp(k * l1)
+            return f1, 1.0 - f1
+        if method == "shin":
+            # Shin (1993): share z of insider money, solved so sum_i p_i(z) == 1.
+            # For a two-way market the solution equals the additive one whenever that stays
+            # inside (0, 1), so only the remaining rows need the iterative solve.
+            f1 = p1 - (total - 1.0) / 2.0
+            hard = (total > 1.0) & ((f1 <= 0.0) | (f1 >= 1.0))
+            if hard.any():
+                q1, q2, t = p1[hard], p2[hard], total[hard]
+                s1 = q1 ** 2 / t; s2 = q2 ** 2 / t
+                def excess(z):
+                    return 2.0 - (np.sqrt(z * z + 4 * (1 - z) * s1) + np.sqrt(z * z + 4 * (1 - z) * s2))
+                z = _solve_bisect(excess, 0.0, 0.999, t.shape)
+                f1 = np.array(f1, dtype=float, copy=True)
+                f1[hard] = np.clip((np.sqrt(z * z + 4 * (1 - z) * s1) - z) / (2 * (1 - z)), 0.0, 1.0)
+            f1 = np.where(total > 1.0, f1, p1 / total)  # no overround: nothing to remove
+            return f1, 1.0 - f1
+    raise ValueError(f"unknown de-vig method: {method!r} (expected one of {DEVIG_METHODS})")
+
+def _scalar(x):
+    x = float(x)
+    return None if np.isnan(x) else x
+
 def implied_prob_from_decimal(odds):
-    return 1.0 / odds if odds and odds > 0 else None
+    return _scalar(implied_probs(odds if odds is not None else np.nan))
 
 def remove_vig_two_outcomes(p1_implied, p2_implied):
     # Proportional vig removal
     total = p1_implied + p2_implied
     if total == 0:
         return p1_implied, p2_implied
-    return p1_implied/total, p2_implied/total
+    f1, f2 = devig(p1_implied, p2_implied)
+    return float(f1), float(f2)
 
 def fair_odds_from_prob(prob):
-    return 1.0 / prob if prob and prob > 0 else None
+    return _scalar(fair_odds(prob if prob is not None else np.nan))
 
 def edge(model_prob, fair_prob):
     # edge vs bookmaker's implied fair prob
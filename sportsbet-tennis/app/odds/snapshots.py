@@ -0,0 +1,145 @@
+import argparse
+import pandas as pd
+from ..utils.db import get_conn
+from ..utils.profiling import stage, add_profile_args, profiled
+
+# Multi-bookmaker odds store.
+# Price ticks land in odds_snapshots (long format, keyed by match, book and timestamp). Every
+# load also upserts odds_latest, the newest tick per (match, book), and recomputes odds_index
+# for the matches the load touched only: best price per side and the book offering it, the
+# consensus implied probabilities (mean across books) and their proportional de-vig. Readers
+# (backtests, /signal) get line shopping with one primary-key lookup per match, however many
+# ticks are stored. A tick with NULL odds means the book has taken the market down.
+
+SNAPSHOT_COLUMNS = ["match_id", "bookmaker", "ts", "p1_odd", "p2_odd"]
+INDEX_COLUMNS = ["match_id", "books", "best_p1_odd", "best_p1_book", "best_p2_odd", "best_p2_book",
+                 "consensus_p1", "consensus_p2", "fair_p1", "best_overround", "last_ts", "updated_at"]
+CLOSING_BOOK = "closing"   # bookmaker name for the matches table's own odds (--from-matches)
+
+INDEX_SQL = '''
+INSERT INTO odds_index
+SELECT match_id, COUNT(*),
+    MAX(p1_odd), arg_min(bookmaker, (-p1_odd, bookmaker)),   -- ties: first book by name
+    MAX(p2_odd), arg_min(bookmaker, (-p2_odd, bookmaker)),
+    AVG(1.0 / p1_odd), AVG(1.0 / p2_odd),
+    AVG(1.0 / p1_odd) / (AVG(1.0 / p1_odd) + AVG(1.0 / p2_odd)),
+    1.0 / MAX(p1_odd) + 1.0 / MAX(p2_odd),
+    MAX(ts), now()::TIMESTAMP
+FROM odds_latest
+WHERE p1_odd > 1 AND p2_odd > 1 {where}
+GROUP BY match_id
+'''
+
+def _source(conn, source):
+    # DataFrame, or CSV/Parquet path(s) (globs allowed) read by DuckDB directly
+    if isinstance(source, pd.DataFrame):
+        conn.register("_ticks_df", source)
+        return "_ticks_df"
+    paths = [source] if isinstance(source, str) else list(source)
+    reader = "read_parquet" if all(p.endswith(".parquet") for p in paths) else "read_csv_auto"
+    return f"{reader}([{', '.join(repr(str(p)) for p in paths)}])"
+
+@stage("odds.ingest")
+def ingest(conn, source):
+    # load ticks (columns as SNAPSHOT_COLUMNS) and bring odds_latest/odds_index up to date;
+    # returns the number of new ticks
+    src = _source(conn, source)
+    # one row per (match, book, ts) within the batch
+    conn.execute(f'''
+        CREATE OR REPLACE TEMP TABLE _ticks AS
+        SELECT CAST(match_id AS INTEGER) AS match_id, CAST(bookmaker AS TEXT) AS bookmaker, CAST(ts AS TIMESTAMP) AS ts,
+            any_value(CAST(p1_odd AS DOUBLE)) AS p1_odd, any_value(CAST(p2_odd AS DOUBLE)) AS p2_odd
+        FROM {src}
+        WHERE match_id IS NOT NULL AND bookmaker IS NOT NULL AND ts IS NOT NULL
+        GROUP BY ALL
+    ''')
+    if src == "_ticks_df":
+        conn.unregister("_ticks_df")
+    before = conn.execute("SELECT COUNT(*) FROM odds_snapshots").fetchone()[0]
+    conn.execute("BEGIN TRANSACTION")
+    try:
+        conn.execute("INSERT INTO odds_snapshots SELECT t.* FROM _ticks t ANTI JOIN odds_snapshots s USING (match_id, bookmaker, ts)")
+        # newest tick of the batch per (match, book) replaces an older stored one, never a newer one
+        conn.execute('''
+            CREATE OR REPLACE TEMP TABLE _newest AS
+            SELECT match_id, bookmaker, MAX(ts) AS ts, arg_max(p1_odd, ts) AS p1_odd, arg_max(p2_odd, ts) AS p2_odd
+            FROM _ticks GROUP BY match_id, bookmaker
+        ''')
+        conn.execute('''
+            DELETE FROM odds_latest l USING _newest n
+            WHERE l.match_id = n.match_id AND l.bookmaker = n.bookmaker AND n.ts >= l.ts
+        ''')
+        conn.execute("INSERT INTO odds_latest SELECT n.* FROM _newest n ANTI JOIN odds_latest l USING (match_id, bookmaker)")
+        conn.execute("CREATE OR REPLACE TEMP TABLE _touched AS SELECT DISTINCT match_id FROM _ticks")
+        refresh_index(conn, "_touched")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        for t in ("_ticks", "_newest", "_touched"):
+            conn.execute(f"DROP TABLE IF EXISTS {t}")
+    return conn.execute("SELECT COUNT(*) FROM odds_snapshots").fetchone()[0] - before
+
+def refresh_index(conn, touched=None):
+    # recompute odds_index rows from odds_latest, for the match ids in table `touched` or all
+    where = f"AND match_id IN (SELECT match_id FROM {touched})" if touched else ""
+    conn.execute(f"DELETE FROM odds_index WHERE TRUE {where}")
+    conn.execute(INDEX_SQL.format(where=where))
+
+@stage("odds.rebuild_index")
+def rebuild(conn):
+    # odds_latest and odds_index from scratch out of odds_snapshots
+    conn.execute("BEGIN TRANSACTION")
+    try:
+        conn.execute("DELETE FROM odds_latest")
+        conn.execute('''
+            INSERT INTO odds_latest
+            SELECT match_id, bookmaker, MAX(ts), arg_max(p1_odd, ts), arg_max(p2_odd, ts)
+            FROM odds_snapshots GROUP BY match_id, bookmaker
+        ''')
+        refresh_index(conn)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return conn.execute("SELECT COUNT(*) FROM odds_index").fetchone()[0]
+
+def from_matches(conn, bookmaker=CLOSING_BOOK):
+    # the matches table's own p1_odd/p2_odd as one book, timestamped at the match date
+    df = conn.execute('''
+        SELECT match_id, ? AS bookmaker, date::TIMESTAMP AS ts, p1_odd, p2_odd FROM matches
+        WHERE p1_odd IS NOT NULL AND p2_odd IS NOT NULL AND date IS NOT NULL
+    ''', [bookmaker]).fetchdf()
+    return ingest(conn, df)
+
+def best_odds(cur, match_ids):
+    # {match_id: odds_index row as a dict} for the given ids
+    match_ids = list(match_ids)
+    if not match_ids:
+        return {}
+    # a single id takes the primary-key point lookup
+    where, param = ("match_id = ?", match_ids[0]) if len(match_ids) == 1 else ("match_id IN (SELECT UNNEST(?))", match_ids)
+    rows = cur.execute(f"SELECT {', '.join(INDEX_COLUMNS)} FROM odds_index WHERE {where}", [param]).fetchall()
+    return {r[0]: dict(zip(INDEX_COLUMNS, r)) for r in rows}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--load", nargs="+", metavar="PATH", help="tick files (CSV or Parquet, globs allowed) with columns " + ",".join(SNAPSHOT_COLUMNS))
+    parser.add_argument("--from-matches", action="store_true", help=f"add the matches table's odds as book '{CLOSING_BOOK}'")
+    parser.add_argument("--rebuild", action="store_true", help="recompute odds_latest and odds_index from all snapshots")
+    parser.add_argument("--show", type=int, nargs="+", metavar="MATCH_ID", help="print index rows")
+    add_profile_args(parser)
+    args = parser.parse_args()
+    with profiled(args.profile):
+        conn = get_conn()
+        if args.from_matches:
+            print(f"{from_matches(conn)} ticks from matches")
+        if args.load:
+            print(f"{ingest(conn, args.load)} new ticks")
+        if args.rebuild:
+            print(f"{rebuild(conn)} matches indexed")
+        if args.show:
+            for mid, row in sorted(best_odds(conn, args.show).items()):
+                print(row)
+        conn.close()
@@ -0,0 +1,211 @@
+import argparse, os, threading, time
+from datetime import date, datetime, timedelta
+import pandas as pd
+from ..utils.db import get_conn
+from ..models.registry import ModelRegistry
+from ..models.dataset import check_features
+from ..features.asof import AsOfRegistry, history_fingerprint
+from ..ev.decision import evaluate_two_way
+
+# Precomputed signals for the current slate.
+# A run scores every match in the window (both players and odds present) whose signal row
+# is missing or stale - scored by another model, computed from other odds, or older than
+# the last feature build - in one predict_proba call, and upserts the rows into signals.
+# Matches without a features row (upcoming ones: the builders only take completed matches)
+# get theirs from the point-in-time store, as of the match date, like /signal does.
+# A fingerprint of the model/features/odds/signals state is stored with each run, so a scheduler
+# tick where nothing changed costs three small queries. Every run is logged in signal_runs.
+
+SIGNAL_LOOKBACK_DAYS = int(os.getenv("SIGNAL_LOOKBACK_DAYS", "7"))
+SIGNAL_REFRESH_INTERVAL = float(os.getenv("SIGNAL_REFRESH_INTERVAL", "0"))   # seconds; 0 = no in-API scheduler
+DEVIG_METHOD = "proportional"   # what POST /signal uses
+
+SIGNAL_COLUMNS = ["match_id","p1_prob","p2_prob","p1_fair_odds","p2_fair_odds","p1_edge","p2_edge","p1_kelly","p2_kelly",
+                  "p1_odd","p2_odd","suggestion","stake","expected_value","devig_method","model_created_at","computed_at"]
+
+WINDOW_SQL = "m.p1_odd IS NOT NULL AND m.p2_odd IS NOT NULL AND m.p1_id IS NOT NULL AND m.p2_id IS NOT NULL AND m.date IS NOT NULL"
+STALE_SQL = '''(s.match_id IS NULL OR s.model_created_at IS DISTINCT FROM ? OR s.computed_at < ?
+     OR s.p1_odd IS DISTINCT FROM m.p1_odd OR s.p2_odd IS DISTINCT FROM m.p2_odd)'''
+
+def window_start(since=None, all_matches=False):
+    # None = every match; by default the last SIGNAL_LOOKBACK_DAYS days plus everything after
+    if all_matches:
+        return None
+    return since or (date.today() - timedelta(days=SIGNAL_LOOKBACK_DAYS))
+
+def _window(since):
+    return ("m.date >= ?", [since]) if since is not None else ("TRUE", [])
+
+def features_updated_at(conn):
+    return conn.execute("SELECT MAX(updated_at) FROM feature_state_meta").fetchone()[0]
+
+def fingerprint(conn, since, model_created_at):
+    where, params = _window(since)
+    n_feats = conn.execute("SELECT COUNT(*) FROM features").fetchone()[0]
+    odds = conn.execute(f"SELECT COUNT(*), SUM(hash(m.match_id, m.p1_odd, m.p2_odd)) FROM matches m WHERE {where}", params).fetchone()
+    # rows written by anyone else (e.g. POST /signals with persist) also count as a change
+    sig = conn.execute("SELECT COUNT(*), MAX(computed_at) FROM signals").fetchone()
+    # the completed history moves the as-of features of upcoming matches
+    return (f"since={since};model={model_created_at};features={n_feats}@{features_updated_at(conn)};"
+            f"history={history_fingerprint(conn)};odds={odds[0]}:{odds[1]};signals={sig[0]}@{sig[1]}")
+
+def signal_frame(match_ids, scored, p1_odd, p2_odd, devig_method, model_created_at, computed_at=None):
+    # signals rows from an evaluate_two_way result (arrays already restricted to the rows to write)
+    rows = pd.DataFrame({c: scored[c] for c in SIGNAL_COLUMNS[1:9] + ["suggestion","stake","expected_value"]})
+    rows.insert(0, "match_id", match_ids)
+    rows["p1_odd"] = p1_odd; rows["p2_odd"] = p2_odd
+    rows["devig_method"] = devig_method
+    rows["model_created_at"] = model_created_at
+    rows["computed_at"] = computed_at or datetime.utcnow()
+    return rows[SIGNAL_COLUMNS]
+
+def upsert_signals(conn, rows):
+    conn.register("_signals_df", rows)
+    conn.execute("INSERT OR REPLACE INTO signals BY NAME SELECT * FROM _signals_df")
+    conn.unregister("_signals_df")
+    return len(rows)
+
+def staleness(conn, since=None, model_created_at=None, all_matches=False):
+    since = window_start(since, all_matches)
+    where, params = _window(since)
+    if model_created_at is None:
+        row = conn.execute("SELECT created_at FROM artifacts WHERE name='model_latest'").fetchone()
+        model_created_at = row[0] if row else None
+    total, stale = conn.execute(f'''
+        SELECT COUNT(*), COUNT(*) FILTER (WHERE {STALE_SQL})
+        FROM matches m LEFT JOIN signals s USING(match_id)
+        WHERE {where} AND {WINDOW_SQL}
+    ''', [model_created_at, features_updated_at(conn)] + params).fetchone()
+    last = conn.execute("SELECT started_at, seconds, trigger, rows, status, error FROM signal_runs ORDER BY started_at DESC LIMIT 1").fetchone()
+    return {"window_start": str(since) if since else None, "matches": total, "stale": stale,
+            "last_run": dict(zip(["started_at","seconds","trigger","rows","status","error"], last)) if last else None}
+
+def asof_fill(df, features, store):
+    # features of the rows without a features row, from the point-in-time store; rows it
+    # cannot serve (no completed history at all) are dropped
+    upcoming = df["upcoming"].to_numpy(dtype=bool)
+    if not upcoming.any():
+        return df
+    if store is None:
+        return df[~upcoming]
+    rows = [store.features(p1, p2, surface, d, match_id=mid)
+            for mid, p1, p2, surface, d in df.loc[upcoming, ["match_id", "p1_id", "p2_id", "surface", "date"]].itertuples(index=False)]
+    df = df.astype({c: float for c in features})
+    df.loc[upcoming, features] = pd.DataFrame(rows, index=df.index[upcoming])[features].astype(float)
+    return df
+
+def refresh(conn, registry=None, since=None, all_matches=False, force=False, trigger="cli", asof=None):
+    # returns the number of signals written; None when there is no model
+    started = datetime.utcnow(); t0 = time.perf_counter()
+    registry = registry or ModelRegistry(check_interval=0)
+    asof = asof or AsOfRegistry(check_interval=0)
+    model, meta = registry.get(conn)
+    if not model:
+        print("No model found. Train a model first.")
+        return None
+    model_created_at = registry.created_at
+    since = window_start(since, all_matches)
+    fp = fingerprint(conn, since, model_created_at)
+    last = conn.execute("SELECT fingerprint FROM signal_runs WHERE status='ok' ORDER BY started_at DESC LIMIT 1").fetchone()
+    if not force and last and last[0] == fp:
+        return 0
+    where, params = _window(since)
+    features = meta["features"]
+    n, stale, in_tx = 0, 0, False
+    try:
+        # the model's columns must be ones the current features build fills (see dataset)
+        check_features(conn, features)
+        cols = ", ".join(f"CAST(f.{c} AS FLOAT) AS {c}" for c in features)
+        df = conn.execute(f'''
+            SELECT m.match_id, m.p1_id, m.p2_id, m.surface, m.date, f.match_id IS NULL AS upcoming, m.p1_odd, m.p2_odd, {cols}
+            FROM matches m LEFT JOIN features f USING(match_id) LEFT JOIN signals s USING(match_id)
+            WHERE {where} AND {WINDOW_SQL} AND ({'TRUE' if force else STALE_SQL})
+        ''', params + ([] if force else [model_created_at, features_updated_at(conn)])).fetchdf()
+        df = asof_fill(df, features, asof.get(conn) if df["upcoming"].any() else None)
+        stale = len(df)
+        conn.execute("BEGIN TRANSACTION"); in_tx = True
+        if stale:
+            # stray NULLs in built columns count as 0, as in dataset.feature_query
+            p1 = model.predict_proba(df[features].fillna(0.0).astype("float32"))[:,1]
+            o1 = df.p1_odd.to_numpy(dtype=float); o2 = df.p2_odd.to_numpy(dtype=float)
+            scored = evaluate_two_way(p1, o1, o2, DEVIG_METHOD)
+            ok = scored["valid"]
+            n = upsert_signals(conn, signal_frame(df.match_id.to_numpy()[ok], {k: v[ok] for k, v in scored.items()},
+                                                  o1[ok], o2[ok], DEVIG_METHOD, model_created_at, started))
+        # stored after our own upsert, so the next tick sees no change unless something else moved
+        conn.execute("INSERT INTO signal_runs VALUES (?, ?, ?, ?, ?, ?, ?, 'ok', NULL)",
+                     [started, time.perf_counter() - t0, trigger, n, stale, model_created_at, fingerprint(conn, since, model_created_at)])
+        conn.execute("COMMIT")
+    except Exception as e:
+        if in_tx:
+            conn.execute("ROLLBACK")
+        conn.execute("INSERT INTO signal_runs VALUES (?, ?, ?, 0, ?, ?, ?, 'error', ?)",
+                     [started, time.perf_counter() - t0, trigger, stale, model_created_at, fp, str(e)])
+        raise
+    print(f"Refreshed {n} signals ({stale} stale in window) in {time.perf_counter() - t0:.2f}s")
+    return n
+
+def refresh_loop(interval, since=None, all_matches=False, force=False):
+    # standalone scheduler: a connection per run, closed before sleeping, so the API's
+    # read-only handle (and other jobs) can take the database lock between runs
+    registry, asof = ModelRegistry(check_interval=0), AsOfRegistry(check_interval=0)
+    while True:
+        conn = get_conn()
+        try:
+            refresh(conn, registry, since, all_matches, force, asof=asof)
+        finally:
+            conn.close()
+        time.sleep(interval)
+
+class SignalRefresher:
+    # background loop for the API process when it is the only writer (DB_SHARED_READONLY=0);
+    # conn_factory returns its writable handle
+    def __init__(self, conn_factory, registry=None, interval=SIGNAL_REFRESH_INTERVAL, asof=None):
+        self.conn_factory = conn_factory
+        self.registry = registry
+        self.asof = asof
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="signals-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            cur = self.conn_factory().cursor()
+            try:
+                refresh(cur, self.registry, trigger="scheduler", asof=self.asof)
+            except Exception as e:
+                print(f"signals refresh failed: {e}")
+            finally:
+                cur.close()
+            self._stop.wait(self.interval)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--since", type=date.fromisoformat, help=f"window start (default: today - {SIGNAL_LOOKBACK_DAYS} days)")
+    parser.add_argument("--all", action="store_true", help="every match with players and odds")
+    parser.add_argument("--force", action="store_true", help="recompute the whole window even if nothing changed")
+    parser.add_argument("--loop", action="store_true", help="keep refreshing every --interval seconds")
+    parser.add_argument("--interval", type=float, default=SIGNAL_REFRESH_INTERVAL or 60)
+    parser.add_argument("--status", action="store_true", help="print staleness of the window and the last run")
+    args = parser.parse_args()
+    if args.loop:
+        try:
+            refresh_loop(args.interval, args.since, args.all, args.force)
+        except KeyboardInterrupt:
+            pass
+    else:
+        conn = get_conn()
+        if args.status:
+            print(staleness(conn, args.since, all_matches=args.all))
+        else:
+            refresh(conn, None, args.since, args.all, args.force)
+        conn.close()
@@ -0,0 +1,440 @@
+import argparse, asyncio, json, math, os, time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+from ..utils.metrics import Histogram, Gauge
+from ..utils.profiling import add_profile_args, profiled
+from ..ev.decision import evaluate_two_way
+from ..odds.snapshots import ingest, SNAPSHOT_COLUMNS
+
+# Streaming odds ingestion and edge alerts.
+# Sources - a growing JSONL file (tail), a TCP socket taking JSON lines, or a JSONL replay -
+# put chunks of raw lines on one bounded asyncio queue; when it is full they wait, so a fast
+# feed is slowed to what the pipeline sustains (an unread socket pushes back on the sender).
+# The batcher drains the queue in micro-batches, parses each chunk with one json.loads, applies them to an in-memory book per match
+# (seeded from odds_latest), and re-evaluates only the matches the batch touched: model
+# probabilities are cached per match and model version, so a price tick costs array math,
+# not a predict_proba call. Edge-threshold crossings go to subscriber queues (SSE /
+# WebSocket); a slow subscriber loses its oldest alerts instead of stalling the pipeline.
+# Ticks are written to the odds store by a separate task, several batches per flush.
+# Tick line: {"match_id": 1, "bookmaker": "book0", "ts": "2024-06-01T12:00:00", "p1_odd": 1.9, "p2_odd": 2.0}
+
+STREAM_SOURCES = os.getenv("STREAM_SOURCES", "")   # comma-separated specs the API starts with
+STREAM_QUEUE_CHUNKS = int(os.getenv("STREAM_QUEUE_CHUNKS", "16"))   # bound of the ingest queue, in chunks
+READ_CHUNK_LINES = 500   # ticks per queued chunk at most
+READ_BYTES = 1 << 16
+STREAM_BATCH_MAX = int(os.getenv("STREAM_BATCH_MAX", "2000"))
+STREAM_BATCH_MS = float(os.getenv("STREAM_BATCH_MS", "10"))
+STREAM_EDGE_MIN = float(os.getenv("STREAM_EDGE_MIN", "0.02"))
+STREAM_PERSIST = os.getenv("STREAM_PERSIST", "1") != "0"
+STREAM_PROB_TTL = float(os.getenv("STREAM_PROB_TTL", "300"))   # seconds a cached match probability is reused
+SUBSCRIBER_QUEUE_SIZE = 1000
+PERSIST_QUEUE_BATCHES = 16   # batches waiting for the writer before the batcher waits too
+LATENCY_WINDOW = 20000       # recent tick-to-signal latencies behind the stats percentiles
+TAIL_POLL_SECONDS = 0.05
+DEVIG_METHOD = "proportional"
+
+def _tick(d, recv):
+    ts = d.get("ts")
+    ts = datetime.fromisoformat(ts) if ts else datetime.now(timezone.utc)
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    p1, p2 = d.get("p1_odd"), d.get("p2_odd")
+    return (int(d["match_id"]), str(d["bookmaker"]), ts,
+            math.nan if p1 is None else float(p1), math.nan if p2 is None else float(p2), recv)
+
+def parse_ticks(lines, recv):
+    # -> ([(match_id, bookmaker, ts, p1_odd, p2_odd, recv)], malformed lines); one json.loads for
+    # the whole chunk, line by line only when the chunk holds a line that is not JSON.
+    # NaN odds: the book is off the market
+    try:
+        rows = json.loads("[" + ",".join(lines) + "]")
+    except ValueError:
+        rows = []
+        for line in lines:
+            try:
+                rows.append(json.loads(line))
+            except ValueError:
+                pass
+    ticks = []
+    for d in rows:
+        try:
+            ticks.append(_tick(d, recv))
+        except (KeyError, TypeError, ValueError, AttributeError):
+            pass
+    return ticks, max(len(lines) - len(ticks), 0)
+
+# sources: coroutines feeding put(lines, recv) with chunks of at most READ_CHUNK_LINES lines
+
+async def replay(path, put, speed=0.0, rate=0.0):
+    # JSONL in file order, as fast as the queue takes it; speed > 0 keeps the gaps between tick
+    # timestamps divided by speed, rate > 0 sends that many ticks per second
+    loop = asyncio.get_running_loop()
+    start, first, chunk = loop.time(), None, []
+    with open(path) as f:
+        for i, line in enumerate(f):
+            if not line.strip():
+                continue
+            due = 0.0
+            if rate > 0:
+                due = start + i / rate
+            elif speed > 0:
+                ts = datetime.fromisoformat(json.loads(line)["ts"])
+                first = first or ts
+                due = start + (ts - first).total_seconds() / speed
+            if due - loop.time() > 0.001:
+                if chunk:
+                    await put(chunk, time.perf_counter())
+                    chunk = []
+                await asyncio.sleep(due - loop.time())
+            chunk.append(line)
+            if len(chunk) >= READ_CHUNK_LINES:
+                await put(chunk, time.perf_counter())
+                chunk = []
+    if chunk:
+        await put(chunk, time.perf_counter())
+
+async def _put_lines(put, lines):
+    lines = [l for l in lines if l.strip()]
+    for s in range(0, len(lines), READ_CHUNK_LINES):
+        await put(lines[s:s + READ_CHUNK_LINES], time.perf_counter())
+
+async def tail(path, put, from_start=False):
+    # lines appended to a file, polled every TAIL_POLL_SECONDS at EOF
+    with open(path) as f:
+        if not from_start:
+            f.seek(0, os.SEEK_END)
+        buf = ""
+        while True:
+            data = f.read(READ_BYTES)
+            if not data:
+                await asyncio.sleep(TAIL_POLL_SECONDS)
+                continue
+            *lines, buf = (buf + data).split("\n")   # keep a line the writer is still writing
+            await _put_lines(put, lines)
+
+async def tcp(host, port, put):
+    # JSON lines from any number of connections; while the queue is full nothing is read,
+    # so TCP flow control slows the senders down
+    async def handle(reader, writer):
+        buf = ""
+        try:
+            while data := await reader.read(READ_BYTES):
+                *lines, buf = (buf + data.decode()).split("\n")
+                await _put_lines(put, lines)
+            await _put_lines(put, [buf])
+        finally:
+            writer.close()
+    server = await asyncio.start_server(handle, host, port)
+    async with server:
+        await server.serve_forever()
+
+def source_coro(spec, put):
+    # "replay:PATH[?speed=X|?rate=N]" | "tail:PATH" | "tcp:HOST:PORT"
+    kind, _, arg = spec.partition(":")
+    if kind == "replay":
+        path, _, query = arg.partition("?")
+        key, _, value = query.partition("=")
+        if key not in ("", "speed", "rate"):
+            raise ValueError(f"unknown replay option {key!r} (speed or rate)")
+        return replay(path, put, **({key: float(value)} if key else {}))
+    if kind == "tail":
+        return tail(arg, put)
+    if kind == "tcp":
+        host, _, port = arg.rpartition(":")
+        return tcp(host or "127.0.0.1", int(port), put)
+    raise ValueError(f"unknown stream source {spec!r} (replay:PATH, tail:PATH or tcp:HOST:PORT)")
+
+@contextmanager
+def cursor_of(conn):
+    cur = conn.cursor()
+    try:
+        yield cur
+    finally:
+        cur.close()
+
+def table_features(cur, match_ids):
+    # {match_id: features row}; the API passes its cached lookup (with as-of rows) instead
+    df = cur.execute("SELECT * FROM features WHERE match_id IN (SELECT UNNEST(?))", [list(match_ids)]).fetchdf()
+    return {int(r["match_id"]): r for r in df.to_dict("records")}
+
+class EdgeStream:
+    # reader()/writer(): context managers yielding cursors; features(cur, ids) -> {id: row}
+    def __init__(self, registry, reader, writer=None, features=table_features, sources=(), executor=None,
+                 edge_min=STREAM_EDGE_MIN, persist=STREAM_PERSIST, queue_size=STREAM_QUEUE_CHUNKS,
+                 batch_max=STREAM_BATCH_MAX, batch_ms=STREAM_BATCH_MS, prob_ttl=STREAM_PROB_TTL):
+        self.registry = registry
+        self.reader, self.writer = reader, writer
+        self.features = features
+        self.sources = list(sources)
+        self.executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix="stream")
+        # own thread for the odds store writes, so a slow flush never delays evaluation
+        self.write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="stream-write")
+        self.edge_min = edge_min
+        self.persist = persist and writer is not None
+        self.queue_size, self.batch_max, self.batch_seconds = queue_size, batch_max, batch_ms / 1000.0
+        self.prob_ttl = prob_ttl
+        self.books = {}      # match_id -> {bookmaker: [ts, p1_odd, p2_odd]}
+        self.probs = {}      # match_id -> (p1 or NaN, model created_at, cached at)
+        self.open = {}       # match_id -> side whose edge is at or above edge_min
+        self.subscribers = set()
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.latency = Histogram("stream_tick_to_signal_seconds", "tick receipt to re-evaluated signal")
+        self.counts = dict.fromkeys(["ticks", "bad_lines", "batches", "evaluated", "predicted", "alerts",
+                                     "dropped_alerts", "queue_full_waits", "persisted", "persist_errors"], 0)
+        self._tasks, self._sources = [], []
+        self._started = None
+
+    # lifecycle
+
+    def start(self):
+        # must run on the event loop that will own the stream
+        self.queue = asyncio.Queue(self.queue_size)
+        self.persist_q = asyncio.Queue(PERSIST_QUEUE_BATCHES)
+        self._started = time.monotonic()
+        self._sources = [asyncio.create_task(source_coro(s, self.put)) for s in self.sources]
+        self._tasks = [asyncio.create_task(self._batcher())]
+        if self.persist:
+            self._tasks.append(asyncio.create_task(self._writer()))
+        return self
+
+    async def drain(self):
+        # finite sources: wait until everything read has been evaluated and persisted
+        await asyncio.gather(*self._sources)
+        await self.queue.join()
+        if self.persist:
+            await self.persist_q.join()
+
+    async def stop(self):
+        for t in self._sources + self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._sources, *self._tasks, return_exceptions=True)
+
+    async def put(self, lines, recv):
+        # a chunk of raw lines, stamped with the time it was read; waits while the queue is full
+        if self.queue.full():
+            self.counts["queue_full_waits"] += 1
+        await self.queue.put((lines, recv))
+
+    def subscribe(self):
+        q = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+        self.subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        self.subscribers.discard(q)
+
+    # pipeline
+
+    async def _batcher(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            chunks = [await self.queue.get()]
+            size = len(chunks[0][0])
+            end = loop.time() + self.batch_seconds
+            while size < self.batch_max:
+                try:
+                    chunks.append(self.queue.get_nowait())
+                    size += len(chunks[-1][0])
+                except asyncio.QueueEmpty:
+                    if loop.time() >= end:
+                        break
+                    await asyncio.sleep(0.001)
+            try:
+                await self._process(chunks)
+            except Exception as e:
+                print(f"stream batch failed: {e}")
+            finally:
+                for _ in chunks:
+                    self.queue.task_done()
+
+    async def _process(self, chunks):
+        loop = asyncio.get_running_loop()
+        batch, sizes = [], []
+        for lines, recv in chunks:
+            ticks, bad = parse_ticks(lines, recv)
+            batch += ticks
+            sizes.append((recv, len(ticks)))
+            self.counts["bad_lines"] += bad
+        if not batch:
+            return
+        touched = list(dict.fromkeys(t[0] for t in batch))
+        unseen = [m for m in touched if m not in self.books]
+        seeds, probs = await loop.run_in_executor(self.executor, self._load, unseen, touched)
+        for mid, book, ts, o1, o2 in seeds:
+            self.books.setdefault(mid, {})[book] = [ts, o1 if o1 is not None else math.nan, o2 if o2 is not None else math.nan]
+        last_recv = {}
+        for mid, book, ts, o1, o2, recv in batch:
+            books = self.books.setdefault(mid, {})
+            cur = books.get(book)
+            if cur is None or ts >= cur[0]:
+                books[book] = [ts, o1, o2]
+            last_recv[mid] = recv
+        self._evaluate(touched, probs, last_recv)
+        done = time.perf_counter()
+        for recv, n in sizes:
+            self.latency.observe(done - recv, n=n)
+            self.latencies.extend([done - recv] * n)
+        self.counts["ticks"] += len(batch)
+        self.counts["batches"] += 1
+        if self.persist:
+            await self.persist_q.put(batch)
+
+    def _load(self, unseen, touched):
+        # executor side: odds_latest rows for matches new to the book, and model probabilities
+        # for touched matches whose cached one is missing, expired or from another model
+        with self.reader() as cur:
+            seeds = cur.execute('''
+                SELECT match_id, bookmaker, ts, p1_odd, p2_odd FROM odds_latest WHERE match_id IN (SELECT UNNEST(?))
+            ''', [unseen]).fetchall() if unseen else []
+            model, meta = self.registry.get(cur)
+            created, now = self.registry.created_at, time.monotonic()
+            stale = [m for m in touched if (c := self.probs.get(m)) is None or c[1] != created or now - c[2] > self.prob_ttl]
+            feats = self.features(cur, stale) if model and stale else {}
+        if feats:
+            ids = [m for m in stale if m in feats]
+            X = pd.DataFrame([feats[m] for m in ids])[meta["features"]].fillna(0.0)
+            p1 = model.predict_proba(X)[:, 1]
+            self.probs.update((m, (float(p), created, now)) for m, p in zip(ids, p1))
+            self.counts["predicted"] += len(ids)
+        for m in stale:
+            if m not in feats:
+                self.probs[m] = (math.nan, created, now)   # no features (yet): retried after prob_ttl
+        return seeds, np.array([self.probs[m][0] for m in touched])
+
+    def _evaluate(self, touched, p1, last_recv):
+        # best price per side and consensus implied probabilities of the touched matches,
+        # then edges for all of them at once
+        n = len(touched)
+        o1, o2, i1, i2 = (np.full(n, np.nan) for _ in range(4))
+        book1, book2 = [None] * n, [None] * n
+        for j, mid in enumerate(touched):
+            live = [(b, v[1], v[2]) for b, v in self.books.get(mid, {}).items() if v[1] > 1 and v[2] > 1]
+            if not live:
+                continue
+            b1 = min(live, key=lambda r: (-r[1], r[0]))   # best price, ties to the first book by name (as odds_index)
+            b2 = min(live, key=lambda r: (-r[2], r[0]))
+            o1[j], book1[j], o2[j], book2[j] = b1[1], b1[0], b2[2], b2[0]
+            i1[j] = sum(1.0 / r[1] for r in live) / len(live)
+            i2[j] = sum(1.0 / r[2] for r in live) / len(live)
+        scored = evaluate_two_way(p1, o1, o2, DEVIG_METHOD, implied=(i1, i2))
+        self.counts["evaluated"] += n
+        e1, e2, valid = scored["p1_edge"], scored["p2_edge"], scored["valid"]
+        side = np.where(valid & (e1 >= e2) & (e1 >= self.edge_min), "P1", np.where(valid & (e2 >= self.edge_min), "P2", "PASS"))
+        now = time.perf_counter()
+        for j, mid in enumerate(touched):
+            new, old = side[j], self.open.get(mid, "PASS")
+            if new == old:
+                continue
+            if new == "PASS":
+                self.open.pop(mid, None)
+            else:
+                self.open[mid] = new
+            p1_side = new == "P1" or (new == "PASS" and old == "P1")
+            self._publish({
+                "match_id": int(mid), "side": str(new), "previous": str(old),
+                "edge": float(e1[j] if p1_side else e2[j]),
+                "odds": float(o1[j] if p1_side else o2[j]), "book": book1[j] if p1_side else book2[j],
+                "prob": float(scored["p1_prob"][j] if p1_side else scored["p2_prob"][j]),
+                "fair_odds": float(scored["p1_fair_odds"][j] if p1_side else scored["p2_fair_odds"][j]),
+                "stake": float(scored["stake"][j]) if new != "PASS" else 0.0,
+                "at": datetime.utcnow().isoformat(), "latency_ms": (now - last_recv[mid]) * 1000.0,
+            })
+
+    def _publish(self, event):
+        self.counts["alerts"] += 1
+        for q in self.subscribers:
+            if q.full():
+                q.get_nowait()   # drop the oldest alert of a slow subscriber
+                self.counts["dropped_alerts"] += 1
+            q.put_nowait(event)
+
+    async def _writer(self):
+        # ticks into the odds store, everything queued so far in one load
+        loop = asyncio.get_running_loop()
+        while True:
+            batches = [await self.persist_q.get()]
+            while not self.persist_q.empty():
+                batches.append(self.persist_q.get_nowait())
+            ticks = pd.DataFrame.from_records([t[:5] for b in batches for t in b], columns=SNAPSHOT_COLUMNS)
+            try:
+                self.counts["persisted"] += await loop.run_in_executor(self.write_executor, self._ingest, ticks)
+            except Exception as e:
+                self.counts["persist_errors"] += 1
+                print(f"stream persist failed: {e}")
+            finally:
+                for _ in batches:
+                    self.persist_q.task_done()
+
+    def _ingest(self, ticks):
+        with self.writer() as cur:
+            return ingest(cur, ticks)
+
+    # reporting
+
+    def stats(self):
+        lat = np.fromiter(self.latencies, dtype=float) * 1000.0
+        elapsed = time.monotonic() - self._started if self._started else 0.0
+        return {**self.counts, "sources": self.sources, "subscribers": len(self.subscribers),
+                "open_edges": len(self.open), "matches": len(self.books),
+                "queue_depth": self.queue.qsize() if self._started else 0, "queue_size": self.queue_size,
+                "ticks_per_second": self.counts["ticks"] / elapsed if elapsed > 0 else 0.0,
+                "latency_ms": {"p50": float(np.percentile(lat, 50)), "p99": float(np.percentile(lat, 99)),
+                               "max": float(lat.max())} if len(lat) else None}
+
+    def metrics(self):
+        return [self.latency,
+                Gauge("stream_ticks", "odds ticks evaluated", lambda: self.counts["ticks"]),
+                Gauge("stream_alerts", "edge alerts published", lambda: self.counts["alerts"]),
+                Gauge("stream_dropped_alerts", "alerts dropped for slow subscribers", lambda: self.counts["dropped_alerts"]),
+                Gauge("stream_queue_depth", "line chunks waiting in the ingest queue", lambda: self.queue.qsize() if self._started else 0)]
+
+async def _main(args):
+    from ..utils.db import get_conn
+    from ..models.registry import ModelRegistry
+    conn = get_conn()
+    factory = lambda: cursor_of(conn)
+    stream = EdgeStream(ModelRegistry(), factory, factory, sources=args.source, edge_min=args.edge_min,
+                        persist=not args.no_persist, batch_max=args.batch_max, batch_ms=args.batch_ms).start()
+    alerts = stream.subscribe()
+
+    async def show():
+        while True:
+            event = await alerts.get()
+            if args.alerts:
+                print(json.dumps(event))
+
+    printer = asyncio.create_task(show())
+    finite = all(s.startswith("replay:") for s in args.source)
+    try:
+        if finite:
+            await stream.drain()
+        else:
+            while True:
+                await asyncio.sleep(args.report)
+                print(json.dumps(stream.stats()))
+    finally:
+        print(json.dumps(stream.stats()))
+        printer.cancel()
+        await stream.stop()
+        conn.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--source", action="append", required=True, help="replay:PATH[?speed=X|?rate=N] | tail:PATH | tcp:HOST:PORT (repeatable)")
+    parser.add_argument("--edge-min", type=float, default=STREAM_EDGE_MIN)
+    parser.add_argument("--batch-max", type=int, default=STREAM_BATCH_MAX)
+    parser.add_argument("--batch-ms", type=float, default=STREAM_BATCH_MS)
+    parser.add_argument("--no-persist", action="store_true", help="keep ticks in memory only")
+    parser.add_argument("--alerts", action="store_true", help="print every alert as a JSON line")
+    parser.add_argument("--report", type=float, default=10.0, help="stats interval for live sources, seconds")
+    add_profile_args(parser)
+    args = parser.parse_args()
+    with profiled(args.profile):
+        try:
+            asyncio.run(_main(args))
+        except KeyboardInterrupt:
+            pass
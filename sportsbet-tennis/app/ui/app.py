@@ -1,47 +1,173 @@
-
 import streamlit as st
-import duckdb, requests, os, json
+import duckdb, requests, os, sys
+import pandas as pd
+from contextlib import contextmanager
 from pathlib import Path
-from ..utils.paths import DB_PATH
+
+# `streamlit run app/ui/app.py` executes this file as a script, so make the package importable
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from app.utils.paths import DB_PATH
+
+DEPLOY_URL = os.getenv('DEPLOY_URL', 'http://127.0.0.1:8000')
+UI_QUERY_TTL = float(os.getenv("UI_QUERY_TTL", "600"))
+UI_SIGNAL_TTL = float(os.getenv("UI_SIGNAL_TTL", "60"))
+PAGE_SIZES = [10, 25, 50]
 
 st.set_page_config(page_title="🎾 Tennis Bets (Mobile)", page_icon="🎾", layout="centered")
 
 st.title("🎾 Tennis — Best Bet Finder (Mobile)")
-st.write("Tap a match and fetch model signal (powered by the deployed API).")
+st.write("Filter the slate and pick a match to see its model signal (powered by the deployed API).")
 
-conn = duckdb.connect(str(DB_PATH), read_only=True)
-df = conn.execute('''
-    SELECT m.match_id, m.date, m.surface, p1.name as p1, p2.name as p2, m.p1_odd, m.p2_odd
-    FROM matches m
-    LEFT JOIN players p1 ON m.p1_id = p1.player_id
-    LEFT JOIN players p2 ON m.p2_id = p2.player_id
-    ORDER BY date DESC
-''').fetchdf()
+def data_version():
+    # changes whenever an ingest writes the DB (file or WAL); part of every query cache key below
+    paths = [DB_PATH, Path(str(DB_PATH) + ".wal")]
+    return tuple(p.stat().st_mtime_ns if p.exists() else 0 for p in paths)
 
-if df.empty:
+@contextmanager
+def db():
+    # queries below are cached per data version, so a connection is only opened on a miss.
+    # It is closed right away: a long-lived read-only handle would hold DuckDB's file lock
+    # and keep the ingest jobs (and with them the invalidation) from ever running.
+    conn = duckdb.connect(str(DB_PATH), read_only=True)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+def _where(start, end, tours, surfaces):
+    where, params = [], []
+    if start:
+        where.append("m.date >= ?"); params.append(start)
+    if end:
+        where.append("m.date <= ?"); params.append(end)
+    if tours:
+        where.append("m.tour IN (SELECT UNNEST(?))"); params.append(list(tours))
+    if surfaces:
+        where.append("m.surface IN (SELECT UNNEST(?))"); params.append(list(surfaces))
+    return (" WHERE " + " AND ".join(where)) if where else "", params
+
+@st.cache_data(ttl=UI_QUERY_TTL, show_spinner=False)
+def filter_options(version):
+    with db() as conn:
+        tours = [r[0] for r in conn.execute("SELECT DISTINCT tour FROM matches WHERE tour IS NOT NULL ORDER BY 1").fetchall()]
+        surfaces = [r[0] for r in conn.execute("SELECT DISTINCT surface FROM matches WHERE surface IS NOT NULL ORDER BY 1").fetchall()]
+        lo, hi = conn.execute("SELECT MIN(date), MAX(date) FROM matches").fetchone()
+    return tours, surfaces, lo, hi
+
+@st.cache_data(ttl=UI_QUERY_TTL, show_spinner=False)
+def count_matches(version, start, end, tours, surfaces):
+    where, params = _where(start, end, tours, surfaces)
+    with db() as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM matches m{where}", params).fetchone()[0]
+
+@st.cache_data(ttl=UI_QUERY_TTL, max_entries=256, show_spinner=False)
+def page_matches(version, start, end, tours, surfaces, page, page_size):
+    # one page, newest first; only this page ever leaves DuckDB
+    where, params = _where(start, end, tours, surfaces)
+    with db() as conn:
+        return conn.execute(f'''
+            SELECT m.match_id, m.date, m.tour, m.surface, p1.name as p1, p2.name as p2, m.p1_odd, m.p2_odd
+            FROM matches m
+            LEFT JOIN players p1 ON m.p1_id = p1.player_id
+            LEFT JOIN players p2 ON m.p2_id = p2.player_id
+            {where}
+            ORDER BY m.date DESC, m.match_id DESC
+            LIMIT ? OFFSET ?
+        ''', params + [page_size, page * page_size]).fetchdf()
+
+@st.cache_data(ttl=UI_QUERY_TTL, show_spinner=False)
+def precomputed_signals(version, match_ids):
+    # rows from the signals refresh job that still match the current odds and model
+    with db() as conn:
+        df = conn.execute('''
+            SELECT s.match_id, s.p1_prob, s.p2_prob, s.p1_fair_odds, s.p2_fair_odds, s.p1_edge, s.p2_edge,
+                   s.suggestion, s.stake, s.expected_value
+            FROM signals s JOIN matches m USING(match_id)
+            WHERE s.match_id IN (SELECT UNNEST(?)) AND s.p1_odd = m.p1_odd AND s.p2_odd = m.p2_odd
+              AND s.devig_method = 'proportional'
+              AND s.model_created_at = (SELECT created_at FROM artifacts WHERE name='model_latest')
+        ''', [list(match_ids)]).fetchdf()
+    return {int(r["match_id"]): r for r in df.to_dict("records")}
+
+@st.cache_data(ttl=UI_SIGNAL_TTL, show_spinner=False)
+def fetch_signals(items):
+    # one POST /signals for the whole visible page; items is a tuple of (match_id, p1_odd, p2_odd)
+    payload = {"items": [{"match_id": m, "p1_decimal": o1, "p2_decimal": o2} for m, o1, o2 in items]}
+    r = requests.post(f"{DEPLOY_URL}/signals", json=payload, timeout=15)
+    if r.status_code != 200:
+        raise RuntimeError(f"API error: {r.status_code} - {r.text}")
+    data = r.json()
+    if "error" in data:
+        raise RuntimeError(data["error"])
+    return {res["match_id"]: res for res in data["results"]}
+
+if not DB_PATH.exists():
     st.info("No matches found. Load sample data first.")
-else:
-    # show compact list suitable for mobile
-    for _, row in df.iterrows():
-        label = f\"{row.date.date()} — {row.p1} vs {row.p2} ({row.surface})\"
-        if st.button(label):
-            st.markdown("**Fetching signal...**")
-            # Try to call local API URL or environment variable DEPLOY_URL
-            deploy_url = os.getenv('DEPLOY_URL', 'http://127.0.0.1:8000')
-            try:
-                payload = {
-                    "match_id": int(row.match_id),
-                    "p1_decimal": float(row.p1_odd) if row.p1_odd else 0.0,
-                    "p2_decimal": float(row.p2_odd) if row.p2_odd else 0.0
-                }
-                r = requests.post(f"{deploy_url}/signal", json=payload, timeout=8)
-                if r.status_code==200:
-                    data = r.json()
-                    st.json(data)
-                else:
-                    st.error(f"API error: {r.status_code} - {r.text}")
-            except Exception as e:
-                st.error(f"Could not reach API at {deploy_url}: {e}")
-                st.info("If deployed to Render, set DEPLOY_URL to your public URL in environment variables.")
+    st.stop()
+
+version = data_version()
+try:
+    tours, surfaces, lo, hi = filter_options(version)
+except duckdb.IOException:
+    st.info("The database is busy (an ingest is probably running). Try again in a moment.")
+    st.stop()
+if lo is None:
+    st.info("No matches found. Load sample data first.")
+    st.stop()
+
+with st.expander("Filters", expanded=False):
+    dates = st.date_input("Dates", value=(lo, hi), min_value=lo, max_value=hi)
+    sel_tours = st.multiselect("Tour", tours)
+    sel_surfaces = st.multiselect("Surface", surfaces)
+    page_size = st.selectbox("Per page", PAGE_SIZES, index=1)
+    if st.button("Refresh data"):
+        st.cache_data.clear()
+start, end = (dates[0], dates[-1]) if dates else (None, None)
+filters = (start, end, tuple(sel_tours), tuple(sel_surfaces))
+
+try:
+    total = count_matches(version, *filters)
+    pages = max(1, -(-total // page_size))
+    # keyed on the filters so the page resets to 1 whenever they change
+    page = st.number_input(f"Page (of {pages}, {total} matches)", min_value=1, max_value=pages, value=1, step=1,
+                           key=f"page-{filters}-{page_size}") - 1
+    df = page_matches(version, *filters, page, page_size)
+except duckdb.IOException:
+    st.info("The database is busy (an ingest is probably running). Try again in a moment.")
+    st.stop()
+
+if df.empty:
+    st.info("No matches for these filters.")
+    st.stop()
+
+items = tuple((int(r.match_id), float(r.p1_odd), float(r.p2_odd))
+              for r in df.itertuples() if pd.notna(r.p1_odd) and pd.notna(r.p2_odd))
+signals = precomputed_signals(version, tuple(m for m, _, _ in items)) if items else {}
+missing = tuple(it for it in items if it[0] not in signals)
+if missing:
+    try:
+        signals = {**signals, **fetch_signals(missing)}
+    except Exception as e:
+        st.error(f"Could not fetch signals from {DEPLOY_URL}: {e}")
+        st.info("If deployed to Render, set DEPLOY_URL to your public URL in environment variables.")
+
+def _pick(mid, key):
+    return signals.get(mid, {}).get(key)
+
+# compact table suitable for mobile: one row per match, signals already filled in
+view = df.assign(
+    match=df.p1.fillna("?") + " vs " + df.p2.fillna("?"),
+    bet=[_pick(m, "suggestion") or ("—" if m not in signals else signals[m].get("error", "—")) for m in df.match_id],
+    edge=[max(_pick(m, "p1_edge") or 0.0, _pick(m, "p2_edge") or 0.0) if m in signals else None for m in df.match_id],
+    stake=[_pick(m, "stake") for m in df.match_id],
+)
+st.dataframe(view[["date","match","surface","p1_odd","p2_odd","bet","edge","stake"]], hide_index=True)
+
+labels = {int(r.match_id): f"{r.date.date()} — {r.p1} vs {r.p2} ({r.surface})" for r in df.itertuples()}
+choice = st.selectbox("Match details", list(labels), format_func=labels.get)
+if choice in signals:
+    st.json(signals[choice])
+elif choice is not None:
+    st.caption("No signal for this match (missing odds or API unavailable).")
 
 st.caption("Tip: Use Share → Add to Home Screen in Safari to pin this app.")
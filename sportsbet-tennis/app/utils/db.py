@@ -1,13 +1,124 @@
 import duckdb
-import argparse
+import argparse, os, threading, time
+from contextlib import contextmanager
 from pathlib import Path
 from .paths import DB_PATH
+from .profiling import stage, add_profile_args, profiled
 
 SCHEMA_SQL_PATH = Path(__file__).parent.parent / "data" / "schema.sql"
+# DuckDB lets one process open the file read-write or any number read-only, never both.
+# The serving handle is read-only unless explicitly configured otherwise (DB_SHARED_READONLY=0:
+# the process keeps one read-write handle for its whole life and must be the only writer).
+DB_SHARED_READONLY = os.getenv("DB_SHARED_READONLY", "1") != "0"
+# a read-only serving handle is closed once it is this many seconds old (as soon as the reads
+# in flight finish) and reopened after a short pause, so ingest, training and refresh jobs in
+# other processes get the file lock in between
+DB_RELEASE_INTERVAL = float(os.getenv("DB_RELEASE_INTERVAL", "5"))
+DB_RELEASE_PAUSE = float(os.getenv("DB_RELEASE_PAUSE", "0.25"))
+# how long a connect keeps retrying while another process holds the lock
+DB_LOCK_TIMEOUT = float(os.getenv("DB_LOCK_TIMEOUT", "30"))
+LOCK_RETRY_SECONDS = 0.05
 
-def get_conn(readonly=False):
-    return duckdb.connect(str(DB_PATH), read_only=readonly)
+_shared_conn = None
+_shared_lock = threading.Lock()
+_write_lock = threading.Lock()
+_local = threading.local()   # per-thread reader cursor (writable handle)
+_generation = 0              # bumped on close so cached cursors of a closed handle are dropped
+_lease = threading.Condition()   # read-only handle: readers in flight, open and close times
+_readers = 0
+_opened_at = 0.0
+_released_at = None
 
+def _lock_conflict(e):
+    return "lock" in str(e).lower()
+
+def get_conn(readonly=False, timeout=None):
+    # waits (up to DB_LOCK_TIMEOUT) for another process to release the file lock
+    deadline = time.monotonic() + (DB_LOCK_TIMEOUT if timeout is None else timeout)
+    while True:
+        try:
+            return duckdb.connect(str(DB_PATH), read_only=readonly)
+        except duckdb.IOException as e:
+            if not _lock_conflict(e) or time.monotonic() >= deadline:
+                raise
+            time.sleep(LOCK_RETRY_SECONDS)
+
+def get_shared_conn():
+    # one DuckDB handle per process; request handlers take their own .cursor() from it.
+    # Read-write handles only (see DB_SHARED_READONLY): it holds the file lock until closed
+    global _shared_conn
+    if _shared_conn is None:
+        with _shared_lock:
+            if _shared_conn is None:
+                _shared_conn = get_conn()
+    return _shared_conn
+
+def close_shared_conn():
+    global _shared_conn, _generation, _released_at
+    with _shared_lock, _lease:
+        if _shared_conn is not None:
+            _shared_conn.close()
+            _shared_conn = None
+            _generation += 1
+            _released_at = time.monotonic()
+
+def _acquire_readonly():
+    global _shared_conn, _readers, _opened_at, _released_at
+    with _lease:
+        while _shared_conn is not None and time.monotonic() - _opened_at >= DB_RELEASE_INTERVAL:
+            if _readers == 0:
+                _shared_conn.close()
+                _shared_conn, _released_at = None, time.monotonic()
+            else:
+                _lease.wait()   # draining: the last reader out closes it
+        if _shared_conn is None:
+            if _released_at is not None:
+                time.sleep(max(0.0, _released_at + DB_RELEASE_PAUSE - time.monotonic()))
+            _shared_conn, _opened_at = get_conn(readonly=True), time.monotonic()
+        _readers += 1
+        return _shared_conn
+
+def _release_readonly():
+    global _shared_conn, _readers, _released_at
+    with _lease:
+        _readers -= 1
+        if _readers == 0 and _shared_conn is not None and time.monotonic() - _opened_at >= DB_RELEASE_INTERVAL:
+            _shared_conn.close()
+            _shared_conn, _released_at = None, time.monotonic()
+        _lease.notify_all()
+
+@contextmanager
+def reader():
+    # query cursor for one request. Read-only: a cursor on the leased serving handle (see
+    # DB_RELEASE_INTERVAL). Writable: each thread keeps and reuses its own cursor on the
+    # process-wide handle, so a bounded executor means a bounded set of cursors
+    if DB_SHARED_READONLY:
+        cur = _acquire_readonly().cursor()
+        try:
+            yield cur
+        finally:
+            cur.close()
+            _release_readonly()
+        return
+    cur = getattr(_local, "cur", None)
+    if cur is None or _local.generation != _generation:
+        cur = _local.cur = get_shared_conn().cursor()
+        _local.generation = _generation
+    yield cur
+
+@contextmanager
+def writer():
+    # fresh cursor for writes; writes from one process are serialized to avoid commit conflicts
+    if DB_SHARED_READONLY:
+        raise RuntimeError("writes need a writable database handle (set DB_SHARED_READONLY=0)")
+    with _write_lock:
+        cur = get_shared_conn().cursor()
+        try:
+            yield cur
+        finally:
+            cur.close()
+
+@stage("init_db")
 def init_db():
     conn = get_conn()
     with open(SCHEMA_SQL_PATH, "r") as f:
@@ -18,6 +129,8 @@ def init_db():
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--init", action="store_true")
+    add_profile_args(parser)
     args = parser.parse_args()
-    if args.init:
-        init_db()
+    with profiled(args.profile):
+        if args.init:
+            init_db()
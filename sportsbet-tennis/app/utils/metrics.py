@@ -0,0 +1,99 @@
+import bisect, threading, time
+
+# Minimal Prometheus text-format metrics for the API (no client library needed).
+# Histograms keep cumulative bucket counts per label set; gauges read a callback at
+# scrape time, so existing counters (model registry, caches) are exported as they are.
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{k}="{str(v)}"' for k, v in zip(names, values)) + "}"
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}   # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels, n=1):
+        # n: observations of the same value at once (e.g. every tick of a chunk)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(labels)
+            if s is None:
+                s = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            s[i] += n
+            s[-1] += value * n
+
+    def time(self, *labels):
+        return _Timer(self, labels)
+
+    def render(self):
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        for labels, s in sorted(series.items()):
+            cum = 0
+            for le, n in zip(self.buckets + ("+Inf",), s[:-1]):
+                cum += n
+                out.append(f"{self.name}_bucket{_labels(self.labelnames + ('le',), labels + (le,))} {cum}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {s[-1]}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cum}")
+        return "\n".join(out)
+
+class _Timer:
+    __slots__ = ("hist", "labels", "t0")
+    def __init__(self, hist, labels):
+        self.hist, self.labels = hist, labels
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+    def __exit__(self, exc_type, exc, tb):
+        self.hist.observe(time.perf_counter() - self.t0, *self.labels)
+        return False
+
+class Gauge:
+    # value read from fn() at scrape time; None values are skipped
+    def __init__(self, name, help, fn):
+        self.name = name
+        self.help = help
+        self.fn = fn
+
+    def render(self):
+        value = self.fn()
+        if value is None:
+            return ""
+        return f"# HELP {self.name} {self.help}\n# TYPE {self.name} gauge\n{self.name} {float(value)}"
+
+def render(metrics):
+    return "\n".join(t for t in (m.render() for m in metrics) if t) + "\n"
+
+class MetricsMiddleware:
+    # pure ASGI middleware: request latency per route template (not per raw path) and status
+    def __init__(self, app, histogram):
+        self.app = app
+        self.histogram = histogram
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        status = [500]
+
+        async def send_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            # the router fills in the matched route on the shared scope
+            route = scope.get("route")
+            path = getattr(route, "path", None) or getattr(scope.get("endpoint"), "__name__", None) or "unmatched"
+            self.histogram.observe(time.perf_counter() - t0, scope["method"], path, status[0])
@@ -0,0 +1,191 @@
+import cProfile, functools, json, os, sys, threading, time
+from collections import Counter
+from contextlib import contextmanager
+
+# Stage spans and CLI profilers.
+# span()/stage() time a block (wall, CPU, peak RSS, rows) and report it on stderr and,
+# with PROFILE_SPANS_FILE, as JSON lines. They are off unless PROFILE_SPANS=1 or a CLI
+# runs with --profile; disabled, a span is one flag check and no sampler thread.
+# --profile PATH writes a cProfile dump (open with pstats/snakeviz), or, for .folded /
+# .collapsed paths, sampled stacks in the collapsed format flamegraph.pl and speedscope read.
+
+PROFILE_SPANS_FILE = os.getenv("PROFILE_SPANS_FILE")
+RSS_SAMPLE_SECONDS = 0.01
+STACK_SAMPLE_SECONDS = 0.002
+FOLDED_SUFFIXES = (".folded", ".collapsed")
+
+_enabled = os.getenv("PROFILE_SPANS", "0") != "0"
+_local = threading.local()   # per-thread stack of open spans, for nested names
+_emit_lock = threading.Lock()
+
+def enable(flag=True):
+    global _enabled
+    _enabled = flag
+
+def enabled():
+    return _enabled
+
+def rss_kb():
+    # current resident set size of this process in kB
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * (os.sysconf("SC_PAGE_SIZE") // 1024)
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+class Span:
+    # wall/CPU time and peak RSS of a with-block; set .rows inside it
+    def __init__(self, name, rows=None):
+        self.name = name
+        self.rows = rows
+        self.error = None
+
+    def _sample(self):
+        while not self._stop.wait(RSS_SAMPLE_SECONDS):
+            self.peak = max(self.peak, rss_kb())
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        self.path = "/".join([s.name for s in stack] + [self.name])
+        stack.append(self)
+        self.rss0 = self.peak = rss_kb()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        self.t0, self.c0 = time.perf_counter(), time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.seconds = time.perf_counter() - self.t0
+        self.cpu_seconds = time.process_time() - self.c0
+        self._stop.set(); self._thread.join()
+        self.peak = max(self.peak, rss_kb())
+        _local.stack.pop()
+        if exc is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        if _enabled:
+            emit(self)
+        return False
+
+    def record(self):
+        return {"stage": self.path, "seconds": self.seconds, "cpu_seconds": self.cpu_seconds,
+                "peak_rss_mb": self.peak / 1024, "rss_growth_mb": (self.peak - self.rss0) / 1024,
+                "rows": self.rows, "error": self.error}
+
+class _NullSpan:
+    # what span() hands out while profiling is off
+    rows = None
+    def __enter__(self):
+        return self
+    def __exit__(self, exc_type, exc, tb):
+        return False
+    def __setattr__(self, key, value):
+        pass
+
+_NULL = _NullSpan()
+
+def span(name, rows=None):
+    return Span(name, rows) if _enabled else _NULL
+
+def set_rows(rows):
+    # row count of the innermost open span on this thread (no-op when disabled)
+    stack = getattr(_local, "stack", None)
+    if _enabled and stack:
+        stack[-1].rows = int(rows)
+
+def stage(name=None, rows=None):
+    # decorator form of span(); rows(result) -> row count, int results count by default
+    def deco(fn):
+        label = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with Span(label) as sp:
+                out = fn(*args, **kwargs)
+                if rows is not None and out is not None:
+                    sp.rows = int(rows(out))
+                elif sp.rows is None and isinstance(out, int) and not isinstance(out, bool):
+                    sp.rows = out
+            return out
+        return wrapper
+    return deco
+
+def emit(sp):
+    rec = sp.record()
+    rows = f"  rows {rec['rows']}" if rec["rows"] is not None else ""
+    err = f"  ERROR {rec['error']}" if rec["error"] else ""
+    with _emit_lock:
+        print(f"[span] {rec['stage']:40s} {rec['seconds']:9.3f}s  cpu {rec['cpu_seconds']:9.3f}s  "
+              f"peak {rec['peak_rss_mb']:8.0f} MB{rows}{err}", file=sys.stderr)
+        if PROFILE_SPANS_FILE:
+            with open(PROFILE_SPANS_FILE, "a") as f:
+                f.write(json.dumps(rec) + "\n")
+
+class StackSampler:
+    # samples one thread's Python stack on a timer and counts collapsed stacks
+    def __init__(self, thread_id=None, interval=STACK_SAMPLE_SECONDS):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.counts = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{frame.f_globals.get('__name__', '?')}:{code.co_qualname}")
+                frame = frame.f_back
+            if names:
+                self.counts[";".join(reversed(names))] += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set(); self._thread.join()
+        return self
+
+    def write(self, path):
+        with open(path, "w") as f:
+            for stack, n in self.counts.most_common():
+                f.write(f"{stack} {n}\n")
+
+def add_profile_args(parser):
+    parser.add_argument("--profile", metavar="PATH", default=None,
+                        help="report stage spans and write a profile: cProfile dump, or collapsed stacks for .folded/.collapsed")
+
+@contextmanager
+def profiled(path):
+    # CLI wrapper: spans on, plus cProfile or the stack sampler around the block
+    if not path:
+        yield
+        return
+    was = _enabled
+    enable(True)
+    if path.endswith(FOLDED_SUFFIXES):
+        sampler = StackSampler().start()
+        try:
+            yield
+        finally:
+            sampler.stop().write(path)
+            enable(was)
+            print(f"[profile] {sum(sampler.counts.values())} stack samples -> {path}", file=sys.stderr)
+    else:
+        prof = cProfile.Profile()
+        prof.enable()
+        try:
+            yield
+        finally:
+            prof.disable()
+            prof.dump_stats(path)
+            enable(was)
+            print(f"[profile] cProfile stats -> {path} (python -m pstats {path})", file=sys.stderr)
@@ -0,0 +1,35 @@
+import sys
+import numpy as np
+from multiprocessing import shared_memory
+
+# NumPy arrays handed to worker processes as shared memory blocks instead of pickles.
+# The parent publishes once and owns (closes + unlinks) the blocks; workers attach views.
+# Only the parent's resource tracker holds the blocks, so they are still removed if the
+# parent dies, and a worker never unlinks or unregisters them.
+
+def publish(arrays):
+    # {key: ndarray} -> (blocks to release, specs for attach)
+    blocks, specs = [], {}
+    for key, a in arrays.items():
+        a = np.ascontiguousarray(a)
+        shm = shared_memory.SharedMemory(create=True, size=max(a.nbytes, 1))
+        np.ndarray(a.shape, a.dtype, buffer=shm.buf)[...] = a
+        blocks.append(shm)
+        specs[key] = (shm.name, a.shape, a.dtype.str)
+    return blocks, specs
+
+def attach(specs, into):
+    # fills into[key] with views; into[key + "_shm"] keeps each block alive
+    for key, (name, shape, dtype) in specs.items():
+        if sys.version_info >= (3, 13):
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            # pool workers (fork or spawn) share the parent's tracker, where registering the
+            # name again is a no-op; unregistering it would drop the parent's registration
+            shm = shared_memory.SharedMemory(name=name)
+        into[key + "_shm"] = shm
+        into[key] = np.ndarray(shape, np.dtype(dtype), buffer=shm.buf)
+
+def release(blocks):
+    for shm in blocks:
+        shm.close(); shm.unlink()
@@ -0,0 +1,40 @@
+import sys
+from pathlib import Path
+import duckdb
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.bench.synth import generate
+from app.utils import db
+from app.models import artifacts
+
+# Shared fixtures: a fresh schema in a temporary DuckDB file (get_conn() is pointed at it
+# too, for code that opens its own handle, and the artifact cache sits next to it) and a
+# small synthetic history to load into it.
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    path = tmp_path / "tennis.duckdb"
+    monkeypatch.setattr(db, "DB_PATH", path)
+    monkeypatch.setattr(artifacts, "ARTIFACT_CACHE_DIR", tmp_path / "cache")
+    c = duckdb.connect(str(path))
+    c.execute(db.SCHEMA_SQL_PATH.read_text())
+    yield c
+    c.close()
+
+@pytest.fixture(scope="session")
+def history():
+    # (players, matches): 3000 matches between 200 players over 3 years, both tours
+    return generate(3000, 200, 3, seed=7)
+
+def load_history(conn, players, matches):
+    conn.register("_players", players); conn.register("_matches", matches)
+    conn.execute("INSERT INTO players BY NAME SELECT * FROM _players")
+    conn.execute("INSERT INTO matches BY NAME SELECT * FROM _matches")
+    conn.unregister("_players"); conn.unregister("_matches")
+
+@pytest.fixture
+def loaded(conn, history):
+    load_history(conn, *history)
+    return conn
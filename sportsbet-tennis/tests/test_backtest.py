@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+import pytest
+from app.features.incremental import build
+from app.backtest.advanced_backtest import load_backtest_frame
+from app.odds.snapshots import ingest, from_matches
+
+@pytest.fixture
+def built(loaded):
+    build(loaded, extended=True)
+    return loaded
+
+def _closing(conn):
+    return conn.execute("SELECT p1_odd, p2_odd FROM matches ORDER BY date, match_id").fetchnumpy()
+
+def test_default_prices_are_the_closing_odds(built):
+    from_matches(built)
+    ingest(built, pd.DataFrame({"match_id": [1], "bookmaker": ["other"], "ts": [pd.Timestamp("1999-01-01")],
+                                "p1_odd": [50.0], "p2_odd": [50.0]}))
+    df = load_backtest_frame(built)
+    ref = _closing(built)
+    assert "p1_implied" not in df
+    np.testing.assert_array_equal(df.p1_odd.to_numpy(), ref["p1_odd"])
+    np.testing.assert_array_equal(df.p2_odd.to_numpy(), ref["p2_odd"])
+
+def test_best_needs_an_odds_index(built):
+    with pytest.raises(ValueError, match="odds_index"):
+        load_backtest_frame(built, odds="best")
+
+def test_best_line_shops_across_books(built):
+    from_matches(built)
+    ingest(built, pd.DataFrame({"match_id": [1], "bookmaker": ["other"], "ts": [pd.Timestamp("1999-01-01")],
+                                "p1_odd": [50.0], "p2_odd": [1.01]}))
+    df = load_backtest_frame(built, odds="best").set_index("match_id")
+    closing = built.execute("SELECT p2_odd FROM matches WHERE match_id=1").fetchone()[0]
+    assert df.loc[1, "p1_odd"] == 50.0 and df.loc[1, "p2_odd"] == pytest.approx(closing)
+    assert df.p1_implied.notna().all()
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+from app.models.compiled import CompiledModel, compile_model, PARITY_TOL
+
+lgb = pytest.importorskip("lightgbm")
+from sklearn.calibration import CalibratedClassifierCV
+from sklearn.frozen import FrozenEstimator
+
+FEATURES = ["a", "b", "c", "d"]
+
+@pytest.fixture(scope="module")
+def data():
+    rng = np.random.default_rng(3)
+    X = rng.normal(size=(4000, len(FEATURES)))
+    y = (rng.random(4000) < 1.0 / (1.0 + np.exp(-(X[:, 0] - 0.7 * X[:, 1] + 0.3 * X[:, 2] * X[:, 3])))).astype(int)
+    # missing values and exact zeros exercise both default-direction paths
+    X[rng.random(X.shape) < 0.05] = np.nan
+    X[rng.random(X.shape) < 0.05] = 0.0
+    return pd.DataFrame(X, columns=FEATURES), y
+
+def _lgbm(X, y):
+    return lgb.LGBMClassifier(n_estimators=60, num_leaves=15, learning_rate=0.1, n_jobs=1, verbose=-1).fit(X, y)
+
+def _assert_parity(model, compiled, X):
+    ref = model.predict_proba(X)[:, 1]
+    Xn = X.to_numpy(dtype=np.float64)
+    np.testing.assert_allclose(compiled.predict_proba(Xn)[:, 1], ref, rtol=0, atol=PARITY_TOL)
+    one = np.array([compiled.predict_one(r) for r in Xn[:300]])
+    np.testing.assert_allclose(one, ref[:300], rtol=0, atol=PARITY_TOL)
+
+def test_bare_lgbm_parity(data):
+    X, y = data
+    model = _lgbm(X, y)
+    _assert_parity(model, compile_model(model, FEATURES), X)
+
+@pytest.mark.parametrize("use_numba", [False, True])
+def test_calibrated_lgbm_parity_after_round_trip(data, use_numba):
+    X, y = data
+    model = CalibratedClassifierCV(FrozenEstimator(_lgbm(X.iloc[:3000], y[:3000])), method="isotonic").fit(X.iloc[3000:], y[3000:])
+    compiled = CompiledModel.from_bytes(compile_model(model, FEATURES).to_bytes(), use_numba=use_numba)
+    assert compiled.features == FEATURES
+    _assert_parity(model, compiled, X)
+
+def test_feature_order_mismatch_raises(data):
+    X, y = data
+    with pytest.raises(ValueError, match="trained on"):
+        compile_model(_lgbm(X, y), FEATURES[::-1])
@@ -0,0 +1,32 @@
+import json
+import pytest
+from app.features.incremental import build
+from app.models.cv import train_cv, rolling_origin_folds, available
+
+def _promoted(conn):
+    row = conn.execute("SELECT meta FROM artifacts WHERE name='model_latest'").fetchone()
+    return json.loads(row[0]) if row else None
+
+def test_rolling_origin_folds_expand_in_time():
+    folds = rolling_origin_folds(1000, 4, 0.5)
+    assert folds[0][0] == 500 and folds[-1][1] == 1000
+    assert all(a[1] == b[0] for a, b in zip(folds, folds[1:]))
+
+def test_only_models_on_the_current_build_compete(loaded):
+    # basic build: lgbm/xgb would train on the all-NULL extended columns
+    build(loaded, extended=False)
+    best, results = train_cv(["logreg", "lgbm", "xgb"], n_folds=2)
+    assert best == "logreg" and set(results) == {"logreg"}
+    assert _promoted(loaded)["features"] == ["elo_diff", "h2h_p1", "form_p1", "form_p2"]
+
+@pytest.mark.skipif(not (available("lgbm") or available("xgb")), reason="needs lightgbm or xgboost")
+def test_logreg_is_not_compared_on_an_extended_build(loaded):
+    build(loaded, extended=True)
+    best, results = train_cv(["logreg", "lgbm", "xgb"], n_folds=2)
+    assert "logreg" not in results and best in ("lgbm", "xgb")
+    assert _promoted(loaded)["model"] == best
+
+def test_nothing_promoted_without_a_usable_candidate(loaded):
+    build(loaded, extended=True)
+    assert train_cv(["logreg"], n_folds=2) is None
+    assert _promoted(loaded) is None
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+from sklearn.linear_model import LogisticRegression
+from app.features.incremental import build
+from app.models.dataset import load_xy, check_features
+from app.models.artifacts import publish_model
+from app.models.registry import ModelRegistry
+from app.signals.refresh import refresh
+
+BASIC = ["elo_diff", "h2h_p1", "form_p1", "form_p2"]
+EXTENDED = ["elo_diff_surface", "elo_diff_global", "h2h_p1", "form_p1", "form_p2", "days_since_p1", "days_since_p2"]
+
+def test_load_xy_compact_and_in_date_order(loaded):
+    build(loaded, extended=True)
+    ids, X, y = load_xy(loaded, EXTENDED)
+    assert X.dtype == np.float32 and y.dtype == np.int8 and X.shape == (3000, len(EXTENDED))
+    order = loaded.execute("SELECT match_id FROM matches ORDER BY date, match_id").fetchnumpy()["match_id"]
+    assert np.array_equal(ids, order)
+
+@pytest.mark.parametrize("extended, other", [(True, BASIC), (False, EXTENDED)])
+def test_columns_of_the_other_builder_raise(loaded, extended, other):
+    build(loaded, extended=extended)
+    with pytest.raises(ValueError, match="not written by"):
+        load_xy(loaded, other)
+
+def test_all_null_column_raises_without_state(loaded):
+    # e.g. a features table filled before feature_state_meta existed
+    build(loaded, extended=True)
+    loaded.execute("DELETE FROM feature_state_meta")
+    with pytest.raises(ValueError, match="NULL in every row"):
+        check_features(loaded, ["elo_diff"])
+    check_features(loaded, EXTENDED)
+
+def test_refresh_refuses_model_on_unbuilt_columns(loaded):
+    build(loaded, extended=True)
+    X = np.random.default_rng(0).normal(size=(50, len(BASIC))); y = np.arange(50) % 2
+    publish_model(loaded, LogisticRegression().fit(X, y), {"features": BASIC})
+    with pytest.raises(ValueError, match="not written by"):
+        refresh(loaded, ModelRegistry(check_interval=0), all_matches=True, force=True)
+    status = loaded.execute("SELECT status FROM signal_runs").fetchall()
+    assert status == [("error",)]
@@ -0,0 +1,65 @@
+import os
+import subprocess
+import sys
+import textwrap
+import time
+from pathlib import Path
+import pytest
+from sklearn.dummy import DummyClassifier
+from app.utils import db
+from app.models.artifacts import publish_model
+from app.models.registry import ModelRegistry
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# A trainer in another process publishes while the API serves: the read-only serving handle
+# has to let go of DuckDB's file lock for the write to land and the registry to swap models
+PUBLISH = textwrap.dedent("""
+    from sklearn.dummy import DummyClassifier
+    from app.utils.db import get_conn
+    from app.models.artifacts import publish_model
+    conn = get_conn()
+    publish_model(conn, DummyClassifier(strategy="constant", constant=1).fit([[0], [1]], [0, 1]), {"features": ["x"], "run": 2})
+    conn.close()
+""")
+
+@pytest.fixture
+def serving(conn, tmp_path, monkeypatch):
+    publish_model(conn, DummyClassifier().fit([[0], [1]], [0, 1]), {"features": ["x"], "run": 1})
+    conn.close()
+    monkeypatch.setattr(db, "DB_SHARED_READONLY", True)
+    monkeypatch.setattr(db, "DB_RELEASE_INTERVAL", 0.2)
+    monkeypatch.setattr(db, "DB_RELEASE_PAUSE", 0.1)
+    yield
+    db.close_shared_conn()
+
+def test_registry_picks_up_a_model_published_by_another_process(serving, tmp_path):
+    registry = ModelRegistry(check_interval=0)
+    env = {**os.environ, "DB_PATH": str(db.DB_PATH), "ARTIFACT_CACHE_DIR": str(tmp_path / "cache"), "PYTHONPATH": str(ROOT)}
+    with db.reader() as cur:
+        assert registry.get(cur)[1]["run"] == 1
+        # the trainer starts while a request holds the handle and has to wait for it
+        proc = subprocess.Popen([sys.executable, "-c", PUBLISH], cwd=ROOT, env=env, stderr=subprocess.PIPE, text=True)
+        time.sleep(0.5)
+        assert proc.poll() is None
+    deadline = time.monotonic() + 60
+    while proc.poll() is None and time.monotonic() < deadline:
+        with db.reader() as cur:   # keep serving meanwhile
+            registry.get(cur)
+        time.sleep(0.01)
+    assert proc.wait(timeout=1) == 0, proc.stderr.read()
+    with db.reader() as cur:
+        model, meta = registry.get(cur)
+    assert meta["run"] == 2 and registry.loads == 2
+    assert model.predict([[0]])[0] == 1
+
+def test_writable_handle_refuses_a_second_writer(serving, monkeypatch):
+    # DB_SHARED_READONLY=0: the process-wide read-write handle keeps the lock, so other
+    # writers time out; the API has to be the only writer
+    monkeypatch.setattr(db, "DB_SHARED_READONLY", False)
+    with db.reader() as cur:
+        cur.execute("SELECT 1")
+    script = "from app.utils.db import get_conn; get_conn(timeout=0.2)"
+    env = {**os.environ, "DB_PATH": str(db.DB_PATH), "PYTHONPATH": str(ROOT)}
+    out = subprocess.run([sys.executable, "-c", script], cwd=ROOT, env=env, capture_output=True, text=True)
+    assert out.returncode != 0 and "lock" in out.stderr.lower()
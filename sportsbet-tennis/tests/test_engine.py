@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pytest
+from app.features.engine import compute_features, reference_input, sort_matches, FeatureEngine
+from app.features.feature_builder import features_rowwise
+from app.features.feature_builder_extended import features_extended_rowwise
+
+def _assert_same(ref, got, atol=1e-9):
+    assert list(ref.columns) == list(got.columns) and len(ref) == len(got)
+    for c in ref.columns:
+        x, y = ref[c].to_numpy(), got[c].to_numpy()
+        if x.dtype.kind in "fiu" and y.dtype.kind in "fiu":
+            np.testing.assert_allclose(x.astype(float), y.astype(float), rtol=0, atol=atol, err_msg=c)
+        else:
+            assert (pd.Series(x).fillna("") == pd.Series(y).fillna("")).all(), c
+
+@pytest.mark.parametrize("ref_fn, extended", [(features_rowwise, False), (features_extended_rowwise, True)])
+def test_engine_matches_original_rowwise_builders(history, ref_fn, extended):
+    matches = reference_input(history[1].head(1500))
+    ref = ref_fn(sort_matches(matches))
+    got = compute_features(matches, extended=extended, engine=FeatureEngine(use_numba=False))
+    _assert_same(ref, got)
+
+def _matches(rows):
+    return pd.DataFrame(rows, columns=["match_id", "date", "surface", "p1_id", "p2_id", "winner_id"]).assign(
+        date=lambda d: pd.to_datetime(d["date"]))
+
+def test_h2h_is_this_matchs_p1_share():
+    # 1 beat 2 twice as p1; in the rematch 2 is listed first and has won none of the meetings
+    m = _matches([(1, "2024-01-01", "Hard", 1, 2, 1), (2, "2024-01-02", "Hard", 1, 2, 1),
+                  (3, "2024-01-03", "Hard", 2, 1, 2)])
+    got = compute_features(m, extended=True)
+    assert got["h2h_p1"].tolist() == [0.5, 1.0, 0.0]
+
+def test_missing_surface_uses_hard_table_once():
+    # no Hard match at all: the missing surface still gets its own Hard table and the
+    # global Elo moves once per match
+    m = _matches([(1, "2024-01-01", None, 1, 2, 1), (2, "2024-01-02", "Clay", 1, 2, 1),
+                  (3, "2024-01-03", None, 1, 2, 1)])
+    got = compute_features(m, extended=True)
+    assert got["surface"].tolist() == ["Hard", "Clay", "Hard"]
+    assert got["elo_diff_surface"].iloc[1] == 0.0
+    assert got["elo_diff_surface"].iloc[2] == pytest.approx(got["elo_diff_global"].iloc[1])
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import pytest
+from app.features.incremental import build
+from conftest import load_history
+
+def _features(conn):
+    return conn.execute("SELECT * FROM features ORDER BY match_id").fetchdf()
+
+def _state(conn):
+    return conn.execute("SELECT * FROM feature_state_players ORDER BY player_id").fetchdf()
+
+@pytest.mark.parametrize("extended", [False, True])
+@pytest.mark.parametrize("in_db", [False, True])
+def test_incremental_equals_full_rebuild(conn, history, extended, in_db):
+    players, matches = history
+    load_history(conn, players, matches.head(2000))
+    assert build(conn, extended=extended, in_db=in_db) == (2000, "full")
+    conn.register("_rest", matches.iloc[2000:])
+    conn.execute("INSERT INTO matches BY NAME SELECT * FROM _rest")
+    assert build(conn, extended=extended, incremental=True, in_db=in_db) == (1000, "incremental")
+    inc, inc_state = _features(conn), _state(conn)
+    assert build(conn, extended=extended, in_db=in_db) == (3000, "full")
+    full, full_state = _features(conn), _state(conn)
+    pd.testing.assert_frame_equal(inc, full, check_exact=False, rtol=0, atol=1e-9)
+    pd.testing.assert_frame_equal(inc_state, full_state, check_exact=False, rtol=0, atol=1e-9)
+
+def test_backfill_before_watermark_rebuilds(conn, history):
+    players, matches = history
+    load_history(conn, players, matches.head(2000))
+    build(conn, extended=True)
+    late = matches.iloc[[2000]].assign(match_id=10**6, date=matches["date"].iloc[10])
+    conn.register("_late", late)
+    conn.execute("INSERT INTO matches BY NAME SELECT * FROM _late")
+    assert build(conn, extended=True, incremental=True) == (2001, "full")
+
+def test_nothing_new_is_a_no_op(conn, history):
+    load_history(conn, *history)
+    build(conn, extended=True)
+    assert build(conn, extended=True, incremental=True) == (0, "incremental")
+    assert conn.execute("SELECT count(*) FROM features").fetchone()[0] == 3000
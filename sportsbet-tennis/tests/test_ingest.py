@@ -0,0 +1,28 @@
+import pandas as pd
+from app.ingest.parse_atp_results import load_archive
+
+# Sackmann rows of one tournament share tourney_date; match ids must still follow the draw
+
+COLUMNS = ["tourney_id", "tourney_date", "surface", "best_of", "match_num", "round",
+           "winner_id", "winner_name", "loser_id", "loser_name"]
+
+def _draw(tourney_id, day):
+    # R16 1-8, QF 9-12, SF 13-14, F 15: as text, "15" sorts before "2"
+    rounds = ["R16"] * 8 + ["QF"] * 4 + ["SF"] * 2 + ["F"]
+    return [[tourney_id, day, "Hard", 3, i + 1, r, 100 + 2 * i, f"W{i}", 101 + 2 * i, f"L{i}"]
+            for i, r in enumerate(rounds)]
+
+def test_match_ids_follow_round_order(conn, tmp_path):
+    rows = _draw("2023-0001", "20230102") + [["2023-RR", "20230109", "Hard", 3, n, r, 200 + n, "W", 300 + n, "L"]
+                                            for n, r in [(300, "F"), (10, "RR"), (2, "RR"), (31, "SF")]]
+    path = tmp_path / "atp_matches_2023.csv"
+    pd.DataFrame(rows, columns=COLUMNS).to_csv(path, index=False)
+    assert load_archive([str(path)]) == len(rows)
+    ids = dict(conn.execute("SELECT ext_key, match_id FROM match_map").fetchall())
+    final, semis = ids["ATP:2023-0001:15"], [ids["ATP:2023-0001:13"], ids["ATP:2023-0001:14"]]
+    assert final > max(semis)
+    # within a round by match number, and every round after the one before it
+    draw = [ids[f"ATP:2023-0001:{n}"] for n in range(1, 16)]
+    assert draw == sorted(draw)
+    assert [ids[f"ATP:2023-RR:{n}"] for n in (2, 10, 31, 300)] == sorted(ids[k] for k in ids if k.startswith("ATP:2023-RR:"))
+    assert max(draw) < min(ids[k] for k in ids if k.startswith("ATP:2023-RR:"))
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+from app.odds.odds_utils import implied_probs, fair_odds, devig, DEVIG_METHODS, implied_prob_from_decimal, fair_odds_from_prob
+from app.ev import decision
+from app.ev.decision import evaluate_two_way, kelly_fractions, stake_sizes, expected_values
+
+# the original scalar helpers, the reference the array versions must reproduce
+
+def _kelly(p, o):
+    b = o - 1.0
+    return max(0.0, min((p*(b+1)-1)/b if b > 0 else 0.0, 1.0))
+
+def _stake(p, o):
+    return min(_kelly(p, o) * decision.KELLY_FRACTION, decision.MAX_STAKE_FRACTION) * decision.BANKROLL
+
+def _ev(p, o, stake):
+    return p * (o - 1.0) * stake - (1 - p) * stake
+
+@pytest.fixture
+def market():
+    rng = np.random.default_rng(1)
+    true = rng.uniform(0.03, 0.97, 5000)
+    margin = rng.uniform(0.0, 0.12, 5000)
+    o1 = np.maximum(1.0 / (true * (1 + margin)), 1.01); o2 = np.maximum(1.0 / ((1 - true) * (1 + margin)), 1.01)
+    return rng.uniform(0.02, 0.98, 5000), o1, o2
+
+def test_array_math_matches_scalar_helpers(market):
+    p, o1, _ = market
+    stake = stake_sizes(p, o1)
+    np.testing.assert_allclose(kelly_fractions(p, o1), [_kelly(a, b) for a, b in zip(p, o1)], rtol=0, atol=1e-13)
+    np.testing.assert_allclose(stake, [_stake(a, b) for a, b in zip(p, o1)], rtol=0, atol=1e-12)
+    np.testing.assert_allclose(expected_values(p, o1, stake), [_ev(a, b, s) for a, b, s in zip(p, o1, stake)], rtol=0, atol=1e-12)
+    np.testing.assert_allclose(implied_probs(o1), 1.0 / o1, rtol=0, atol=1e-15)
+
+def test_invalid_odds_are_nan_and_none():
+    odds = np.array([0.0, -2.0, np.nan, np.inf, 2.0])
+    assert np.isnan(implied_probs(odds)[:4]).all() and implied_probs(odds)[4] == 0.5
+    assert np.isnan(fair_odds([0.0, np.nan])).all()
+    assert implied_prob_from_decimal(None) is None and implied_prob_from_decimal(0) is None
+    assert fair_odds_from_prob(0) is None and fair_odds_from_prob(0.25) == 4.0
+
+@pytest.mark.parametrize("method", DEVIG_METHODS)
+def test_devig_is_a_probability_pair(market, method):
+    _, o1, o2 = market
+    i1, i2 = implied_probs(o1), implied_probs(o2)
+    f1, f2 = devig(i1, i2, method)
+    np.testing.assert_allclose(f1 + f2, 1.0, rtol=0, atol=1e-9)
+    assert ((f1 >= 0) & (f1 <= 1)).all()
+    # the favourite stays the favourite
+    assert ((f1 > 0.5) == (i1 > i2))[np.abs(i1 - i2) > 1e-9].all()
+
+def test_devig_methods_solve_their_definitions(market):
+    _, o1, o2 = market
+    i1, i2 = implied_probs(o1), implied_probs(o2)
+    f1, _ = devig(i1, i2, "proportional")
+    np.testing.assert_allclose(f1, i1 / (i1 + i2), rtol=0, atol=1e-15)
+    # power: one exponent k with i1**k + i2**k == 1
+    f1, f2 = devig(i1, i2, "power")
+    k = np.log(f1) / np.log(i1)
+    np.testing.assert_allclose(i2 ** k, f2, rtol=0, atol=1e-9)
+    # shin: solve sum_i p_i(z) == 1 row by row with a scalar bisection
+    f1, _ = devig(i1, i2, "shin")
+    for i in range(0, len(i1), 101):
+        t = i1[i] + i2[i]
+        def p(z, q):
+            return (np.sqrt(z * z + 4 * (1 - z) * q * q / t) - z) / (2 * (1 - z))
+        lo, hi = 0.0, 0.999
+        for _ in range(100):
+            z = 0.5 * (lo + hi)
+            lo, hi = (z, hi) if p(z, i1[i]) + p(z, i2[i]) > 1.0 else (lo, z)
+        assert f1[i] == pytest.approx(min(max(p(z, i1[i]), 0.0), 1.0), abs=1e-6)
+
+def test_unknown_devig_method():
+    with pytest.raises(ValueError):
+        devig(0.5, 0.55, "nope")
+
+def test_evaluate_two_way_matches_row_by_row(market):
+    p, o1, o2 = market
+    got = evaluate_two_way(p, o1, o2)
+    for i in range(0, len(p), 97):
+        t = 1 / o1[i] + 1 / o2[i]
+        e1, e2 = p[i] - (1 / o1[i]) / t, (1 - p[i]) - (1 / o2[i]) / t
+        side = "P1" if e1 > e2 and e1 > 0 else ("P2" if e2 > 0 else "PASS")
+        assert got["suggestion"][i] == side
+        assert got["p1_kelly"][i] == pytest.approx(_kelly(p[i], o1[i]), abs=1e-13)
+        if side != "PASS":
+            prob, odds = (p[i], o1[i]) if side == "P1" else (1 - p[i], o2[i])
+            assert got["stake"][i] == pytest.approx(_stake(prob, odds), abs=1e-12)
+            assert got["expected_value"][i] == pytest.approx(_ev(prob, odds, _stake(prob, odds)), abs=1e-12)
+        else:
+            assert got["stake"][i] == 0.0
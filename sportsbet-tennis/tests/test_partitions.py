@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+from app.features.engine import FeatureEngine, sort_matches
+from app.features.partitions import process_partitioned, tour_groups, plan
+
+def _same(a, b):
+    assert list(a.columns) == list(b.columns) and len(a) == len(b)
+    for c in a.columns:
+        x, y = a[c].to_numpy(), b[c].to_numpy()
+        if x.dtype.kind in "fiu" and y.dtype.kind in "fiu":
+            assert np.array_equal(x.astype(float), y.astype(float), equal_nan=True), c
+        else:
+            assert (pd.Series(x).fillna("") == pd.Series(y).fillna("")).all(), c
+
+def _state(engine):
+    keys = (["player_id"], ["surface", "player_id"], ["lo_id", "hi_id"])
+    return [df.sort_values(k, ignore_index=True) for df, k in zip(engine.export_state(), keys)]
+
+@pytest.fixture
+def matches(history):
+    m = history[1].copy()
+    m.loc[m.index[::50], "surface"] = None
+    return sort_matches(m)
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_partitioned_replay_equals_single_loop(matches, n_jobs):
+    ref_engine = FeatureEngine(use_numba=False)
+    ref = ref_engine.process(matches)
+    got, engine = process_partitioned(matches, n_jobs, use_numba=False)
+    _same(ref, got)
+    for a, b in zip(_state(ref_engine), _state(engine)):
+        _same(a, b)
+
+def test_tours_sharing_a_player_form_one_group(matches):
+    assert len(tour_groups(matches)) == 2
+    m = matches.copy()
+    atp = m.index[m["tour"] == "ATP"][0]
+    m.loc[atp, "p1_id"] = int(m.loc[m["tour"] == "WTA", "p1_id"].iloc[0])
+    assert len(tour_groups(m)) == 1
+    # one global task plus one per surface, together covering every match twice
+    tasks = plan(m)
+    assert sum(p == "global" for p, _ in tasks) == 1
+    assert sum(len(rows) for _, rows in tasks) == 2 * len(m)
+    ref = FeatureEngine(use_numba=False).process(m)
+    _same(ref, process_partitioned(m, 1, use_numba=False)[0])
+
+def test_full_build_with_n_jobs_writes_the_same_table(loaded):
+    from app.features.incremental import build
+    build(loaded, extended=True)
+    ref = loaded.execute("SELECT * FROM features ORDER BY match_id").fetchdf()
+    build(loaded, extended=True, n_jobs=2)
+    pd.testing.assert_frame_equal(ref, loaded.execute("SELECT * FROM features ORDER BY match_id").fetchdf())
@@ -0,0 +1,47 @@
+import os
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Run in a fresh interpreter: the resource tracker reports at interpreter exit on stderr,
+# which is where a worker unregistering the parent's blocks shows up (KeyError tracebacks)
+SCRIPT = textwrap.dedent("""
+    import multiprocessing, sys
+    from concurrent.futures import ProcessPoolExecutor
+    import numpy as np
+    from app.utils.shm import publish, attach, release
+
+    _shared = {}
+
+    def init(specs):
+        attach(specs, _shared)
+
+    def total(i):
+        return float(_shared["x"][i::4].sum())
+
+    if __name__ == "__main__":
+        x = np.arange(1000, dtype=float)
+        blocks, specs = publish({"x": x})
+        try:
+            ctx = multiprocessing.get_context(sys.argv[1])
+            with ProcessPoolExecutor(2, mp_context=ctx, initializer=init, initargs=(specs,)) as ex:
+                assert sum(ex.map(total, range(4))) == x.sum()
+        finally:
+            release(blocks)
+        print("names", " ".join(b.name for b in blocks))
+""")
+
+@pytest.mark.parametrize("method", ["fork", "spawn"])
+def test_workers_leave_block_ownership_to_parent(tmp_path, method):
+    script = tmp_path / "shm_run.py"
+    script.write_text(SCRIPT)
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    out = subprocess.run([sys.executable, str(script), method], capture_output=True, text=True, cwd=ROOT, env=env, timeout=120)
+    assert out.returncode == 0, out.stderr
+    assert "KeyError" not in out.stderr and "leaked" not in out.stderr, out.stderr
+    for name in out.stdout.split("names", 1)[1].split():
+        assert not Path("/dev/shm", name.lstrip("/")).exists()
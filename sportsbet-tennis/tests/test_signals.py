@@ -0,0 +1,93 @@
+import asyncio
+import os
+import subprocess
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LogisticRegression
+from app.features.incremental import build
+from app.features.asof import PointInTimeStore
+from app.models.dataset import load_xy
+from app.models.artifacts import publish_model
+from app.models.registry import ModelRegistry
+from app.signals import refresh as refresh_module
+from app.signals.refresh import refresh, refresh_loop, staleness
+from app.utils import db
+
+ROOT = Path(__file__).resolve().parent.parent
+FEATURES = ["elo_diff_surface", "elo_diff_global", "h2h_p1", "form_p1", "form_p2", "days_since_p1", "days_since_p2"]
+
+@pytest.fixture
+def served(loaded):
+    build(loaded, extended=True)
+    _, X, y = load_xy(loaded, FEATURES)
+    model = LogisticRegression(max_iter=200).fit(pd.DataFrame(X, columns=FEATURES), y)
+    publish_model(loaded, model, {"features": FEATURES})
+    return loaded, model
+
+def _add_upcoming(conn, match_id, p1, p2, day, o1=1.9, o2=2.0):
+    conn.execute("INSERT INTO matches VALUES (?, ?, 'ATP', 'Clay', 3, ?, ?, NULL, ?, ?)", [match_id, day, p1, p2, o1, o2])
+
+def test_upcoming_match_gets_a_signal(served):
+    conn, model = served
+    p1, p2 = conn.execute("SELECT p1_id, p2_id FROM matches ORDER BY date DESC, match_id DESC LIMIT 1").fetchone()
+    tomorrow = date.today() + timedelta(days=1)
+    _add_upcoming(conn, 10**6, p1, p2, tomorrow)
+    assert staleness(conn)["matches"] == 1
+    assert refresh(conn, ModelRegistry(check_interval=0), force=True) == 1
+    row = conn.execute("SELECT p1_prob, p1_odd, p2_odd FROM signals WHERE match_id=?", [10**6]).fetchone()
+    assert row is not None and row[1:] == pytest.approx((1.9, 2.0))
+    # scored from the same as-of row /signal would build
+    feats = PointInTimeStore.from_db(conn).features(p1, p2, "Clay", tomorrow, match_id=10**6)
+    expected = model.predict_proba(pd.DataFrame([feats])[FEATURES].astype("float32"))[0, 1]
+    assert row[0] == pytest.approx(expected, abs=1e-6)
+    assert staleness(conn)["stale"] == 0
+
+def test_no_change_is_a_no_op_and_new_results_rescore(served):
+    conn, _ = served
+    p1, p2 = conn.execute("SELECT p1_id, p2_id FROM matches LIMIT 1").fetchone()
+    _add_upcoming(conn, 10**6, p1, p2, date.today() + timedelta(days=1))
+    registry = ModelRegistry(check_interval=0)
+    assert refresh(conn, registry) == 1
+    assert refresh(conn, registry) == 0
+    # a new result for p1 changes the as-of features once the features are rebuilt
+    conn.execute("INSERT INTO matches VALUES (?, ?, 'ATP', 'Hard', 3, ?, ?, ?, 1.5, 2.6)", [10**6 + 1, date.today(), p1, p2, p1])
+    before = conn.execute("SELECT p1_prob, computed_at FROM signals WHERE match_id=?", [10**6]).fetchone()
+    build(conn, extended=True, incremental=True)
+    assert refresh(conn, registry) == 2   # the new result has odds and is in the window too
+    after = conn.execute("SELECT p1_prob, computed_at FROM signals WHERE match_id=?", [10**6]).fetchone()
+    assert after[1] > before[1] and after[0] != before[0]
+
+def test_loop_releases_the_database_between_runs(served, monkeypatch):
+    # the API opens the file read-only between refresh runs, so the loop must not keep its handle
+    conn, _ = served
+    conn.close()
+    script = "from app.utils.db import get_conn; get_conn(readonly=True, timeout=0).close()"
+    env = {**os.environ, "DB_PATH": str(db.DB_PATH), "PYTHONPATH": str(ROOT)}
+    def sleep(seconds):
+        out = subprocess.run([sys.executable, "-c", script], cwd=ROOT, env=env, capture_output=True, text=True)
+        assert out.returncode == 0, out.stderr
+        raise KeyboardInterrupt
+    monkeypatch.setattr(refresh_module.time, "sleep", sleep)
+    with pytest.raises(KeyboardInterrupt):
+        refresh_loop(60)
+    with db.get_conn(readonly=True) as check:
+        assert check.execute("SELECT COUNT(*) FROM signal_runs WHERE status='ok'").fetchone()[0] == 1
+
+def test_api_stream_warns_when_it_cannot_persist(tmp_path, monkeypatch, capsys):
+    from app.api import main
+    feed = tmp_path / "feed.jsonl"
+    feed.write_text("")
+    monkeypatch.setattr(main, "STREAM_SOURCES", f"replay:{feed}")
+    monkeypatch.setattr(main, "DB_SHARED_READONLY", True)
+    monkeypatch.setattr(main, "METRICS", list(main.METRICS))
+    async def run():
+        await main.start_stream()
+        persist = main.stream.persist
+        await main.stop_stream()
+        return persist
+    assert asyncio.run(run()) is False
+    assert "without persistence" in capsys.readouterr().out
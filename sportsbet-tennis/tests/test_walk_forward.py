@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+from app.backtest.walk_forward import walk_forward_proba, retrain_starts, DEFAULT_CADENCE, PROB_TOL
+
+def _data(n=240, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n, 3))
+    y = (rng.random(n) < 1.0 / (1.0 + np.exp(-X @ np.array([1.0, -0.5, 0.2])))).astype(int)
+    dates = pd.Series(pd.Timestamp("2024-01-01") + pd.to_timedelta(np.sort(rng.integers(0, 120, n)), unit="D"))
+    return X, y, dates
+
+def test_match_cadence_matches_cold_refit():
+    X, y, _ = _data()
+    ref = walk_forward_proba(X, y, cadence="match", warm_start=False)
+    fast = walk_forward_proba(X, y, cadence="match")
+    mask = ~np.isnan(ref)
+    assert np.array_equal(mask, ~np.isnan(fast))
+    assert np.max(np.abs(ref[mask] - fast[mask])) <= PROB_TOL
+
+def test_default_cadence_refits_weekly():
+    X, y, dates = _data()
+    assert DEFAULT_CADENCE == "week"
+    starts = retrain_starts(len(X), dates)
+    assert len(starts) <= dates.dt.to_period("W").nunique()
+    proba = walk_forward_proba(X, y, dates)
+    assert np.isnan(proba[:starts[0]]).all() and not np.isnan(proba[starts[0]:]).any()
+
+def test_block_cadence_uses_only_earlier_rows():
+    # every block is scored by a model fitted on the rows before it, so changing
+    # labels at or after a block start leaves that block's probabilities untouched
+    X, y, _ = _data()
+    starts = retrain_starts(len(X), cadence=50)
+    a = walk_forward_proba(X, y, cadence=50)
+    y2 = y.copy(); y2[starts[2]:] = 1 - y2[starts[2]:]
+    b = walk_forward_proba(X, y2, cadence=50)
+    assert np.array_equal(a[:starts[3]], b[:starts[3]], equal_nan=True)
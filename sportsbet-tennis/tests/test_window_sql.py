@@ -0,0 +1,39 @@
+from collections import defaultdict
+import numpy as np
+import pytest
+from app.features.window_sql import check_parity, window_features
+
+def _naive_form(matches, weight):
+    # pre-match form per side by walking the history in replay order
+    m = matches[matches["winner_id"].notna()].sort_values(["date", "match_id"])
+    past = defaultdict(list)
+    out = {}
+    for mid, p1, p2, w in m[["match_id", "p1_id", "p2_id", "winner_id"]].itertuples(index=False):
+        forms = []
+        for p in (p1, p2):
+            h = past[p]
+            wts = np.array([weight(len(h) - i) for i in range(len(h))])   # k back -> weight
+            forms.append(float(np.dot(h, wts) / wts.sum()) if len(h) and wts.sum() > 0 else 0.5)
+        out[mid] = forms
+        past[p1].append(float(w == p1)); past[p2].append(float(w == p2))
+    return out
+
+def test_all_history_matches_engine(loaded):
+    assert check_parity(loaded)
+
+@pytest.mark.parametrize("spec, weight", [
+    ("last:5", lambda k: 1.0 if k <= 5 else 0.0),
+    ("decay:0.8", lambda k: 0.8 ** (k - 1)),
+])
+def test_windowed_form_matches_naive_walk(loaded, history, spec, weight):
+    ref = _naive_form(history[1], weight)
+    got = window_features(loaded, spec).set_index("match_id")
+    ids = list(ref)
+    np.testing.assert_allclose(got.loc[ids, ["form_p1", "form_p2"]].to_numpy(), np.array([ref[i] for i in ids]), rtol=0, atol=1e-9)
+
+def test_since_watermark_only_returns_later_matches(loaded):
+    full = window_features(loaded).set_index("match_id")
+    d, mid = loaded.execute("SELECT date, match_id FROM matches ORDER BY date, match_id LIMIT 1 OFFSET 2499").fetchone()
+    part = window_features(loaded, since=(d, mid)).set_index("match_id")
+    assert len(part) == 500
+    np.testing.assert_allclose(part.to_numpy(dtype=float), full.loc[part.index].to_numpy(dtype=float), rtol=0, atol=1e-12)